@@ -110,12 +110,25 @@ const ReviewAnalysis = ({ carId, usingFallback = false }) => {
       });
       
       console.log("Response status:", response.status);
-      const responseText = await response.text();
-      console.log("Response text:", responseText);
-      
       if (!response.ok) {
-        throw new Error(`Generate AI Review error: ${responseText}`);
+        throw new Error(`Generate AI Review error: ${await response.text()}`);
+      }
+
+      // Generation runs as a background job; wait for it to finish
+      let job = await response.json();
+      while (job.status === 'queued' || job.status === 'running') {
+        const jobResponse = await fetch(`${job.status_url}?wait=25`);
+        if (!jobResponse.ok) {
+          throw new Error(`Generate AI Review error: ${await jobResponse.text()}`);
+        }
+        job = await jobResponse.json();
+      }
+      if (job.status === 'failed') {
+        throw new Error(`Generate AI Review error: ${job.error}`);
       }
+
+      const responseText = JSON.stringify(job.result);
+      console.log("Response text:", responseText);
       
       try {
         const reviewData = JSON.parse(responseText);
@@ -0,0 +1,128 @@
+# admission.py
+"""
+Module for admission control in front of the local LLM.
+Ollama runs every request on the same CPU model, so letting all of them
+through at once makes them time out together. Requests beyond the
+concurrency limit wait in a bounded queue for a short time budget and are
+shed when the queue is full or the budget runs out.
+"""
+
+import asyncio
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+class LocalLLMOverloaded(RuntimeError):
+    """Raised when the local LLM sheds a request instead of running it."""
+
+
+class AdmissionController:
+    """
+    Concurrency limiter with a bounded wait queue and a per-request queue-time budget.
+
+    Attributes:
+        max_concurrency: Requests allowed to run at the same time
+        max_queue: Requests allowed to wait for a slot; more are rejected immediately
+        queue_timeout: Seconds a request may wait for a slot before it is rejected
+    """
+
+    def __init__(self, max_concurrency: int = 2, max_queue: int = 8, queue_timeout: float = 2.0):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.cond = threading.Condition()
+        self.active = 0
+        self.waiting = 0
+        self.stats = {
+            "admitted": 0,
+            "queued": 0,
+            "admitted_after_wait": 0,
+            "rejected_queue_full": 0,
+            "rejected_timeout": 0,
+            "max_queue_depth": 0,
+            "total_queue_wait": 0.0,
+            "max_queue_wait": 0.0,
+        }
+
+    def _try_enter(self) -> bool:
+        """Take a free slot if nobody is queued ahead (caller holds the lock)."""
+        if self.active < self.max_concurrency and self.waiting == 0:
+            self.active += 1
+            self.stats["admitted"] += 1
+            return True
+        return False
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for a slot.
+
+        Args:
+            timeout: Optional override of the queue-time budget
+
+        Returns:
+            True if admitted (call release() when done), False if shed
+        """
+        budget = self.queue_timeout if timeout is None else timeout
+        start = time.monotonic()
+        with self.cond:
+            if self._try_enter():
+                return True
+            if self.waiting >= self.max_queue:
+                self.stats["rejected_queue_full"] += 1
+                return False
+
+            self.waiting += 1
+            self.stats["queued"] += 1
+            self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], self.waiting)
+            try:
+                if not self.cond.wait_for(lambda: self.active < self.max_concurrency, budget):
+                    self.stats["rejected_timeout"] += 1
+                    return False
+                self.active += 1
+            finally:
+                self.waiting -= 1
+
+            wait = time.monotonic() - start
+            self.stats["admitted"] += 1
+            self.stats["admitted_after_wait"] += 1
+            self.stats["total_queue_wait"] += wait
+            self.stats["max_queue_wait"] = max(self.stats["max_queue_wait"], wait)
+            return True
+
+    async def aacquire(self, timeout: Optional[float] = None) -> bool:
+        """Async acquire; queued waits run in a worker thread so the event loop is not blocked."""
+        with self.cond:
+            if self._try_enter():
+                return True
+
+        waiter = asyncio.ensure_future(asyncio.to_thread(self.acquire, timeout))
+        try:
+            return await asyncio.shield(waiter)
+        except asyncio.CancelledError:
+            # Give back a slot the abandoned waiter may still obtain
+            waiter.add_done_callback(
+                lambda task: self.release() if not task.cancelled() and task.result() else None
+            )
+            raise
+
+    def release(self) -> None:
+        """Free a slot taken by acquire()/aacquire()."""
+        with self.cond:
+            self.active -= 1
+            self.cond.notify()
+
+    def is_saturated(self) -> bool:
+        """Whether a new request would be rejected without waiting."""
+        with self.cond:
+            return self.active >= self.max_concurrency and self.waiting >= self.max_queue
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Queue depth, wait-time and rejection statistics."""
+        with self.cond:
+            stats: Dict[str, Any] = dict(self.stats)
+            stats["active"] = self.active
+            stats["queue_depth"] = self.waiting
+        waited = stats["admitted_after_wait"]
+        stats["avg_queue_wait"] = stats["total_queue_wait"] / waited if waited else 0.0
+        return stats
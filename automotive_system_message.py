@@ -4,6 +4,20 @@ Module for generating specialized automotive system messages for LLM prompting.
 This enhances response quality for car-related queries by providing domain-specific context.
 """
 
+import threading
+from collections import OrderedDict
+
+# Bump when the wording or layout changes so cached prompts are rebuilt
+PROMPT_VERSION = 1
+MAX_CACHED_PROMPTS = 1024
+# The car fields create_automotive_system_message reads; they are part of
+# the cache key, so edited car data gets a fresh prompt
+PROMPT_CAR_FIELDS = ('year', 'manufacturer', 'model', 'body_type', 'engine_info', 'transmission', 'fuel_type', 'mpg')
+
+_prompt_cache = OrderedDict()
+_prompt_cache_lock = threading.Lock()
+prompt_cache_stats = {"hits": 0, "misses": 0, "uncached": 0, "evictions": 0}
+
 def create_automotive_system_message(car_data=None, available_cars=None):
     """
     Creates a specialized system message for automotive assistant.
@@ -75,4 +89,59 @@ RESPONSE GUIDELINES:
         cars_context += "\n".join([f"- {car.get('year', '')} {car.get('manufacturer', '')} {car.get('model', '')}" for car in cars_sample])
         base_message += cars_context
         
-    return base_message
\ No newline at end of file
+    return base_message
+
+def get_system_prompt_parts(car_data=None):
+    """
+    Split system message for a car, memoized per car id, PROMPT_VERSION and
+    the values of PROMPT_CAR_FIELDS, keeping the MAX_CACHED_PROMPTS most
+    recently used prompts.
+
+    The instructions are the same for every request and always come first,
+    so the prompt prefix is byte-identical across cars and turns; that is
+    what lets provider-side prompt caching and Ollama's prefix reuse apply.
+    The car-specific context follows.
+
+    Args:
+        car_data (dict, optional): Data about the specific car being discussed
+
+    Returns:
+        tuple: (instructions, car_context) strings
+    """
+    car_id = car_data.get('id') if car_data else None
+    if car_data and car_id is None:
+        # No stable key for ad-hoc car data
+        prompt_cache_stats["uncached"] += 1
+        return _render_system_prompt_parts(car_data)
+
+    fields = repr(tuple(car_data.get(field) for field in PROMPT_CAR_FIELDS)) if car_data else None
+    key = (car_id, PROMPT_VERSION, fields)
+    with _prompt_cache_lock:
+        parts = _prompt_cache.get(key)
+        if parts is not None:
+            _prompt_cache.move_to_end(key)
+            prompt_cache_stats["hits"] += 1
+            return parts
+        prompt_cache_stats["misses"] += 1
+
+    parts = _render_system_prompt_parts(car_data)
+    with _prompt_cache_lock:
+        _prompt_cache[key] = parts
+        while len(_prompt_cache) > MAX_CACHED_PROMPTS:
+            _prompt_cache.popitem(last=False)
+            prompt_cache_stats["evictions"] += 1
+    return parts
+
+def invalidate_system_prompt(car_id=None):
+    """Drop the cached prompt for one car, or all cached prompts when car_id is None."""
+    with _prompt_cache_lock:
+        if car_id is None:
+            _prompt_cache.clear()
+        else:
+            for key in [key for key in _prompt_cache if key[0] == car_id]:
+                del _prompt_cache[key]
+
+def _render_system_prompt_parts(car_data):
+    instructions = create_automotive_system_message()
+    full = create_automotive_system_message(car_data)
+    return instructions, full[len(instructions):]
\ No newline at end of file
@@ -0,0 +1,65 @@
+# bench_cache.py
+"""
+Benchmark for CacheService vs ShardedCacheService under concurrent access.
+Runs a fixed get/set mix from an increasing number of threads and prints
+throughput for each cache so lock contention is visible.
+"""
+
+import argparse
+import random
+import threading
+import time
+
+try:
+    from cache_service import CacheService, ShardedCacheService
+except ImportError:
+    from .cache_service import CacheService, ShardedCacheService
+
+
+def run_workload(cache, num_threads: int, ops_per_thread: int, key_space: int, write_ratio: float) -> float:
+    """Run the get/set mix from `num_threads` threads and return ops/sec."""
+    barrier = threading.Barrier(num_threads + 1)
+
+    def worker(seed: int):
+        rng = random.Random(seed)
+        keys = [f"car:{rng.randrange(key_space)}" for _ in range(ops_per_thread)]
+        writes = [rng.random() < write_ratio for _ in range(ops_per_thread)]
+        barrier.wait()
+        for key, is_write in zip(keys, writes):
+            if is_write:
+                cache.set(key, {"id": key})
+            else:
+                cache.get(key)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(num_threads)]
+    for t in threads:
+        t.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return (num_threads * ops_per_thread) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark cache throughput by thread count')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8, 16], help='Thread counts to run')
+    parser.add_argument('--ops', type=int, default=50000, help='Operations per thread')
+    parser.add_argument('--keys', type=int, default=10000, help='Number of distinct keys')
+    parser.add_argument('--write-ratio', type=float, default=0.2, help='Fraction of operations that are sets')
+    parser.add_argument('--shards', type=int, default=16, help='Shard count for ShardedCacheService')
+
+    args = parser.parse_args()
+
+    print(f"{'threads':>8} {'single lock ops/s':>20} {'sharded ops/s':>16} {'speedup':>8}")
+    for num_threads in args.threads:
+        single = CacheService()
+        sharded = ShardedCacheService(num_shards=args.shards)
+        single_ops = run_workload(single, num_threads, args.ops, args.keys, args.write_ratio)
+        sharded_ops = run_workload(sharded, num_threads, args.ops, args.keys, args.write_ratio)
+        print(f"{num_threads:>8} {single_ops:>20,.0f} {sharded_ops:>16,.0f} {sharded_ops / single_ops:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
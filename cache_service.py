@@ -1,55 +1,447 @@
 # cache_service.py
+import asyncio
+import atexit
+import copy
+import functools
 import hashlib
+import heapq
+import inspect
 import json
+import mmap
+import os
+import pickle
+import struct
+import tempfile
 import time
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Callable, Iterator, List, Optional, Tuple
 import threading
 import logging
 
+try:
+    import xxhash  # type: ignore
+except ImportError:
+    xxhash = None
+
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class CacheService:
+# Memoized call keys up to this length are used verbatim instead of hashed
+MAX_RAW_KEY_LENGTH = 96
+
+# The cleanup thread rebuilds the expiry heap once it holds this many entries
+# per live key (overwrites, deletes and evictions leave stale entries behind)
+HEAP_COMPACT_RATIO = 2
+HEAP_COMPACT_MIN = 64
+
+# Snapshot file layout: header (magic, entry count) followed by one record per
+# entry: (expiry, key length, value length) then the UTF-8 key and the pickled value.
+SNAPSHOT_MAGIC = b"CHRYSNP1"
+_SNAPSHOT_HEADER = struct.Struct("<8sI")
+_SNAPSHOT_RECORD = struct.Struct("<dII")
+
+
+class _SnapshotValue:
+    """Pickled value still sitting in a memory-mapped snapshot; unpickled on first read."""
+    
+    __slots__ = ("_buffer", "_start", "_end")
+    
+    def __init__(self, buffer: mmap.mmap, start: int, end: int):
+        self._buffer = buffer
+        self._start = start
+        self._end = end
+    
+    def raw(self) -> bytes:
+        return self._buffer[self._start:self._end]
+    
+    def load(self) -> Any:
+        return pickle.loads(self.raw())
+
+
+def write_snapshot(path: str, items: List[Tuple[str, float, Any]]) -> int:
+    """Atomically write (key, expiry, value) items to a snapshot file; return the count written."""
+    records = []
+    for key, expiry, value in items:
+        try:
+            payload = value.raw() if isinstance(value, _SnapshotValue) else pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            logger.debug(f"Skipping unpicklable cache item {key}: {e}")
+            continue
+        records.append((key.encode("utf-8"), expiry, payload))
+    
+    # A temp file of our own: workers sharing the snapshot path must not
+    # interleave writes into one file before it is renamed into place
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path) or ".", prefix=f"{os.path.basename(path)}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, len(records)))
+            for key_bytes, expiry, payload in records:
+                f.write(_SNAPSHOT_RECORD.pack(expiry, len(key_bytes), len(payload)))
+                f.write(key_bytes)
+                f.write(payload)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return len(records)
+
+
+def read_snapshot(path: str) -> Iterator[Tuple[str, float, _SnapshotValue]]:
+    """Yield unexpired (key, expiry, lazy value) items from a snapshot file."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size < _SNAPSHOT_HEADER.size:
+            return
+        # The mapping outlives the file handle; lazy values keep it alive
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    
+    magic, count = _SNAPSHOT_HEADER.unpack_from(buffer, 0)
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError(f"{path} is not a cache snapshot")
+    
+    now = time.time()
+    offset = _SNAPSHOT_HEADER.size
+    for _ in range(count):
+        expiry, key_len, value_len = _SNAPSHOT_RECORD.unpack_from(buffer, offset)
+        offset += _SNAPSHOT_RECORD.size
+        key_end = offset + key_len
+        value_end = key_end + value_len
+        # Drop entries that expired while the process was down
+        if expiry > now:
+            key = buffer[offset:key_end].decode("utf-8")
+            yield key, expiry, _SnapshotValue(buffer, key_end, value_end)
+        offset = value_end
+
+
+def _fast_hash(text: str) -> str:
+    """64-bit non-cryptographic hash that is stable across processes (unlike hash())."""
+    data = text.encode("utf-8")
+    if xxhash is not None:
+        return xxhash.xxh3_64_hexdigest(data)
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+
+_SCALAR_TYPES = frozenset((type(None), str, int, float, bool))
+
+
+def _freeze(value: Any) -> Any:
+    """Turn an argument into a hashable, deterministically ordered structure."""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, dict):
+        return tuple(sorted(((str(k), _freeze(v)) for k, v in value.items())))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(repr(_freeze(v)) for v in value))
+    return str(value)
+
+
+def _copy_result(value: Any) -> Any:
+    """Copy a memoized result so a caller mutating it cannot change the cached object."""
+    kind = type(value)
+    if kind in _SCALAR_TYPES:
+        return value
+    # Query results are dicts and lists of plain values; copying those
+    # directly is several times faster than deepcopy's generic path
+    if kind is dict:
+        return {k: _copy_result(v) for k, v in value.items()}
+    if kind is list:
+        return [_copy_result(v) for v in value]
+    return copy.deepcopy(value)
+
+
+def _memoize(cache: Any, prefix: str, ttl: Optional[int], key: Optional[Callable[..., Any]]) -> Callable:
+    """Build a memoizing decorator backed by `cache` (CacheService or ShardedCacheService)."""
+    def decorator(func: Callable) -> Callable:
+        signature = inspect.signature(func)
+        params = list(signature.parameters.values())
+        # Signatures without *args/**kwargs map a call to its argument values
+        # without binding; defaults are looked up from this precomputed table
+        simple = all(p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD, p.KEYWORD_ONLY) for p in params)
+        positional = [p for p in params if p.kind != p.KEYWORD_ONLY]
+        names = [p.name for p in params]
+        defaults = tuple(p.default for p in params)
+        keyword_ok = tuple(p.kind != p.POSITIONAL_ONLY for p in params)
+        # Shortest positional-only call that fills every parameter from defaults
+        min_args = max((i + 1 for i, p in enumerate(params) if p.default is p.empty), default=0)
+        
+        def bind_values(args: tuple, kwargs: dict) -> tuple:
+            if simple and len(args) <= len(positional):
+                if not kwargs:
+                    if len(args) >= min_args:
+                        return args + defaults[len(args):]
+                else:
+                    values = list(args)
+                    consumed = 0
+                    for i in range(len(args), len(params)):
+                        name = names[i]
+                        if keyword_ok[i] and name in kwargs:
+                            values.append(kwargs[name])
+                            consumed += 1
+                        elif defaults[i] is not inspect.Parameter.empty:
+                            values.append(defaults[i])
+                        else:
+                            break
+                    else:
+                        if consumed == len(kwargs):
+                            return tuple(values)
+            # Anything unusual (var-args, missing or unknown arguments) binds
+            # normally, which also raises the usual TypeError for bad calls
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return tuple(bound.arguments.values())
+        
+        def cache_key(*args, **kwargs) -> str:
+            material = key(*args, **kwargs) if key is not None else bind_values(args, kwargs)
+            if isinstance(material, str):
+                text = material
+            elif type(material) is tuple and all(type(v) in _SCALAR_TYPES for v in material):
+                # Already frozen: same text as repr(_freeze(material)), without the recursion
+                text = repr(material)
+            else:
+                text = repr(_freeze(material))
+            if len(text) > MAX_RAW_KEY_LENGTH:
+                text = _fast_hash(text)
+            return f"{prefix}:{text}"
+        
+        def invalidate(*args, **kwargs) -> None:
+            cache.delete(cache_key(*args, **kwargs))
+        
+        async def acall(*args, **kwargs):
+            # Single-flight, and sync functions run off the event loop
+            value = await cache.aget_or_compute(
+                cache_key(*args, **kwargs), functools.partial(func, *args, **kwargs), ttl
+            )
+            return _copy_result(value)
+        
+        if inspect.iscoroutinefunction(func):
+            wrapper = functools.wraps(func)(acall)
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                k = cache_key(*args, **kwargs)
+                value = cache.get(k)
+                if value is not None:
+                    return _copy_result(value)
+                value = func(*args, **kwargs)
+                # None means "not found" for most callers, so it is never cached
+                if value is not None:
+                    cache.set(k, value, ttl)
+                return _copy_result(value)
+        
+        wrapper.cache_key = cache_key
+        wrapper.invalidate = invalidate
+        wrapper.acall = acall
+        return wrapper
+    
+    return decorator
+
+
+class _AsyncCacheMixin:
+    """
+    asyncio front-end over the sync get/set API, so async handlers and
+    threadpool endpoints share the same entries. The sync locks are only
+    held for bounded, dict-sized critical sections, so calling them from
+    the event loop does not stall it; slow loaders are what must be kept off it.
+    """
+    
+    async def aget(self, key: str) -> Optional[Any]:
+        """Async get; see get()."""
+        return self.get(key)
+    
+    async def aset(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        """Async set; see set()."""
+        self.set(key, value, ttl)
+    
+    async def adelete(self, key: str) -> None:
+        """Async delete; see delete()."""
+        self.delete(key)
+    
+    async def aget_or_compute(self, key: str, loader: Callable[[], Any], ttl: Optional[int] = None) -> Any:
+        """
+        Get a cached value, or compute it with `loader` exactly once per key.
+        
+        Concurrent callers on the same event loop await a single in-flight
+        load. Coroutine loaders are awaited; sync loaders run in a worker
+        thread. A caller being cancelled does not cancel the shared load.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        
+        loop = asyncio.get_running_loop()
+        task = self._inflight.get(key)
+        if task is None or task.get_loop() is not loop:
+            task = loop.create_task(self._load(key, loader, ttl))
+            self._inflight[key] = task
+            task.add_done_callback(functools.partial(self._forget_inflight, key))
+        return await asyncio.shield(task)
+    
+    async def _load(self, key: str, loader: Callable[[], Any], ttl: Optional[int]) -> Any:
+        if inspect.iscoroutinefunction(loader):
+            value = await loader()
+        else:
+            value = await asyncio.to_thread(loader)
+        if value is not None:
+            self.set(key, value, ttl)
+        return value
+    
+    def _forget_inflight(self, key: str, task: "asyncio.Task") -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+
+class CacheService(_AsyncCacheMixin):
     """Advanced caching service with TTL and auto-cleanup."""
     
-    def __init__(self, ttl_seconds=3600):
+    def __init__(self, ttl_seconds=3600, cleanup_interval=1.0, cleanup_batch_size=256,
+                 max_entries=None, start_cleanup=True, snapshot_path=None,
+                 snapshot_interval=300):
         self.cache = {}
         self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
         self.lock = threading.RLock()
         
-        # Start background cleanup thread
-        self.cleanup_thread = threading.Thread(target=self._cleanup_expired, daemon=True)
-        self.cleanup_thread.start()
+        # Min-heap of (expiry, key) used to expire items without scanning the
+        # whole cache. Entries are invalidated lazily: a heap entry whose
+        # expiry no longer matches the cached item is simply discarded.
+        self._expiry_heap = []
+        # While the cleanup thread rebuilds the heap, pushes are also recorded
+        # here so the rebuilt heap does not miss them
+        self._heap_pushes = None
+        self.cleanup_interval = cleanup_interval
+        self.cleanup_batch_size = cleanup_batch_size
+        
+        # In-flight aget_or_compute loads, keyed by cache key
+        self._inflight = {}
+        
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "sets": 0,
+            "expirations": 0,
+            "evictions": 0,
+            "heap_compactions": 0
+        }
+        
+        # Warm restarts: restore from the last snapshot and keep writing new ones
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self._last_snapshot = time.time()
+        if snapshot_path:
+            self.load_snapshot(snapshot_path)
+            atexit.register(self.save_snapshot)
+        
+        # Start background cleanup thread (a ShardedCacheService drives its
+        # shards from a single thread instead)
+        self.cleanup_thread = None
+        if start_cleanup:
+            self.cleanup_thread = threading.Thread(target=self._cleanup_expired, daemon=True)
+            self.cleanup_thread.start()
     
     def get(self, key: str) -> Optional[Dict[str, Any]]:
         """Get a value from the cache if it exists and is not expired."""
         with self.lock:
             if key not in self.cache:
+                self.stats["misses"] += 1
                 return None
                 
             cache_item = self.cache[key]
             if time.time() > cache_item['expiry']:
                 # Item has expired
                 del self.cache[key]
+                self.stats["expirations"] += 1
+                self.stats["misses"] += 1
                 return None
                 
             # Update access time
             cache_item['last_accessed'] = time.time()
+            if isinstance(cache_item['value'], _SnapshotValue):
+                try:
+                    cache_item['value'] = cache_item['value'].load()
+                except Exception as e:
+                    logger.warning(f"Dropping unreadable snapshot item {key}: {e}")
+                    del self.cache[key]
+                    self.stats["misses"] += 1
+                    return None
+            if self.max_entries:
+                # Move to the end of the dict so eviction order stays LRU
+                self.cache[key] = self.cache.pop(key)
+            self.stats["hits"] += 1
             return cache_item['value']
     
     def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
         """Set a value in the cache with an optional custom TTL."""
         expiry = time.time() + (ttl if ttl is not None else self.ttl_seconds)
-        
+        self._store(key, value, expiry)
+        logger.debug(f"Cached item with key {key}")
+    
+    def _store(self, key: str, value: Any, expiry: float) -> None:
         with self.lock:
+            self.cache.pop(key, None)
             self.cache[key] = {
                 'value': value,
                 'expiry': expiry,
                 'last_accessed': time.time()
             }
+            heapq.heappush(self._expiry_heap, (expiry, key))
+            if self._heap_pushes is not None:
+                self._heap_pushes.append((expiry, key))
+            self.stats["sets"] += 1
             
-        logger.debug(f"Cached item with key {key}")
+            if self.max_entries and len(self.cache) > self.max_entries:
+                # Evict the least recently used item
+                oldest = next(iter(self.cache))
+                del self.cache[oldest]
+                self.stats["evictions"] += 1
+    
+    def _heap_oversized(self) -> bool:
+        return len(self._expiry_heap) > max(HEAP_COMPACT_RATIO * len(self.cache), HEAP_COMPACT_MIN)
+    
+    def _compact_expiry_heap(self) -> bool:
+        """
+        Rebuild an oversized expiry heap without its stale entries.
+        
+        Runs in the cleanup thread (which is also the only thread that pops
+        the heap): live entries are copied out one cleanup_batch_size chunk
+        per lock hold and heapified without the lock. Entries pushed
+        meanwhile are recorded in _heap_pushes and added before the swap.
+        """
+        with self.lock:
+            if not self._heap_oversized():
+                return False
+            heap = self._expiry_heap
+            self._heap_pushes = []
+        
+        live = []
+        index = 0
+        while True:
+            with self.lock:
+                if self._expiry_heap is not heap:
+                    # Cleared meanwhile; nothing to rebuild
+                    self._heap_pushes = None
+                    return False
+                for expiry, key in heap[index:index + self.cleanup_batch_size]:
+                    item = self.cache.get(key)
+                    if item is not None and item['expiry'] == expiry:
+                        live.append((expiry, key))
+                index += self.cleanup_batch_size
+                if index >= len(heap):
+                    break
+        
+        heapq.heapify(live)
+        with self.lock:
+            if self._expiry_heap is not heap:
+                self._heap_pushes = None
+                return False
+            for entry in self._heap_pushes:
+                heapq.heappush(live, entry)
+            self._expiry_heap = live
+            self._heap_pushes = None
+            self.stats["heap_compactions"] += 1
+        return True
     
     def delete(self, key: str) -> None:
         """Delete an item from the cache."""
@@ -62,8 +454,86 @@ class CacheService:
         """Clear all items from the cache."""
         with self.lock:
             self.cache.clear()
+            self._expiry_heap = []
             logger.info("Cache cleared")
     
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss/eviction counters and the current number of entries."""
+        with self.lock:
+            stats = self.stats.copy()
+            stats["entries"] = len(self.cache)
+        return stats
+    
+    def snapshot_items(self) -> List[Tuple[str, float, Any]]:
+        """
+        Get (key, expiry, value) for every unexpired item.
+        
+        Every live item has an entry in the expiry heap, so the heap list is
+        walked one cleanup_batch_size chunk per lock hold instead of copying
+        the whole cache under the lock.
+        """
+        now = time.time()
+        items = {}
+        index = 0
+        while True:
+            with self.lock:
+                chunk = self._expiry_heap[index:index + self.cleanup_batch_size]
+                for expiry, key in chunk:
+                    item = self.cache.get(key)
+                    if item is not None and item['expiry'] == expiry and expiry > now:
+                        items[key] = (key, expiry, item['value'])
+            if len(chunk) < self.cleanup_batch_size:
+                return list(items.values())
+            index += self.cleanup_batch_size
+    
+    def save_snapshot(self, path: Optional[str] = None) -> int:
+        """Write all unexpired items to a snapshot file; return the count written."""
+        path = path or self.snapshot_path
+        if not path:
+            return 0
+        try:
+            count = write_snapshot(path, self.snapshot_items())
+            self._last_snapshot = time.time()
+            logger.info(f"Saved {count} cache items to {path}")
+            return count
+        except Exception as e:
+            logger.error(f"Error saving cache snapshot: {str(e)}")
+            return 0
+    
+    def load_snapshot(self, path: str) -> int:
+        """Restore unexpired items from a snapshot file; values are unpickled on first get."""
+        if not os.path.exists(path):
+            return 0
+        count = 0
+        try:
+            for key, expiry, value in read_snapshot(path):
+                self._store(key, value, expiry)
+                count += 1
+            logger.info(f"Restored {count} cache items from {path}")
+        except Exception as e:
+            logger.error(f"Error loading cache snapshot: {str(e)}")
+        return count
+    
+    def _maybe_snapshot(self) -> None:
+        if self.snapshot_path and time.time() - self._last_snapshot >= self.snapshot_interval:
+            self.save_snapshot()
+    
+    def memoize(self, prefix: str, ttl: Optional[int] = None, key: Optional[Callable[..., Any]] = None) -> Callable:
+        """
+        Decorator that caches a sync or async function's non-None results.
+        
+        Args:
+            prefix: Key prefix, e.g. "car"
+            ttl: Optional TTL override in seconds
+            key: Optional callable taking the function's arguments and returning
+                 the part of the call that identifies the result
+        
+        The wrapped function gains `invalidate(*args, **kwargs)` and
+        `cache_key(*args, **kwargs)`. Callers get a copy of the cached result,
+        so mutating it does not change what later calls return.
+        """
+        return _memoize(self, prefix, ttl, key)
+    
     def generate_key(self, prefix: str, **kwargs) -> str:
         """Generate a cache key from a prefix and keyword arguments."""
         # Sort kwargs to ensure consistent key generation
@@ -86,22 +556,184 @@ class CacheService:
         key_hash = hashlib.md5(key_string.encode()).hexdigest()
         return f"{prefix}:{key_hash}"
     
+    def _expire_batch(self, now: float, limit: int) -> int:
+        """Pop up to `limit` due entries off the expiry heap; return how many were popped."""
+        popped = 0
+        with self.lock:
+            heap = self._expiry_heap
+            while heap and popped < limit and heap[0][0] <= now:
+                expiry, key = heapq.heappop(heap)
+                popped += 1
+                item = self.cache.get(key)
+                # Skip stale heap entries left behind by overwrites or deletes
+                if item is not None and item['expiry'] == expiry:
+                    del self.cache[key]
+                    self.stats["expirations"] += 1
+        return popped
+    
+    def _run_cleanup_pass(self) -> int:
+        """Expire everything that is due, then compact the heap if needed, one bounded batch per lock acquisition."""
+        now = time.time()
+        total = 0
+        # Release the lock between batches so get/set never wait on a full sweep
+        while True:
+            popped = self._expire_batch(now, self.cleanup_batch_size)
+            total += popped
+            if popped < self.cleanup_batch_size:
+                break
+        self._compact_expiry_heap()
+        return total
+    
     def _cleanup_expired(self) -> None:
-        """Background thread to clean up expired cache items."""
+        """Background thread to clean up expired cache items in small batches."""
         while True:
             try:
-                with self.lock:
-                    now = time.time()
-                    expired_keys = [k for k, v in self.cache.items() if now > v['expiry']]
-                    
-                    for key in expired_keys:
-                        del self.cache[key]
-                        
-                    if expired_keys:
-                        logger.debug(f"Cleaned up {len(expired_keys)} expired cache items")
+                total = self._run_cleanup_pass()
+                if total:
+                    logger.debug(f"Processed {total} expiry entries")
+                self._maybe_snapshot()
                 
-                # Sleep for a while before next cleanup
-                time.sleep(300)  # Check every 5 minutes
+                time.sleep(self.cleanup_interval)
             except Exception as e:
                 logger.error(f"Error in cache cleanup: {str(e)}")
-                time.sleep(60)  # Wait a bit before retrying
\ No newline at end of file
+                time.sleep(60)  # Wait a bit before retrying
+
+
+class ShardedCacheService(_AsyncCacheMixin):
+    """
+    Lock-striped cache: keys are spread over independently locked CacheService
+    shards so concurrent threads rarely contend on the same lock.
+
+    Exposes the same get/set/delete/clear/generate_key API as CacheService.
+    """
+    
+    def __init__(self, num_shards=16, ttl_seconds=3600, cleanup_interval=1.0,
+                 cleanup_batch_size=256, max_entries=None, snapshot_path=None,
+                 snapshot_interval=300):
+        per_shard_max = -(-max_entries // num_shards) if max_entries else None
+        self.ttl_seconds = ttl_seconds
+        self.cleanup_interval = cleanup_interval
+        self._inflight = {}
+        self.shards = [
+            CacheService(
+                ttl_seconds=ttl_seconds,
+                cleanup_batch_size=cleanup_batch_size,
+                max_entries=per_shard_max,
+                start_cleanup=False
+            )
+            for _ in range(num_shards)
+        ]
+        
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self._last_snapshot = time.time()
+        if snapshot_path:
+            self.load_snapshot(snapshot_path)
+            atexit.register(self.save_snapshot)
+        
+        # One cleanup thread for all shards; each shard only holds its own lock
+        self.cleanup_thread = threading.Thread(target=self._cleanup_expired, daemon=True)
+        self.cleanup_thread.start()
+    
+    def _shard_for(self, key: str) -> CacheService:
+        return self.shards[hash(key) % len(self.shards)]
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Get a value from the owning shard if it exists and is not expired."""
+        return self._shard_for(key).get(key)
+    
+    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        """Set a value in the owning shard with an optional custom TTL."""
+        self._shard_for(key).set(key, value, ttl)
+    
+    def delete(self, key: str) -> None:
+        """Delete an item from the owning shard."""
+        self._shard_for(key).delete(key)
+    
+    def clear(self) -> None:
+        """Clear all shards."""
+        for shard in self.shards:
+            shard.clear()
+    
+    def save_snapshot(self, path: Optional[str] = None) -> int:
+        """Write unexpired items from every shard to one snapshot file."""
+        path = path or self.snapshot_path
+        if not path:
+            return 0
+        try:
+            items = [item for shard in self.shards for item in shard.snapshot_items()]
+            count = write_snapshot(path, items)
+            self._last_snapshot = time.time()
+            logger.info(f"Saved {count} cache items to {path}")
+            return count
+        except Exception as e:
+            logger.error(f"Error saving cache snapshot: {str(e)}")
+            return 0
+    
+    def load_snapshot(self, path: str) -> int:
+        """Restore unexpired items into their owning shards."""
+        if not os.path.exists(path):
+            return 0
+        count = 0
+        try:
+            for key, expiry, value in read_snapshot(path):
+                self._shard_for(key)._store(key, value, expiry)
+                count += 1
+            logger.info(f"Restored {count} cache items from {path}")
+        except Exception as e:
+            logger.error(f"Error loading cache snapshot: {str(e)}")
+        return count
+    
+    def memoize(self, prefix: str, ttl: Optional[int] = None, key: Optional[Callable[..., Any]] = None) -> Callable:
+        """Decorator that caches a sync or async function's results; see CacheService.memoize."""
+        return _memoize(self, prefix, ttl, key)
+    
+    def generate_key(self, prefix: str, **kwargs) -> str:
+        """Generate a cache key from a prefix and keyword arguments."""
+        return self.shards[0].generate_key(prefix, **kwargs)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get counters summed across shards, plus per-shard entry counts."""
+        totals: Dict[str, Any] = {}
+        shard_entries = []
+        for shard in self.shards:
+            stats = shard.get_stats()
+            shard_entries.append(stats["entries"])
+            for name, value in stats.items():
+                totals[name] = totals.get(name, 0) + value
+        totals["shards"] = len(self.shards)
+        totals["shard_entries"] = shard_entries
+        return totals
+    
+    def _cleanup_expired(self) -> None:
+        """Background thread that expires due items shard by shard."""
+        while True:
+            try:
+                total = sum(shard._run_cleanup_pass() for shard in self.shards)
+                if total:
+                    logger.debug(f"Processed {total} expiry entries across shards")
+                if self.snapshot_path and time.time() - self._last_snapshot >= self.snapshot_interval:
+                    self.save_snapshot()
+                
+                time.sleep(self.cleanup_interval)
+            except Exception as e:
+                logger.error(f"Error in sharded cache cleanup: {str(e)}")
+                time.sleep(60)  # Wait a bit before retrying
+
+
+def create_cache(num_shards: int = 1, snapshot_path: Optional[str] = None):
+    """
+    Single-lock CacheService by default; ShardedCacheService only when num_shards > 1.
+    
+    Sharding is opt-in: bench_cache.py shows no throughput gain under the
+    GIL, so it is only worth enabling once a benchmark on the target
+    deployment does.
+    """
+    if num_shards > 1:
+        return ShardedCacheService(num_shards=num_shards, snapshot_path=snapshot_path)
+    return CacheService(snapshot_path=snapshot_path)
+
+
+# Shared application cache; set CACHE_SNAPSHOT_PATH to keep it warm across
+# restarts and CACHE_SHARDS > 1 to opt into lock striping
+cache = create_cache(int(os.getenv("CACHE_SHARDS", "1")), os.getenv("CACHE_SNAPSHOT_PATH"))
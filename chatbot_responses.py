@@ -9,12 +9,21 @@ COMMON_RESPONSES = {
         "Goodbye! Feel free to chat again if you have more car questions.",
         "Take care! Let me know if you need help with your vehicle later.",
         "Bye for now! I'm here whenever you need automotive assistance."
+    ],
+    "gratitude": [
+        "You're welcome! Anything else you'd like to know about this car?",
+        "Happy to help! Got any other car questions?",
+        "Anytime! Let me know if there's anything else I can look up for you."
+    ],
+    "busy": [
+        "I'm handling a lot of questions right now. Please try again in a moment!",
+        "Things are a little busy at the moment. Could you ask me again in a few seconds?"
     ]
 }
 
 def get_response_for_pattern(input_text):
     """Get predefined response for common patterns."""
-    text = input_text.lower().strip()
+    text = input_text.lower().strip().strip("!.?, ")
     
     if text in ["hi", "hello", "hey", "hi there", "hello there"]:
         import random
@@ -24,4 +33,13 @@ def get_response_for_pattern(input_text):
         import random
         return random.choice(COMMON_RESPONSES["farewells"])
     
-    return None  # No match
\ No newline at end of file
+    if text in ["thanks", "thank you", "thanks a lot", "thank you so much", "thx", "ty", "cheers"]:
+        import random
+        return random.choice(COMMON_RESPONSES["gratitude"])
+    
+    return None  # No match
+
+def get_busy_response():
+    """Canned reply for when no model can take the request right now."""
+    import random
+    return random.choice(COMMON_RESPONSES["busy"])
\ No newline at end of file
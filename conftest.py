@@ -0,0 +1,20 @@
+# conftest.py
+"""
+pytest setup: the modules here use package-relative imports and are
+deployed as the `app` package, so register this directory as `app`
+whatever the checkout is called, and import modules as app.<module>.
+"""
+
+import importlib.machinery
+import importlib.util
+import os
+import sys
+
+# Manual scripts that need live services, an API key and colorama; run them directly
+collect_ignore = ["test_chat_system.py", "test_hybrid_system.py", "test_ollama.py"]
+
+if "app" not in sys.modules:
+    _here = os.path.dirname(os.path.abspath(__file__))
+    _spec = importlib.machinery.ModuleSpec("app", None, is_package=True)
+    _spec.submodule_search_locations = [_here]
+    sys.modules["app"] = importlib.util.module_from_spec(_spec)
@@ -0,0 +1,84 @@
+# conversation_history.py
+"""
+Module for the in-memory conversation store behind the chat API.
+Keeps each user's recent exchanges plus the Ollama context of their last
+local reply, so the router can continue a local conversation without
+resending the prompt. Both are bounded: the least recently active users
+are dropped first.
+"""
+
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+
+class ConversationHistory:
+    """
+    Per-user chat history and Ollama contexts, LRU-bounded by user.
+
+    Attributes:
+        max_context_tokens: Longest Ollama context kept for reuse
+        max_users: Users whose history is kept; their contexts are dropped with it
+        max_llm_contexts: Users whose Ollama context is kept (each is up to
+            max_context_tokens ints, so this is smaller than max_users)
+    """
+
+    def __init__(self, max_context_tokens: int = 1536, max_users: int = 10000, max_llm_contexts: int = 1000):
+        self.history: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+        # Ollama context token arrays per user, for local-model turn reuse
+        self.llm_contexts: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.max_context_tokens = max_context_tokens
+        self.max_users = max_users
+        self.max_llm_contexts = max_llm_contexts
+
+    def get_history(self, user_id: str, limit: int = None):
+        if user_id not in self.history:
+            self.history[user_id] = []
+            self._evict()
+        self.history.move_to_end(user_id)
+        return self.history[user_id][-limit:] if limit else self.history[user_id]
+
+    def add_exchange(self, user_id: str, user_message: str, ai_response: str):
+        exchanges = self.get_history(user_id)
+        exchanges.append({
+            "user": user_message,
+            "ai": ai_response,
+            "timestamp": datetime.now().isoformat()
+        })
+        # Keep only last 20 exchanges
+        if len(exchanges) > 20:
+            self.history[user_id] = exchanges[-20:]
+        return True
+
+    def get_llm_context(self, user_id: str, car_id: Optional[int], last_response: str) -> Optional[List[int]]:
+        """
+        Ollama context for the user's next local turn, if it is still valid.
+
+        The context is only valid for the same car and when the last reply in
+        the history is the one it was produced with (no turns answered by
+        another model or the cache since).
+        """
+        entry = self.llm_contexts.get(user_id)
+        if entry is None:
+            return None
+        if entry["car_id"] != car_id or entry["last_response"] != last_response:
+            del self.llm_contexts[user_id]
+            return None
+        self.llm_contexts.move_to_end(user_id)
+        return entry["context"]
+
+    def set_llm_context(self, user_id: str, car_id: Optional[int], context: Optional[List[int]], last_response: str):
+        """Remember the context of a local reply; oversized contexts are dropped so the next prompt is rebuilt."""
+        if not context or len(context) > self.max_context_tokens:
+            self.llm_contexts.pop(user_id, None)
+            return
+        self.llm_contexts[user_id] = {"car_id": car_id, "context": context, "last_response": last_response}
+        self.llm_contexts.move_to_end(user_id)
+        self._evict()
+
+    def _evict(self) -> None:
+        while len(self.history) > self.max_users:
+            user_id, _ = self.history.popitem(last=False)
+            self.llm_contexts.pop(user_id, None)
+        while len(self.llm_contexts) > self.max_llm_contexts:
+            self.llm_contexts.popitem(last=False)
@@ -7,13 +7,13 @@ This serves as the main entry point for the chat API.
 import os
 from dotenv import load_dotenv
 import pathlib
-from fastapi import APIRouter, HTTPException, Body
+from fastapi import APIRouter, HTTPException, Body, Response
+from fastapi.responses import StreamingResponse
 from typing import List, Dict, Any, Optional
 from pydantic import BaseModel
 import logging
 import time
 import json
-from datetime import datetime
 
 # Load environment variables
 load_dotenv()
@@ -33,33 +33,49 @@ else:
     logger.warning("OPENAI_API_KEY not found in environment variables")
 
 # Import our new components with proper relative imports
-from .model_router import ModelRouter
+from .model_router import ModelRouter, current_conversation
+from .conversation_history import ConversationHistory
 from .automotive_system_message import create_automotive_system_message
 from .query_classifier import QueryClassifier
 from .response_analyzer import ResponseAnalyzer
 from .local_llm_client import LocalLLMClient
+from .llm_pool import LocalLLMPool
+from .telemetry import registry, span, start_timings
 
 router = APIRouter()
 
 # Initialize OpenAI client
 try:
-    from openai import OpenAI
+    from openai import OpenAI, AsyncOpenAI
     if openai_api_key:
-        openai_client = OpenAI(api_key=openai_api_key)
+        # OPENAI_BASE_URL points both clients at a compatible server (e.g. mock_llm_server.py)
+        openai_base_url = os.getenv("OPENAI_BASE_URL") or None
+        openai_client = OpenAI(api_key=openai_api_key, base_url=openai_base_url)
+        async_openai_client = AsyncOpenAI(api_key=openai_api_key, base_url=openai_base_url)
         logger.info("Successfully initialized OpenAI client")
     else:
         openai_client = None
+        async_openai_client = None
         logger.warning("OpenAI client not initialized due to missing key")
 except ImportError:
     openai_client = None
+    async_openai_client = None
     logger.warning("openai package not installed, some features will be unavailable")
 
-# Initialize local LLM client
+# Initialize local LLM client; OLLAMA_URLS="http://a:11434,http://b:11434" balances across servers
+ollama_urls = [url.strip() for url in os.getenv("OLLAMA_URLS", "").split(",") if url.strip()]
 try:
-    local_llm_client = LocalLLMClient()
+    if len(ollama_urls) > 1:
+        local_llm_client = LocalLLMPool(ollama_urls)
+    elif ollama_urls:
+        local_llm_client = LocalLLMClient(base_url=ollama_urls[0])
+    else:
+        local_llm_client = LocalLLMClient()
     local_health = local_llm_client.check_health()
     if local_health.get("status") == "online":
         logger.info("Successfully initialized local LLM client")
+        # Preload the model off the request path and keep it resident
+        local_llm_client.start_keepalive()
     else:
         local_llm_client = None
         logger.warning(f"Local LLM health check failed: {local_health}")
@@ -68,32 +84,10 @@ except Exception as e:
     logger.warning(f"Could not initialize Local LLM client: {e}")
 
 # Initialize router with both models
-model_router = ModelRouter(openai_client, local_llm_client)
-
-# Simple in-memory conversation history manager
-class ConversationHistory:
-    def __init__(self):
-        self.history: Dict[str, List[Dict[str, Any]]] = {}
-    
-    def get_history(self, user_id: str, limit: int = None):
-        if user_id not in self.history:
-            self.history[user_id] = []
-        return self.history[user_id][-limit:] if limit else self.history[user_id]
-    
-    def add_exchange(self, user_id: str, user_message: str, ai_response: str):
-        if user_id not in self.history:
-            self.history[user_id] = []
-        self.history[user_id].append({
-            "user": user_message,
-            "ai": ai_response,
-            "timestamp": datetime.now().isoformat()
-        })
-        # Keep only last 20 exchanges
-        if len(self.history[user_id]) > 20:
-            self.history[user_id] = self.history[user_id][-20:]
-        return True
+model_router = ModelRouter(openai_client, local_llm_client, async_openai_client=async_openai_client)
 
 conversation_manager = ConversationHistory()
+model_router.context_store = conversation_manager
 
 # Request and response models
 class ChatRequest(BaseModel):
@@ -102,6 +96,7 @@ class ChatRequest(BaseModel):
     user_id: str = "default_user"
     conversation_history: Optional[List[str]] = None
     force_model: Optional[str] = None  # 'openai', 'local', or None
+    include_timings: bool = False  # Per-stage durations in the response and a Server-Timing header
 
 class ChatResponse(BaseModel):
     response: str
@@ -110,10 +105,16 @@ class ChatResponse(BaseModel):
     query_types: Optional[List[str]] = None
     response_time: Optional[float] = None
     analysis: Optional[Dict[str, Any]] = None
+    cache_hit: Optional[bool] = None
+    timings: Optional[Dict[str, float]] = None  # Stage -> milliseconds, when requested
 
 @router.post("/", response_model=ChatResponse)
-async def process_chat(request: ChatRequest):
+async def process_chat(request: ChatRequest, http_response: Response):
+    check_force_model(request.force_model)
     start_time = time.time()
+    timings = start_timings() if request.include_timings else None
+    # Each request runs in its own context, so this is scoped to this chat turn
+    current_conversation.set(request.user_id)
     try:
         message = request.message.strip()
         car_id = request.car_id
@@ -122,15 +123,13 @@ async def process_chat(request: ChatRequest):
         
         logger.info(f"Received chat request: message='{message}', car_id={car_id}")
 
-        # Force model override if specified
-        model_router.set_force_model(request.force_model)
-
         # Retrieve car data if available
         car_data = None
         if car_id is not None:
             try:
                 from app.supabase_service import get_car_by_id
-                car_data = get_car_by_id(car_id)
+                with registry.time("chat_car_fetch_seconds"), span("car_fetch"):
+                    car_data = await get_car_by_id.acall(car_id)
                 logger.info(f"Retrieved car data: {car_data}")
             except Exception as e:
                 logger.warning(f"Could not get car data: {e}")
@@ -145,32 +144,33 @@ async def process_chat(request: ChatRequest):
                 response_time=time.time() - start_time
             )
 
-        # Build flat conversation history
-        flat_history: List[str] = []
-        if conversation_history:
-            flat_history = conversation_history
-        else:
-            exchanges = conversation_manager.get_history(user_id, limit=10)
-            for ex in exchanges:
-                flat_history.extend([ex["user"], ex["ai"]])
+        flat_history = build_flat_history(user_id, conversation_history)
 
         # Generate response
-        result = model_router.route_query(
-            query=message,
-            car_data=car_data,
-            conversation_history=flat_history
-        )
+        with span("route"):
+            result = await model_router.aroute_query(
+                query=message,
+                car_data=car_data,
+                conversation_history=flat_history,
+                force_model=request.force_model
+            )
 
         # Store history
         conversation_manager.add_exchange(user_id, message, result["response"])
 
+        if timings is not None:
+            timings.add("total", time.time() - start_time)
+            http_response.headers["Server-Timing"] = timings.server_timing()
+
         return ChatResponse(
             response=result["response"],
             model_used=result.get("model_used"),
             confidence=result.get("confidence"),
             query_types=result.get("query_types"),
             response_time=result.get("response_time"),
-            analysis=result.get("analysis")
+            analysis=result.get("analysis"),
+            cache_hit=result.get("cache_hit"),
+            timings=timings.as_dict() if timings is not None else None
         )
     except Exception as e:
         logger.error(f"Error processing chat request: {e}")
@@ -185,6 +185,68 @@ async def process_chat(request: ChatRequest):
             detail=f"An error occurred: {e}"
         )
 
+def check_force_model(force_model: Optional[str]) -> None:
+    """Reject an unknown per-request model override with a 400."""
+    if force_model is not None and force_model not in ModelRouter.MODELS:
+        raise HTTPException(status_code=400, detail="force_model must be 'openai', 'local', or null")
+
+def build_flat_history(user_id: str, conversation_history: List[str]) -> List[str]:
+    """Use the client-supplied history, or alternate user/ai turns from the server-side store."""
+    if conversation_history:
+        return conversation_history
+    flat_history: List[str] = []
+    exchanges = conversation_manager.get_history(user_id, limit=10)
+    for ex in exchanges:
+        flat_history.extend([ex["user"], ex["ai"]])
+    return flat_history
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.post("/stream")
+async def process_chat_stream(request: ChatRequest):
+    """Stream the reply as Server-Sent Events: `token` events, then a final `done` event."""
+    message = request.message.strip()
+    user_id = request.user_id
+    logger.info(f"Received streaming chat request: message='{message}', car_id={request.car_id}")
+    check_force_model(request.force_model)
+
+    car_data = None
+    if request.car_id is not None:
+        try:
+            from app.supabase_service import get_car_by_id
+            with registry.time("chat_car_fetch_seconds"):
+                car_data = await get_car_by_id.acall(request.car_id)
+        except Exception as e:
+            logger.warning(f"Could not get car data: {e}")
+
+    flat_history = build_flat_history(user_id, request.conversation_history or [])
+
+    def event_stream():
+        # Sync generator: Starlette iterates it in the threadpool, off the event loop
+        if not message:
+            text = "I'm not sure what you're asking. Can you provide more details?"
+            yield format_sse("token", {"text": text})
+            yield format_sse("done", {"response": text, "model_used": "rule", "query_types": ["empty"]})
+            return
+        try:
+            for event in model_router.stream_query(message, car_data, flat_history, force_model=request.force_model):
+                if event["type"] == "token":
+                    yield format_sse("token", {"text": event["text"]})
+                else:
+                    conversation_manager.add_exchange(user_id, message, event["response"])
+                    yield format_sse("done", {k: v for k, v in event.items() if k != "type"})
+        except Exception as e:
+            logger.error(f"Error streaming chat response: {e}")
+            yield format_sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get("/api/chat/metrics")
 async def get_metrics():
     return {
@@ -193,7 +255,8 @@ async def get_metrics():
         "models": {
             "openai": openai_client is not None,
             "local": local_llm_client is not None,
-            "local_health": local_llm_client.check_health() if local_llm_client else None
+            "local_health": await local_llm_client.acheck_health() if local_llm_client else None,
+            "local_metrics": local_llm_client.get_metrics() if local_llm_client else None
         }
     }
 
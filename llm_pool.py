@@ -0,0 +1,283 @@
+# llm_pool.py
+"""
+Module for spreading local LLM traffic across several Ollama servers.
+LocalLLMPool exposes the same interface as LocalLLMClient, so the model
+router can use it as its local_llm_client without any other changes.
+"""
+
+import random
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+import logging
+
+from .local_llm_client import LocalLLMClient
+from .admission import LocalLLMOverloaded
+
+logger = logging.getLogger(__name__)
+
+
+class _Endpoint:
+    """One Ollama server in the pool with its load and health state."""
+
+    def __init__(self, client: LocalLLMClient):
+        self.client = client
+        self.url = client.base_url
+        self.outstanding = 0
+        self.healthy = True
+        self.consecutive_failures = 0
+        self.requests = 0
+        self.failures = 0
+        self.cancelled = 0
+        self.last_check: Optional[float] = None
+
+
+class LocalLLMPool:
+    """
+    Power-of-two-choices load balancer over several LocalLLMClient endpoints.
+
+    Each request samples two healthy endpoints and goes to the one with fewer
+    outstanding requests. Endpoints leave the rotation after
+    `failure_threshold` consecutive failures or a failed health check, and
+    rejoin once a periodic check_health reports them online again.
+
+    Attributes:
+        endpoints: Per-server clients and their load/health state
+        health_check_interval: Seconds between background health checks
+        failure_threshold: Consecutive request failures that take an endpoint out
+    """
+
+    def __init__(
+        self,
+        base_urls: List[str],
+        model_name: str = "tinyllama:latest",
+        health_check_interval: float = 15.0,
+        failure_threshold: int = 3,
+        start_health_checks: bool = True,
+        **client_kwargs: Any
+    ):
+        """
+        Initialize the pool.
+
+        Args:
+            base_urls: Ollama server URLs
+            model_name: The model every server should serve
+            health_check_interval: Seconds between background health checks
+            failure_threshold: Consecutive failures before an endpoint is taken out
+            start_health_checks: Whether to start the background health-check thread
+            client_kwargs: Passed through to each LocalLLMClient
+        """
+        if not base_urls:
+            raise ValueError("LocalLLMPool needs at least one endpoint")
+
+        self.model_name = model_name
+        self.health_check_interval = health_check_interval
+        self.failure_threshold = failure_threshold
+        self.lock = threading.Lock()
+        self.endpoints = [
+            _Endpoint(LocalLLMClient(base_url=url, model_name=model_name, **client_kwargs))
+            for url in base_urls
+        ]
+
+        self._stop = threading.Event()
+        self._health_thread: Optional[threading.Thread] = None
+        if start_health_checks:
+            self._health_thread = threading.Thread(
+                target=self._health_loop, name="llm-pool-health", daemon=True
+            )
+            self._health_thread.start()
+
+    # ------------------------------------------------------------------
+    # Endpoint selection
+    # ------------------------------------------------------------------
+    def _pick(self, exclude: Optional[List[_Endpoint]] = None) -> Optional[_Endpoint]:
+        """Power of two choices among healthy, non-saturated endpoints and reserve it."""
+        exclude = exclude or []
+        with self.lock:
+            candidates = [
+                ep for ep in self.endpoints
+                if ep.healthy and ep not in exclude and not ep.client.is_saturated()
+            ]
+            if not candidates:
+                # Everything looks down: fail open rather than refusing all traffic
+                candidates = [ep for ep in self.endpoints if ep not in exclude and not ep.client.is_saturated()]
+            if not candidates:
+                return None
+
+            if len(candidates) > 2:
+                candidates = random.sample(candidates, 2)
+            chosen = min(candidates, key=lambda ep: ep.outstanding)
+            chosen.outstanding += 1
+            chosen.requests += 1
+            return chosen
+
+    def _done(self, endpoint: _Endpoint, failed: Optional[bool]) -> None:
+        """Release a reserved endpoint; failed is None when the caller gave up on the request."""
+        with self.lock:
+            endpoint.outstanding -= 1
+            if failed is None:
+                # Cancellation (asyncio.CancelledError, GeneratorExit) says nothing about the server
+                endpoint.cancelled += 1
+                return
+            if not failed:
+                endpoint.consecutive_failures = 0
+                return
+            endpoint.failures += 1
+            endpoint.consecutive_failures += 1
+            if endpoint.healthy and endpoint.consecutive_failures >= self.failure_threshold:
+                endpoint.healthy = False
+                logger.warning(f"Taking {endpoint.url} out of rotation after {endpoint.consecutive_failures} failures")
+
+    @staticmethod
+    def _failed(result: Dict[str, Any]) -> bool:
+        # Shedding means the server is busy, not broken
+        return bool(result.get("error")) and not result.get("overloaded")
+
+    def _overloaded(self) -> Dict[str, Any]:
+        return {
+            "text": "The local model is busy right now.",
+            "model": self.model_name,
+            "error": True,
+            "overloaded": True,
+            "latency": 0.0
+        }
+
+    # ------------------------------------------------------------------
+    # LocalLLMClient interface
+    # ------------------------------------------------------------------
+    def generate_response(self, *args: Any, **kwargs: Any) -> Dict[str, Any]:
+        """generate_response on the least loaded of two sampled endpoints; retries elsewhere if shed."""
+        tried: List[_Endpoint] = []
+        while True:
+            endpoint = self._pick(tried)
+            if endpoint is None:
+                return self._overloaded()
+            tried.append(endpoint)
+            failed: Optional[bool] = None
+            try:
+                result = endpoint.client.generate_response(*args, **kwargs)
+                failed = self._failed(result)
+            except Exception:
+                failed = True
+                raise
+            finally:
+                self._done(endpoint, failed)
+            if not result.get("overloaded"):
+                return result
+
+    async def agenerate_response(self, *args: Any, **kwargs: Any) -> Dict[str, Any]:
+        """Async generate_response with the same endpoint selection."""
+        tried: List[_Endpoint] = []
+        while True:
+            endpoint = self._pick(tried)
+            if endpoint is None:
+                return self._overloaded()
+            tried.append(endpoint)
+            failed: Optional[bool] = None
+            try:
+                result = await endpoint.client.agenerate_response(*args, **kwargs)
+                failed = self._failed(result)
+            except Exception:
+                failed = True
+                raise
+            finally:
+                self._done(endpoint, failed)
+            if not result.get("overloaded"):
+                return result
+
+    def generate_stream(self, *args: Any, **kwargs: Any) -> Iterator[str]:
+        """generate_stream on one endpoint; the endpoint counts as outstanding until the stream ends."""
+        endpoint = self._pick()
+        if endpoint is None:
+            raise LocalLLMOverloaded("All local LLM endpoints are overloaded")
+        failed: Optional[bool] = None
+        try:
+            yield from endpoint.client.generate_stream(*args, **kwargs)
+            failed = False
+        except LocalLLMOverloaded:
+            failed = False
+            raise
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._done(endpoint, failed)
+
+    def is_saturated(self) -> bool:
+        """Whether every endpoint would shed a new request."""
+        return all(ep.client.is_saturated() for ep in self.endpoints)
+
+    def check_health(self) -> Dict[str, Any]:
+        """Check every endpoint and update the rotation."""
+        results = {ep.url: self._check_endpoint(ep) for ep in self.endpoints}
+        online = [url for url, health in results.items() if health.get("status") == "online"]
+        return {
+            "status": "online" if online else "offline",
+            "healthy_endpoints": len(online),
+            "endpoints": results
+        }
+
+    async def acheck_health(self) -> Dict[str, Any]:
+        """Health summary from the most recent checks, without new network calls."""
+        with self.lock:
+            endpoints = {ep.url: {"healthy": ep.healthy, "last_check": ep.last_check} for ep in self.endpoints}
+        healthy = sum(1 for ep in endpoints.values() if ep["healthy"])
+        return {
+            "status": "online" if healthy else "offline",
+            "healthy_endpoints": healthy,
+            "endpoints": endpoints
+        }
+
+    def _check_endpoint(self, endpoint: _Endpoint) -> Dict[str, Any]:
+        health = endpoint.client.check_health()
+        online = health.get("status") == "online"
+        with self.lock:
+            endpoint.last_check = time.time()
+            if online and not endpoint.healthy:
+                logger.info(f"{endpoint.url} recovered, returning it to rotation")
+                endpoint.consecutive_failures = 0
+            elif not online and endpoint.healthy:
+                logger.warning(f"{endpoint.url} failed health check: {health.get('error')}")
+            endpoint.healthy = online
+        return health
+
+    def _health_loop(self) -> None:
+        while not self._stop.wait(self.health_check_interval):
+            for endpoint in self.endpoints:
+                self._check_endpoint(endpoint)
+
+    def start_keepalive(self) -> None:
+        """Warm and keep the model resident on every endpoint."""
+        for endpoint in self.endpoints:
+            endpoint.client.start_keepalive()
+
+    def close(self) -> None:
+        """Stop health checks and close every endpoint's client."""
+        self._stop.set()
+        for endpoint in self.endpoints:
+            endpoint.client.close()
+
+    async def aclose(self) -> None:
+        for endpoint in self.endpoints:
+            await endpoint.client.aclose()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Per-endpoint load, health and client metrics."""
+        with self.lock:
+            state = {
+                ep.url: {
+                    "healthy": ep.healthy,
+                    "outstanding": ep.outstanding,
+                    "requests": ep.requests,
+                    "failures": ep.failures,
+                    "cancelled": ep.cancelled,
+                }
+                for ep in self.endpoints
+            }
+        for endpoint in self.endpoints:
+            state[endpoint.url]["client"] = endpoint.client.get_metrics()
+        return {
+            "healthy_endpoints": sum(1 for ep in state.values() if ep["healthy"]),
+            "total_requests": sum(ep["requests"] for ep in state.values()),
+            "endpoints": state
+        }
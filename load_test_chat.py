@@ -0,0 +1,250 @@
+# load_test_chat.py
+"""
+Concurrent load test for the chat API.
+Drives POST /api/chat/ (or the /api/chat/stream SSE endpoint) with a mix
+of query types and car ids, either closed-loop at a fixed concurrency or
+open-loop at a Poisson arrival rate, and reports throughput, latency and
+time-to-first-token percentiles, errors and the model_used distribution.
+Results are written as JSON so runs can be compared.
+"""
+
+import argparse
+import http.client
+import json
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+
+# (query type, weight, queries); weights roughly follow production chat traffic
+QUERY_MIX = [
+    ("greeting", 10, ["hi", "hello", "thanks", "hey there"]),
+    ("performance", 20, ["How much horsepower does it have?", "What's the 0-60 time?", "How's the acceleration?"]),
+    ("fuel_economy", 15, ["What's the mpg?", "whats the MPG on the highway", "Is it fuel efficient?"]),
+    ("reliability", 15, ["Is this car reliable?", "What are common problems with it?", "How long does the engine last?"]),
+    ("safety", 10, ["How safe is this car?", "What safety features does it have?"]),
+    ("comparison", 10, ["How does it compare to a Honda Civic?", "Is it better than the Toyota Camry?"]),
+    ("price", 10, ["How much does it cost?", "Is it good value for money?"]),
+    ("personal", 10, ["I have a long commute, is this a good fit for me?", "My family has two kids, will we fit?"]),
+]
+
+
+def pick_query(rng: random.Random) -> Dict[str, str]:
+    kind, _, queries = rng.choices(QUERY_MIX, weights=[w for _, w, _ in QUERY_MIX])[0]
+    return {"type": kind, "message": rng.choice(queries)}
+
+
+def percentile(samples: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile (None with no samples)."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class ChatLoadClient:
+    """Per-thread keep-alive HTTP connections to the API."""
+
+    def __init__(self, base_url: str, timeout: float):
+        parsed = urlparse(base_url)
+        self.host = parsed.hostname
+        self.port = parsed.port or (443 if parsed.scheme == "https" else 80)
+        self.https = parsed.scheme == "https"
+        self.prefix = parsed.path.rstrip("/")
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def _connection(self) -> http.client.HTTPConnection:
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            conn = self.local.conn = cls(self.host, self.port, timeout=self.timeout)
+        return conn
+
+    def _reset(self) -> None:
+        conn = getattr(self.local, "conn", None)
+        if conn is not None:
+            conn.close()
+        self.local.conn = None
+
+    def chat(self, payload: Dict[str, Any], stream: bool, started: float) -> Dict[str, Any]:
+        """Send one chat request; latencies are measured from `started` (the scheduled time)."""
+        path = f"{self.prefix}/api/chat/stream" if stream else f"{self.prefix}/api/chat/"
+        body = json.dumps(payload)
+        try:
+            conn = self._connection()
+            conn.request("POST", path, body=body, headers={"Content-Type": "application/json"})
+            response = conn.getresponse()
+            if not stream:
+                data = response.read()
+                result = {"status": response.status, "latency": time.perf_counter() - started}
+                if response.status == 200:
+                    parsed = json.loads(data)
+                    result.update(model_used=parsed.get("model_used"), cache_hit=parsed.get("cache_hit"))
+                return result
+            return self._read_stream(response, started)
+        except (OSError, http.client.HTTPException, json.JSONDecodeError) as e:
+            self._reset()
+            return {"status": "exception", "error": type(e).__name__, "latency": time.perf_counter() - started}
+
+    def _read_stream(self, response: http.client.HTTPResponse, started: float) -> Dict[str, Any]:
+        result: Dict[str, Any] = {"status": response.status, "ttft": None}
+        event = None
+        for raw in response:
+            line = raw.decode().rstrip("\n")
+            if line.startswith("event: "):
+                event = line[7:]
+            elif line.startswith("data: "):
+                if event == "token" and result["ttft"] is None:
+                    result["ttft"] = time.perf_counter() - started
+                elif event == "done":
+                    done = json.loads(line[6:])
+                    result.update(model_used=done.get("model_used"), cache_hit=done.get("cache_hit"))
+                elif event == "error":
+                    result["status"] = "stream_error"
+        result["latency"] = time.perf_counter() - started
+        return result
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    client = ChatLoadClient(args.url, args.timeout)
+    results: List[Dict[str, Any]] = []
+    results_lock = threading.Lock()
+
+    def one(index: int, scheduled: float) -> None:
+        # Per-request generator: the same seed gives the same request sequence
+        request_rng = random.Random(args.seed * 1_000_003 + index)
+        query = pick_query(request_rng)
+        payload = {
+            "message": query["message"],
+            "car_id": request_rng.choice(args.car_ids) if args.car_ids else None,
+            "user_id": f"load-user-{index % args.users}",
+        }
+        outcome = client.chat(payload, args.stream, scheduled)
+        outcome["query_type"] = query["type"]
+        with results_lock:
+            results.append(outcome)
+
+    start = time.perf_counter()
+    deadline = start + args.duration if args.duration else None
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        index = 0
+        if args.rate:
+            # Open loop: arrivals don't wait for earlier requests, and latency
+            # counts from the scheduled arrival, so queueing is not hidden
+            next_arrival = start
+            while (deadline is None and index < args.requests) or (deadline and next_arrival < deadline):
+                delay = next_arrival - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(one, index, next_arrival)
+                index += 1
+                next_arrival += rng.expovariate(args.rate)
+        else:
+            # Closed loop: `concurrency` users each send back-to-back requests
+            counter = iter(range(10 ** 12))
+            counter_lock = threading.Lock()
+
+            def user_loop() -> None:
+                while True:
+                    with counter_lock:
+                        i = next(counter)
+                    if (deadline and time.perf_counter() >= deadline) or (not deadline and i >= args.requests):
+                        return
+                    one(i, time.perf_counter())
+
+            for _ in range(args.concurrency):
+                pool.submit(user_loop)
+    elapsed = time.perf_counter() - start
+
+    return summarize(results, elapsed, args)
+
+
+def summarize(results: List[Dict[str, Any]], elapsed: float, args: argparse.Namespace) -> Dict[str, Any]:
+    ok = [r for r in results if r["status"] == 200]
+    latencies = [r["latency"] for r in ok]
+    ttfts = [r["ttft"] for r in ok if r.get("ttft") is not None]
+
+    def pcts(samples: List[float]) -> Dict[str, Optional[float]]:
+        return {f"p{p}": percentile(samples, p) for p in (50, 95, 99)} | {
+            "max": max(samples) if samples else None,
+            "mean": sum(samples) / len(samples) if samples else None,
+        }
+
+    by_type: Dict[str, Dict[str, Any]] = {}
+    for kind in sorted({r["query_type"] for r in results}):
+        typed = [r for r in results if r["query_type"] == kind]
+        typed_ok = [r["latency"] for r in typed if r["status"] == 200]
+        by_type[kind] = {
+            "requests": len(typed),
+            "errors": len(typed) - len(typed_ok),
+            "p50": percentile(typed_ok, 50),
+            "p95": percentile(typed_ok, 95),
+        }
+
+    return {
+        "config": {
+            "url": args.url,
+            "stream": args.stream,
+            "concurrency": args.concurrency,
+            "rate": args.rate,
+            "requests": args.requests,
+            "duration": args.duration,
+            "car_ids": args.car_ids,
+            "seed": args.seed,
+        },
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "elapsed_seconds": elapsed,
+        "total_requests": len(results),
+        "throughput_rps": len(ok) / elapsed if elapsed else 0.0,
+        "error_rate": (len(results) - len(ok)) / len(results) if results else 0.0,
+        "status_counts": dict(Counter(str(r["status"]) for r in results)),
+        "latency_seconds": pcts(latencies),
+        "ttft_seconds": pcts(ttfts) if args.stream else None,
+        "model_used": dict(Counter(r.get("model_used") or "unknown" for r in ok)),
+        "cache_hit_rate": sum(1 for r in ok if r.get("cache_hit")) / len(ok) if ok else 0.0,
+        "by_query_type": by_type,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the chat API')
+    parser.add_argument('--url', default='http://localhost:8000', help='API base URL')
+    parser.add_argument('--stream', action='store_true', help='Use the SSE /api/chat/stream endpoint and record TTFT')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent users (closed loop) or max in flight')
+    parser.add_argument('--rate', type=float, default=None, help='Open-loop Poisson arrival rate (requests/s)')
+    parser.add_argument('--requests', type=int, default=200, help='Total requests (ignored with --duration)')
+    parser.add_argument('--duration', type=float, default=None, help='Run for this many seconds instead')
+    parser.add_argument('--car-ids', type=int, nargs='*', default=[1, 2, 3, 4, 5], help='Car ids to spread queries over')
+    parser.add_argument('--users', type=int, default=50, help='Distinct user_ids to spread conversations over')
+    parser.add_argument('--timeout', type=float, default=60.0, help='Per-request timeout (s)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed for the query mix')
+    parser.add_argument('--output', default=None, help='Write the JSON report to this file')
+
+    args = parser.parse_args()
+    report = run(args)
+
+    latency = report["latency_seconds"]
+    fmt = lambda v: f"{v * 1000:.0f}ms" if v is not None else "-"
+    print(f"{report['total_requests']} requests in {report['elapsed_seconds']:.1f}s "
+          f"({report['throughput_rps']:.1f} req/s), error rate {report['error_rate']:.1%}")
+    print(f"latency p50 {fmt(latency['p50'])}  p95 {fmt(latency['p95'])}  p99 {fmt(latency['p99'])}")
+    if report["ttft_seconds"]:
+        ttft = report["ttft_seconds"]
+        print(f"ttft    p50 {fmt(ttft['p50'])}  p95 {fmt(ttft['p95'])}  p99 {fmt(ttft['p99'])}")
+    print(f"models  {report['model_used']}  cache hit rate {report['cache_hit_rate']:.1%}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,14 +3,24 @@ Client for interacting with local LLM through Ollama.
 This provides a consistent interface for generating responses from the local model.
 """
 
+import asyncio
 import requests
+from requests.adapters import HTTPAdapter
 import logging
+import threading
 import time
 import json
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+try:
+    import httpx  # Async HTTP client for the a* methods
+except ImportError:
+    httpx = None
 
 # Import pattern matching for common phrases
 from .chatbot_responses import get_response_for_pattern
+from .admission import AdmissionController, LocalLLMOverloaded
+from .telemetry import registry
 
 logger = logging.getLogger(__name__)
 
@@ -22,13 +32,26 @@ class LocalLLMClient:
         base_url: The URL of the Ollama server
         model_name: The name of the model to use
         timeout: Timeout for requests to the Ollama server
+        connect_timeout: Timeout for establishing a connection (separate from read timeouts)
+        session: Pooled keep-alive HTTP session used for every sync call
+        keep_alive: How long Ollama keeps the model loaded after each request
+        admission: Concurrency limiter and bounded wait queue for generate calls
     """
 
     def __init__(
         self,
         base_url: str = "http://localhost:11434",
         model_name: str = "tinyllama:latest",  # CORRECT MODEL NAME
-        timeout: int = 10
+        timeout: int = 10,
+        connect_timeout: float = 2.0,
+        pool_size: int = 10,
+        keepalive_expiry: float = 60.0,
+        keep_alive: str = "30m",
+        keepalive_interval: float = 240.0,
+        cold_load_threshold: float = 0.5,
+        max_concurrency: int = 2,
+        max_queue: int = 8,
+        queue_timeout: float = 2.0
     ):
         """
         Initialize the local LLM client.
@@ -36,18 +59,49 @@ class LocalLLMClient:
         Args:
             base_url: The URL of the Ollama server
             model_name: The name of the model to use (default: tinyllama:latest)
-            timeout: Timeout for requests in seconds
+            timeout: Read timeout for requests in seconds
+            connect_timeout: Connect timeout in seconds
+            pool_size: Maximum pooled keep-alive connections to the server
+            keepalive_expiry: Seconds an idle pooled connection is kept (async client)
+            keep_alive: Ollama keep_alive sent with every request (e.g. "30m", "-1" to pin)
+            keepalive_interval: Idle seconds after which the background thread pings the model
+            cold_load_threshold: Ollama load_duration (seconds) above which a call counts as a cold load
+            max_concurrency: Generate calls allowed to run on Ollama at once
+            max_queue: Calls allowed to wait for a slot; more are shed immediately
+            queue_timeout: Seconds a call may wait for a slot before it is shed
         """
         self.base_url = base_url
         self.model_name = model_name
         self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.pool_size = pool_size
+        self.keepalive_expiry = keepalive_expiry
+        self._async_client = None
+        self.keep_alive = keep_alive
+        self.keepalive_interval = keepalive_interval
+        self.cold_load_threshold = cold_load_threshold
+        self._last_used = time.monotonic()
+        self._keepalive_stop = threading.Event()
+        self._keepalive_thread: Optional[threading.Thread] = None
+        self.admission = AdmissionController(max_concurrency, max_queue, queue_timeout)
+
+        # Reuse TCP connections to Ollama instead of opening one per call
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
 
         # Performance metrics
         self.metrics = {
             "total_requests": 0,
             "total_tokens": 0,
             "avg_latency": 0,
-            "errors": 0
+            "errors": 0,
+            "warmups": 0,
+            "warmup_errors": 0,
+            "cold_loads": 0,
+            "last_cold_load_duration": 0,
+            "total_cold_load_duration": 0
         }
 
         # Initial model validation
@@ -61,9 +115,9 @@ class LocalLLMClient:
             True if model is available, False otherwise
         """
         try:
-            response = requests.get(
+            response = self.session.get(
                 f"{self.base_url}/api/tags",
-                timeout=self.timeout
+                timeout=self._timeouts(self.timeout)
             )
             if response.status_code == 200:
                 models = response.json().get("models", [])
@@ -81,12 +135,83 @@ class LocalLLMClient:
             logger.error(f"Error connecting to Ollama server: {e}")
             return False
 
+    def warmup(self) -> bool:
+        """
+        Load the model into memory with a zero-token request.
+
+        Ollama loads the model and returns without generating when the prompt
+        is empty, so this pays the cold-load cost outside of user traffic.
+
+        Returns:
+            True if the model is loaded, False otherwise
+        """
+        payload = {
+            "model": self.model_name,
+            "prompt": "",
+            "stream": False,
+            "keep_alive": self.keep_alive
+        }
+        try:
+            response = self.session.post(
+                f"{self.base_url}/api/generate",
+                json=payload,
+                timeout=self._timeouts(max(self.timeout, 60))
+            )
+            if response.status_code != 200:
+                logger.warning(f"Warmup of {self.model_name} failed: HTTP {response.status_code}")
+                self.metrics["warmup_errors"] += 1
+                return False
+            self.metrics["warmups"] += 1
+            self._record_load(response.json())
+            self._last_used = time.monotonic()
+            return True
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.warning(f"Warmup of {self.model_name} failed: {e}")
+            self.metrics["warmup_errors"] += 1
+            return False
+
+    def start_keepalive(self) -> None:
+        """
+        Warm the model in the background and keep it resident.
+
+        The thread preloads the model immediately, then re-pings it whenever
+        no request has reached Ollama for keepalive_interval seconds.
+        """
+        if self._keepalive_thread is not None and self._keepalive_thread.is_alive():
+            return
+        self._keepalive_stop.clear()
+        self._keepalive_thread = threading.Thread(
+            target=self._keepalive_loop, name="ollama-keepalive", daemon=True
+        )
+        self._keepalive_thread.start()
+
+    def stop_keepalive(self) -> None:
+        """Stop the background keep-alive thread."""
+        self._keepalive_stop.set()
+
+    def _keepalive_loop(self) -> None:
+        self.warmup()
+        while not self._keepalive_stop.wait(self.keepalive_interval / 4):
+            if time.monotonic() - self._last_used >= self.keepalive_interval:
+                logger.info(f"Pinging idle model {self.model_name}")
+                self.warmup()
+
+    def _record_load(self, result: Dict[str, Any]) -> None:
+        """Count a cold load when Ollama reports a significant load_duration (ns)."""
+        load_duration = result.get("load_duration", 0) / 1e9
+        if load_duration >= self.cold_load_threshold:
+            self.metrics["cold_loads"] += 1
+            self.metrics["last_cold_load_duration"] = load_duration
+            self.metrics["total_cold_load_duration"] += load_duration
+            logger.warning(f"Cold load of {self.model_name} took {load_duration:.2f}s")
+
     def generate_response(
         self,
         prompt: str,
         system_prompt: Optional[str] = None,
         temperature: float = 0.7,
-        max_tokens: int = 250
+        max_tokens: int = 250,
+        context: Optional[List[int]] = None
     ) -> Dict[str, Any]:
         """
         Generate a response with minimal payload optimizations:
@@ -94,6 +219,8 @@ class LocalLLMClient:
         - Greeting overrides
         - Simple vs complex query handling
         - Ultra-minimal Ollama payload
+        - Optional Ollama `context` from the previous turn, so only the new
+          prompt is evaluated; the returned "context" continues it next turn
         """
         start_time = time.time()
         self.metrics["total_requests"] += 1
@@ -108,84 +235,278 @@ class LocalLLMClient:
                 "latency": 0.1
             }
 
-        # Greeting override
-        lower_prompt = prompt.lower().strip()
-        greetings = ["hi", "hello", "hey", "hi there", "hello there"]
-        if lower_prompt in greetings:
-            actual_prompt = (
-                f"The user said: {prompt}\n\n"
-                "Respond with a friendly, brief greeting as a car assistant."
-            )
-        else:
-            actual_prompt = prompt
+        if not self.admission.acquire():
+            return self._overloaded(start_time)
 
-        # Determine simplicity for timeout and payload
-        simple_query = actual_prompt.lower().strip()
-        is_simple = len(simple_query.split()) < 10
-        timeout = 5 if is_simple else 10
+        payload, timeout = self._build_payload(prompt, stream=False, system_prompt=system_prompt, context=context)
 
         try:
-            # Ultra-minimal payload for Ollama
-            payload = {
-                "model": self.model_name,
-                "prompt": actual_prompt if is_simple else actual_prompt[:200],
-                "stream": False,
-                "options": {
-                    "num_predict": 30 if is_simple else 100
-                }
+            logger.info(f"Sending ultra-minimal request to {self.model_name}")
+            response = self.session.post(
+                f"{self.base_url}/api/generate",
+                json=payload,
+                timeout=self._timeouts(timeout)
+            )
+
+            return self._parse_generate_response(response.status_code, response.text, start_time)
+        except Exception as e:
+            return self._request_failed(e, start_time)
+        finally:
+            self.admission.release()
+
+    async def agenerate_response(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 250,
+        context: Optional[List[int]] = None
+    ) -> Dict[str, Any]:
+        """
+        Async generate_response on httpx. Cancelling the awaiting task aborts
+        the HTTP request. Without httpx installed, the sync call runs in a thread.
+        """
+        if httpx is None:
+            return await asyncio.to_thread(
+                self.generate_response, prompt, system_prompt, temperature, max_tokens, context
+            )
+
+        start_time = time.time()
+        self.metrics["total_requests"] += 1
+
+        pattern_response = get_response_for_pattern(prompt)
+        if pattern_response:
+            return {
+                "text": pattern_response,
+                "model": "pattern_match",
+                "tokens": 0,
+                "latency": 0.1
             }
 
-            logger.info(f"Sending ultra-minimal request to {self.model_name}")
-            response = requests.post(
+        if not await self.admission.aacquire():
+            return self._overloaded(start_time)
+
+        payload, timeout = self._build_payload(prompt, stream=False, system_prompt=system_prompt, context=context)
+
+        try:
+            logger.info(f"Sending ultra-minimal async request to {self.model_name}")
+            response = await self._get_async_client().post(
                 f"{self.base_url}/api/generate",
                 json=payload,
-                timeout=timeout
+                timeout=httpx.Timeout(timeout, connect=self.connect_timeout)
             )
+            return self._parse_generate_response(response.status_code, response.text, start_time)
+        except Exception as e:
+            return self._request_failed(e, start_time)
+        finally:
+            self.admission.release()
 
-            latency = time.time() - start_time
+    def _parse_generate_response(self, status_code: int, body: str, start_time: float) -> Dict[str, Any]:
+        """Turn a non-streaming /api/generate reply into the client's result dict."""
+        latency = time.time() - start_time
 
-            if response.status_code == 200:
-                first_line = response.text.split('\n')[0]
-                try:
-                    result = json.loads(first_line)
-                    tokens = result.get("eval_count", 0)
-                    self.metrics["total_tokens"] += tokens
-                    self._update_latency(latency)
-                    logger.info(f"Generated response in {latency:.2f}s ({tokens} tokens)")
-                    return {
-                        "text": result.get("response", ""),
-                        "model": self.model_name,
-                        "tokens": tokens,
-                        "latency": latency
-                    }
-                except json.JSONDecodeError as e:
-                    logger.error(f"JSON parsing error: {e}")
-                    return {
-                        "text": "I'm having trouble processing your request. Could you ask a simple question about this vehicle?",
-                        "model": self.model_name,
-                        "error": True,
-                        "latency": latency
-                    }
-            else:
-                logger.error(f"Error from Ollama API: {response.status_code}")
+        if status_code == 200:
+            first_line = body.split('\n')[0]
+            try:
+                result = json.loads(first_line)
+                self._record_load(result)
+                tokens = result.get("eval_count", 0)
+                self.metrics["total_tokens"] += tokens
+                self._update_latency(latency)
+                logger.info(f"Generated response in {latency:.2f}s ({tokens} tokens)")
                 return {
-                    "text": "I encountered a technical issue. Try asking about specific car features instead.",
+                    "text": result.get("response", ""),
+                    "model": self.model_name,
+                    "tokens": tokens,
+                    "prompt_tokens": result.get("prompt_eval_count", 0),
+                    "context": result.get("context"),
+                    "latency": latency
+                }
+            except json.JSONDecodeError as e:
+                logger.error(f"JSON parsing error: {e}")
+                return {
+                    "text": "I'm having trouble processing your request. Could you ask a simple question about this vehicle?",
                     "model": self.model_name,
                     "error": True,
                     "latency": latency
                 }
-        except Exception as e:
-            logger.error(f"Error generating response: {e}")
-            latency = time.time() - start_time
+        else:
+            logger.error(f"Error from Ollama API: {status_code}")
             return {
-                "text": "I need a moment to think about that. Could you ask a simpler car-related question?",
+                "text": "I encountered a technical issue. Try asking about specific car features instead.",
                 "model": self.model_name,
                 "error": True,
                 "latency": latency
             }
 
+    def _request_failed(self, error: Exception, start_time: float) -> Dict[str, Any]:
+        logger.error(f"Error generating response: {error}")
+        latency = time.time() - start_time
+        return {
+            "text": "I need a moment to think about that. Could you ask a simpler car-related question?",
+            "model": self.model_name,
+            "error": True,
+            "latency": latency
+        }
+
+    def _overloaded(self, start_time: float) -> Dict[str, Any]:
+        """Result for a request shed by admission control; no call reached Ollama."""
+        logger.warning(f"Local LLM overloaded, shedding request: {self.admission.get_stats()['queue_depth']} queued")
+        return {
+            "text": "The local model is busy right now.",
+            "model": self.model_name,
+            "error": True,
+            "overloaded": True,
+            "latency": time.time() - start_time
+        }
+
+    def is_saturated(self) -> bool:
+        """Whether a new generate call would be shed without waiting."""
+        return self.admission.is_saturated()
+
+    def _get_async_client(self) -> "httpx.AsyncClient":
+        """Lazily create the shared httpx client."""
+        if self._async_client is None or self._async_client.is_closed:
+            self._async_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.pool_size,
+                    max_keepalive_connections=self.pool_size,
+                    keepalive_expiry=self.keepalive_expiry
+                ),
+                timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout)
+            )
+        return self._async_client
+
+    async def aclose(self) -> None:
+        """Close the async HTTP client."""
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+    def generate_stream(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 250
+    ) -> Iterator[str]:
+        """
+        Stream a response token by token from Ollama's NDJSON /api/generate stream.
+
+        Yields:
+            Text fragments as Ollama produces them
+
+        Raises:
+            LocalLLMOverloaded: If admission control sheds the request
+            RuntimeError: If Ollama returns an error or an unreadable stream
+        """
+        start_time = time.time()
+        self.metrics["total_requests"] += 1
+
+        pattern_response = get_response_for_pattern(prompt)
+        if pattern_response:
+            yield pattern_response
+            return
+
+        if not self.admission.acquire():
+            raise LocalLLMOverloaded("Local LLM overloaded")
+
+        payload, timeout = self._build_payload(prompt, stream=True, system_prompt=system_prompt)
+        logger.info(f"Streaming request to {self.model_name}")
+        try:
+            with self.session.post(
+                f"{self.base_url}/api/generate",
+                json=payload,
+                timeout=self._timeouts(timeout),
+                stream=True
+            ) as response:
+                if response.status_code != 200:
+                    raise RuntimeError(f"Error from Ollama API: {response.status_code}")
+
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get("error"):
+                        raise RuntimeError(chunk["error"])
+                    if chunk.get("response"):
+                        yield chunk["response"]
+                    if chunk.get("done"):
+                        self._record_load(chunk)
+                        tokens = chunk.get("eval_count", 0)
+                        self.metrics["total_tokens"] += tokens
+                        latency = time.time() - start_time
+                        self._update_latency(latency)
+                        logger.info(f"Streamed response in {latency:.2f}s ({tokens} tokens)")
+                        return
+        except (requests.exceptions.RequestException, json.JSONDecodeError) as e:
+            self.metrics["errors"] += 1
+            raise RuntimeError(f"Error streaming from Ollama: {e}") from e
+        finally:
+            self.admission.release()
+
+    def _build_payload(
+        self,
+        prompt: str,
+        stream: bool,
+        system_prompt: Optional[str] = None,
+        context: Optional[List[int]] = None
+    ) -> Tuple[Dict[str, Any], int]:
+        """
+        Build the ultra-minimal Ollama payload and pick a timeout.
+
+        The prompt is sent whole: callers keep it within a token budget
+        (see prompt_builder) instead of it being cut here.
+
+        Returns:
+            Tuple of (payload, timeout in seconds)
+        """
+        self._last_used = time.monotonic()
+
+        # Greeting override
+        lower_prompt = prompt.lower().strip()
+        greetings = ["hi", "hello", "hey", "hi there", "hello there"]
+        if lower_prompt in greetings:
+            actual_prompt = (
+                f"The user said: {prompt}\n\n"
+                "Respond with a friendly, brief greeting as a car assistant."
+            )
+        else:
+            actual_prompt = prompt
+
+        # Determine simplicity for timeout and payload
+        simple_query = actual_prompt.lower().strip()
+        is_simple = len(simple_query.split()) < 10
+        timeout = 5 if is_simple else 10
+
+        payload = {
+            "model": self.model_name,
+            "prompt": actual_prompt,
+            "stream": stream,
+            "keep_alive": self.keep_alive,
+            "options": {
+                "num_predict": 30 if is_simple else 100
+            }
+        }
+        if context:
+            # The earlier turns (system prompt included) are already in the context
+            payload["context"] = context
+        elif system_prompt:
+            payload["system"] = system_prompt
+        return payload, timeout
+
+    def _timeouts(self, read_timeout: float) -> Tuple[float, float]:
+        """(connect, read) timeout pair for requests."""
+        return (self.connect_timeout, read_timeout)
+
+    def close(self) -> None:
+        """Stop the keep-alive thread and close the pooled sync session."""
+        self.stop_keepalive()
+        self.session.close()
+
     def _update_latency(self, latency: float) -> None:
         """Helper to update running average latency."""
+        registry.observe("local_llm_latency_seconds", latency, {"endpoint": self.base_url})
         count = self.metrics["total_requests"]
         avg = self.metrics.get("avg_latency", 0)
         if count == 1:
@@ -196,7 +517,7 @@ class LocalLLMClient:
     def check_health(self) -> Dict[str, Any]:
         """Check the health of the Ollama server."""
         try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=self.timeout)
+            response = self.session.get(f"{self.base_url}/api/tags", timeout=self._timeouts(self.timeout))
             if response.status_code == 200:
                 return {
                     "status": "online",
@@ -212,6 +533,31 @@ class LocalLLMClient:
         except Exception as e:
             return {"status": "offline", "error": str(e)}
 
+    async def acheck_health(self) -> Dict[str, Any]:
+        """Async check_health."""
+        if httpx is None:
+            return await asyncio.to_thread(self.check_health)
+        try:
+            start = time.time()
+            response = await self._get_async_client().get(f"{self.base_url}/api/tags")
+            latency = time.time() - start
+            if response.status_code == 200:
+                return {
+                    "status": "online",
+                    "models": response.json().get("models", []),
+                    "latency": latency
+                }
+            else:
+                return {
+                    "status": "error",
+                    "error": f"HTTP {response.status_code}",
+                    "latency": latency
+                }
+        except Exception as e:
+            return {"status": "offline", "error": str(e)}
+
     def get_metrics(self) -> Dict[str, Any]:
-        """Get performance metrics."""
-        return self.metrics.copy()
\ No newline at end of file
+        """Get performance metrics, including admission queue depth and wait times."""
+        metrics = self.metrics.copy()
+        metrics["admission"] = self.admission.get_stats()
+        return metrics
\ No newline at end of file
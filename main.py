@@ -7,12 +7,16 @@ from fastapi import FastAPI, Depends, HTTPException, Body
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Optional
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.exceptions import RequestValidationError
 import json
+import time
+import asyncio
 from datetime import datetime
 from fastapi import FastAPI
 from app.enhanced_chat_controller_hybrid import router as chat_router
+from app.telemetry import registry as metrics_registry
+from app.review_jobs import ReviewJobQueue, ReviewQueueClosed, ReviewQueueFull, FINISHED_STATES
 from backend.app.car_recommendation import router as car_recommendation_router
 
 # Load environment variables early
@@ -63,6 +67,11 @@ app.add_middleware(
 def read_root():
     return {"message": "Welcome to Astra API"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Chat latency histograms and counters in Prometheus text format."""
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
 # ==========================
 # Car Endpoints
 # ==========================
@@ -115,24 +124,13 @@ def api_get_car_reviews(car_id: int):
     logger.info(f"API: Returning {len(reviews) if reviews else 0} reviews for car {car_id} from /api/cars/{car_id}/reviews")
     return reviews
 
-@app.post("/api/reviews/generate")
-async def api_generate_review(request: GenerateReviewRequest):
-    """Generate a review for a car and save it."""
+def _generate_review(car_id: int) -> dict:
+    """Generate a review for a car and save it (runs in a review job worker)."""
     import datetime
 
-    car_id = request.car_id
-    # --- START: Added Logging ---
-    logger.info(f"API: Received request to generate review for car_id: {car_id}")
-
-    # Check if car exists
-    car_data = get_car_by_id(car_id) # Ensure this uses Supabase directly
+    car_data = get_car_by_id(car_id)
     if not car_data:
-        logger.warning(f"API: Car with ID {car_id} not found for review generation")
-        return JSONResponse(
-            status_code=404,
-            content={"detail": f"Car with ID {car_id} not found"}
-        )
-    logger.info(f"API: Found car data for ID {car_id}: {car_data.get('manufacturer')} {car_data.get('model')}")
+        raise LookupError(f"Car with ID {car_id} not found")
 
     # Generate mock review structure
     mock_review = {
@@ -157,7 +155,7 @@ async def api_generate_review(request: GenerateReviewRequest):
         logger.info("API: Attempting to import and use generate_car_review service")
         from app.openai_service import generate_car_review
         logger.info(f"API: Calling generate_car_review for car ID {car_id}...")
-        ai_review_json_string = generate_car_review(car_data) # <--- THIS IS WHERE IT LIKELY HANGS
+        ai_review_json_string = generate_car_review(car_data)
         logger.info(f"API: Received response (string) from generate_car_review (length: {len(ai_review_json_string) if ai_review_json_string else 0})")
 
         if ai_review_json_string:
@@ -193,24 +191,101 @@ async def api_generate_review(request: GenerateReviewRequest):
     logger.info(f"API: add_review completed for car ID {car_id}. Result: {'Success' if result else 'Failure'}")
 
 
-    if result:
-        # The add_review function should ideally return the saved review object,
-        # including the 'id' assigned by the database.
-        # Ensure the result object includes pros and cons as the frontend expects them.
-        if 'pros' not in result:
-             result['pros'] = mock_review.get('pros', []) # Fallback to mock if DB didn't return it
-        if 'cons' not in result:
-             result['cons'] = mock_review.get('cons', []) # Fallback to mock if DB didn't return it
-
-        logger.info(f"API: Successfully generated and added review for car ID {car_id}")
-        return result # Return the saved review object
-    else:
+    if not result:
         logger.error(f"API: Failed to add review to database for car ID {car_id}")
+        raise RuntimeError("Failed to add review")
+
+    # The add_review function should ideally return the saved review object,
+    # including the 'id' assigned by the database.
+    # Ensure the result object includes pros and cons as the frontend expects them.
+    if 'pros' not in result:
+         result['pros'] = mock_review.get('pros', []) # Fallback to mock if DB didn't return it
+    if 'cons' not in result:
+         result['cons'] = mock_review.get('cons', []) # Fallback to mock if DB didn't return it
+
+    logger.info(f"API: Successfully generated and added review for car ID {car_id}")
+    return result # Return the saved review object
+
+
+# Review generation runs in background workers; state survives restarts.
+# Jobs are per process, so serve the API with a single uvicorn worker
+review_jobs = ReviewJobQueue(
+    _generate_review,
+    max_workers=int(os.getenv("REVIEW_JOB_WORKERS", "2")),
+    max_pending=int(os.getenv("REVIEW_JOB_MAX_PENDING", "32")),
+    state_path=os.getenv("REVIEW_JOBS_PATH", "review_jobs.json"),
+)
+
+# Longest a GET /api/reviews/jobs/{id}?wait= request is held open
+MAX_JOB_WAIT = 30.0
+
+
+@app.on_event("startup")
+def start_review_jobs():
+    review_jobs.start()
+
+
+@app.on_event("shutdown")
+def stop_review_jobs():
+    review_jobs.shutdown()
+
+
+def _job_response(job: dict) -> dict:
+    return {**job, "status_url": f"/api/reviews/jobs/{job['job_id']}"}
+
+
+@app.post("/api/reviews/generate", status_code=202)
+async def api_generate_review(request: GenerateReviewRequest):
+    """Queue AI review generation for a car; poll the returned status_url for the review."""
+    car_id = request.car_id
+    logger.info(f"API: Received request to generate review for car_id: {car_id}")
+
+    # Check if car exists
+    car_data = await get_car_by_id.acall(car_id) # Cached; a miss loads off the event loop
+    if not car_data:
+        logger.warning(f"API: Car with ID {car_id} not found for review generation")
         return JSONResponse(
-            status_code=500,
-            content={"detail": "Failed to add review"}
+            status_code=404,
+            content={"detail": f"Car with ID {car_id} not found"}
         )
-    # --- END: Added Logging ---
+
+    try:
+        job, created = review_jobs.submit(car_id)
+    except ReviewQueueFull as e:
+        logger.warning(f"API: Rejecting review generation for car ID {car_id}: {e}")
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "Too many reviews are being generated, try again shortly"},
+            headers={"Retry-After": "10"}
+        )
+    except ReviewQueueClosed:
+        logger.warning(f"API: Rejecting review generation for car ID {car_id}: server is shutting down")
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "Server is shutting down, try again shortly"},
+            headers={"Retry-After": "10"}
+        )
+
+    content = {**_job_response(job), "deduplicated": not created}
+    return JSONResponse(status_code=202, content=content, headers={"Location": content["status_url"]})
+
+
+@app.get("/api/reviews/jobs/{job_id}")
+async def api_get_review_job(job_id: str, wait: float = 0):
+    """
+    Status of a review job; "result" holds the saved review once it has succeeded.
+
+    With ?wait=N the request is held for up to N seconds (max 30) until the job finishes.
+    """
+    job = review_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Review job {job_id} not found")
+
+    deadline = time.monotonic() + min(max(wait, 0.0), MAX_JOB_WAIT)
+    while job["status"] not in FINISHED_STATES and time.monotonic() < deadline:
+        await asyncio.sleep(0.25)
+        job = review_jobs.get(job_id) or job
+    return _job_response(job)
 
 
 @app.get("/api/test-db")
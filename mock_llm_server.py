@@ -0,0 +1,270 @@
+# mock_llm_server.py
+"""
+Stand-in LLM server for offline and CI load tests.
+Implements Ollama's /api/tags and /api/generate and OpenAI's
+/v1/chat/completions (both with streaming) on one port, using only the
+standard library. Latency, token rate, errors and 429s are configurable.
+
+Point the chat stack at it with:
+    OLLAMA_URLS=http://localhost:8808
+    OPENAI_BASE_URL=http://localhost:8808/v1  OPENAI_API_KEY=mock
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ANSWERS = [
+    "This car offers a smooth ride with responsive handling and a well-tuned suspension for daily driving.",
+    "Owners report solid reliability when the scheduled maintenance is kept up, especially oil and transmission service.",
+    "Fuel economy is competitive for the class, averaging around 30 MPG combined in mixed driving.",
+    "The cabin is comfortable with supportive seats, though rear legroom is tighter than some rivals.",
+    "Safety scores are strong, with standard automatic emergency braking and lane keeping assist.",
+]
+
+
+class MockConfig:
+    """
+    Behaviour knobs shared by all request handlers.
+
+    Attributes:
+        latency_dist: "fixed", "uniform" or "lognormal" first-token latency
+        latency_mean: Mean first-token latency in seconds (median for lognormal)
+        latency_jitter: Spread (uniform half-width, or lognormal sigma)
+        tokens_per_second: Generation speed after the first token
+        error_rate: Fraction of requests answered with HTTP 500
+        rate_limit_rate: Fraction of requests answered with HTTP 429
+        retry_after: Retry-After seconds sent with 429s
+        cold_load: Seconds of simulated model load before the first request
+    """
+
+    def __init__(self, args: argparse.Namespace):
+        self.model = args.model
+        self.latency_dist = args.latency_dist
+        self.latency_mean = args.latency_mean
+        self.latency_jitter = args.latency_jitter
+        self.tokens_per_second = args.tokens_per_second
+        self.max_tokens = args.max_tokens
+        self.error_rate = args.error_rate
+        self.rate_limit_rate = args.rate_limit_rate
+        self.retry_after = args.retry_after
+        self.cold_load = args.cold_load
+        self.loaded = False
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "errors_injected": 0, "rate_limited": 0}
+
+    def first_token_delay(self) -> float:
+        if self.latency_dist == "uniform":
+            return max(0.0, random.uniform(self.latency_mean - self.latency_jitter, self.latency_mean + self.latency_jitter))
+        if self.latency_dist == "lognormal" and self.latency_mean > 0:
+            # latency_mean is the median; sigma stretches the right tail
+            return random.lognormvariate(0, self.latency_jitter) * self.latency_mean
+        return self.latency_mean
+
+    def load_delay(self) -> float:
+        """Seconds of cold load this request pays (only the first one)."""
+        with self.lock:
+            if self.loaded:
+                return 0.0
+            self.loaded = True
+            return self.cold_load
+
+    def injected_failure(self):
+        """None, or (status, extra headers) for an injected failure."""
+        roll = random.random()
+        with self.lock:
+            self.stats["requests"] += 1
+            if roll < self.rate_limit_rate:
+                self.stats["rate_limited"] += 1
+                return 429, {"Retry-After": str(self.retry_after)}
+            if roll < self.rate_limit_rate + self.error_rate:
+                self.stats["errors_injected"] += 1
+                return 500, {}
+        return None
+
+
+def make_tokens(limit: int):
+    words = " ".join(random.sample(ANSWERS, 2)).split()
+    return [w + " " for w in words[:max(1, limit)]]
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    config: MockConfig = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    # ------------------------------------------------------------------
+    # Routing
+    # ------------------------------------------------------------------
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._json(200, {"models": [{"name": self.config.model}]})
+        elif self.path == "/stats":
+            self._json(200, self.config.stats)
+        else:
+            self._json(404, {"error": "not found"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._json(400, {"error": "invalid JSON"})
+            return
+
+        if self.path == "/api/generate":
+            self._ollama_generate(body)
+        elif self.path in ("/v1/chat/completions", "/chat/completions"):
+            self._openai_chat(body)
+        else:
+            self._json(404, {"error": "not found"})
+
+    # ------------------------------------------------------------------
+    # Ollama
+    # ------------------------------------------------------------------
+    def _ollama_generate(self, body):
+        load = self.config.load_delay()
+        if load:
+            time.sleep(load)
+        if not body.get("prompt"):
+            # Warmup / preload request: load the model, generate nothing
+            self._json(200, {"model": self.config.model, "response": "", "done": True,
+                             "load_duration": int(load * 1e9)})
+            return
+
+        failure = self.config.injected_failure()
+        if failure:
+            self._json(failure[0], {"error": "injected failure"}, failure[1])
+            return
+
+        limit = body.get("options", {}).get("num_predict", self.config.max_tokens)
+        tokens = make_tokens(limit)
+        prompt_tokens = len(body.get("prompt", "").split()) + len(body.get("system", "").split())
+        context = list(body.get("context") or []) + list(range(prompt_tokens + len(tokens)))
+        final = {
+            "model": self.config.model, "done": True, "eval_count": len(tokens),
+            "prompt_eval_count": prompt_tokens, "load_duration": int(load * 1e9), "context": context,
+        }
+
+        time.sleep(self.config.first_token_delay())
+        if body.get("stream", True) is False:
+            time.sleep(len(tokens) / self.config.tokens_per_second)
+            self._json(200, {**final, "response": "".join(tokens).strip()})
+            return
+
+        self._start_chunked(200, "application/x-ndjson")
+        for token in tokens:
+            self._chunk(json.dumps({"model": self.config.model, "response": token, "done": False}) + "\n")
+            time.sleep(1 / self.config.tokens_per_second)
+        self._chunk(json.dumps({**final, "response": ""}) + "\n")
+        self._end_chunked()
+
+    # ------------------------------------------------------------------
+    # OpenAI
+    # ------------------------------------------------------------------
+    def _openai_chat(self, body):
+        failure = self.config.injected_failure()
+        if failure:
+            status, headers = failure
+            code = "rate_limit_exceeded" if status == 429 else "server_error"
+            self._json(status, {"error": {"message": "injected failure", "type": code, "code": code}}, headers)
+            return
+
+        tokens = make_tokens(body.get("max_tokens") or self.config.max_tokens)
+        prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in body.get("messages", []))
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+        model = body.get("model", "gpt-3.5-turbo")
+
+        time.sleep(self.config.first_token_delay())
+        if not body.get("stream"):
+            time.sleep(len(tokens) / self.config.tokens_per_second)
+            self._json(200, {
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": "".join(tokens).strip()}}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens),
+                          "total_tokens": prompt_tokens + len(tokens)},
+            })
+            return
+
+        self._start_chunked(200, "text/event-stream")
+        for token in tokens:
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+            self._chunk(f"data: {json.dumps(chunk)}\n\n")
+            time.sleep(1 / self.config.tokens_per_second)
+        done = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        self._chunk(f"data: {json.dumps(done)}\n\n")
+        self._chunk("data: [DONE]\n\n")
+        self._end_chunked()
+
+    # ------------------------------------------------------------------
+    # HTTP helpers
+    # ------------------------------------------------------------------
+    def _json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _start_chunked(self, status, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _chunk(self, text):
+        data = text.encode()
+        self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _end_chunked(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mock Ollama + OpenAI server for offline load tests')
+    parser.add_argument('--host', default='127.0.0.1', help='Interface to bind')
+    parser.add_argument('--port', type=int, default=8808, help='Port to listen on')
+    parser.add_argument('--model', default='tinyllama:latest', help='Model name reported by /api/tags')
+    parser.add_argument('--latency-dist', choices=['fixed', 'uniform', 'lognormal'], default='lognormal',
+                        help='First-token latency distribution')
+    parser.add_argument('--latency-mean', type=float, default=0.3, help='Mean (lognormal: median) first-token latency (s)')
+    parser.add_argument('--latency-jitter', type=float, default=0.5,
+                        help='Uniform half-width (s) or lognormal sigma')
+    parser.add_argument('--tokens-per-second', type=float, default=40.0, help='Generation speed')
+    parser.add_argument('--max-tokens', type=int, default=60, help='Tokens per reply when the request sets no limit')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests failing with 500')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='Fraction of requests failing with 429')
+    parser.add_argument('--retry-after', type=float, default=1.0, help='Retry-After seconds on 429s')
+    parser.add_argument('--cold-load', type=float, default=0.0, help='Simulated model load time on first request (s)')
+
+    args = parser.parse_args()
+    MockHandler.config = MockConfig(args)
+
+    server = ThreadingHTTPServer((args.host, args.port), MockHandler)
+    server.daemon_threads = True
+    print(f"Mock LLM server on http://{args.host}:{args.port} (model {args.model})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
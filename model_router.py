@@ -1,37 +1,130 @@
+import asyncio
+import functools
 import logging
+import random
 import time
 import re
-from typing import Dict, Any, Optional, List
+from contextvars import ContextVar
+from typing import Dict, Any, Iterator, Optional, List
 
 # Imports with explicit relative paths for our modules
 from .query_classifier import QueryClassifier
 from .response_analyzer import ResponseAnalyzer
-from .automotive_system_message import create_automotive_system_message
+from .automotive_system_message import get_system_prompt_parts, prompt_cache_stats
+from .response_cache import ResponseCache
+from .model_stats import ModelStats
+from .chatbot_responses import get_busy_response, get_response_for_pattern
+from .admission import LocalLLMOverloaded
+from .prompt_builder import build_prompt
+from .telemetry import registry, span
+from .rate_limiter import (
+    OpenAIBudgetExhausted,
+    OpenAIRateLimiter,
+    backoff_delay,
+    estimate_tokens,
+    is_retryable,
+    retry_after_of,
+    status_code_of,
+)
 
 logger = logging.getLogger(__name__)
 
+# Conversation (user_id) the current request belongs to; set by the chat
+# endpoints so the local model can continue that conversation's Ollama context
+current_conversation: ContextVar[Optional[str]] = ContextVar("current_conversation", default=None)
+
+OPENAI_STYLE_GUIDE = (
+    "\n\n### Style Guide ###\n"
+    "- Talk like an excited best‑buddy mechanic 😎🛠️.\n"
+    "- Max **3 punchy sentences** (~90 tokens).\n"
+    "- Fun slang, exclamations, rhetorical questions!\n"
+    "- Sprinkle 2–4 fitting emojis.\n"
+    "- End with a cheeky invite like 'Hop in?'."
+)
+
 
 class ModelRouter:
     """Route queries between OpenAI and a local LLM (Ollama)."""
 
+    MODELS = ("openai", "local")
+
     # ------------------------------------------------------------------
     # Initialisation
     # ------------------------------------------------------------------
-    def __init__(self, openai_client: Any, local_llm_client: Any | None = None) -> None:
+    def __init__(
+        self,
+        openai_client: Any,
+        local_llm_client: Any | None = None,
+        async_openai_client: Any | None = None,
+        context_store: Any | None = None,
+    ) -> None:
         self.openai_client = openai_client
         self.local_llm_client = local_llm_client
+        # Optional openai.AsyncOpenAI used by aroute_query; without it the
+        # sync client is run in a worker thread instead
+        self.async_openai_client = async_openai_client
+        # Optional store with get_llm_context/set_llm_context (ConversationHistory)
+        # for reusing Ollama's context token array across turns
+        self.context_store = context_store
         self.query_classifier = QueryClassifier()
         self.response_analyzer = ResponseAnalyzer()
+        # Process-wide override set by the admin endpoint; a request's own
+        # force_model argument takes precedence for that request only
         self.force_model: str | None = None
 
         # Configuration
         self.config: dict[str, Any] = {
             "openai_timeout": 15,
             "local_timeout": 30,
-            "min_confidence": 0.6,
+            # QueryClassifier scores a single clear match 0.5 and penalises very
+            # short queries to 0.4, so only those fall below this
+            "min_confidence": 0.5,
             "max_retries": 2,
+            "retry_base_delay": 0.5,
+            "retry_max_delay": 8.0,
+            # Client-side OpenAI budget; size these to the account's limits
+            "openai_rpm": 3500,
+            "openai_tpm": 90000,
+            "openai_max_tokens": 250,
+            # Prompt token budgets (system + car context + history + query)
+            "local_prompt_budget": 512,
+            "openai_prompt_budget": 2000,
             "use_streaming": False,
+            "response_cache_enabled": True,
+            "response_cache_threshold": 0.85,
+            "response_cache_ttl": 3600,
+            # Hedging (aroute_query only): if the primary model has not answered
+            # within its hedge_percentile latency, race the other model too
+            "hedging_enabled": False,
+            "hedge_percentile": 95,
+            "hedge_min_samples": 20,
+            "hedge_default_delay": 3.0,
+            "latency_window": 200,
+            # Adaptive routing: prefer models in the routing table's order, but
+            # skip any whose recent p95 latency or error rate misses the SLO
+            "adaptive_routing": True,
+            "model_preference": ["openai", "local"],
+            "latency_slo": 8.0,
+            "max_error_rate": 0.25,
+            "exploration_rate": 0.05,
+            "min_samples": 10,
+            # Routing policy per QueryClassifier routing_category, plus "general"
+            # for queries that matched no pattern at all:
+            #   pattern: try a canned chatbot_responses reply before any model
+            #   models:  allowed models, cheapest/preferred first
+            "routing_table": {
+                "conversational": {"pattern": True, "models": ["local", "openai"]},
+                "general": {"pattern": True, "models": ["openai", "local"]},
+                "automotive_specific": {"pattern": False, "models": ["openai", "local"]},
+                "automotive_contextual": {"pattern": False, "models": ["openai"]},
+            },
+            # Classifications below min_confidence go to the stronger model,
+            # except small talk, which is short (so low-confidence) by nature
+            "low_confidence_models": ["openai"],
+            "low_confidence_exempt_types": ["greeting", "farewell", "gratitude", "sentiment", "insult", "praise"],
         }
+        self.response_cache = ResponseCache()
+        self.rate_limiter = OpenAIRateLimiter(rpm=self.config["openai_rpm"], tpm=self.config["openai_tpm"])
 
         # Metrics
         self.metrics: dict[str, float | int] = {
@@ -40,19 +133,51 @@ class ModelRouter:
             "fallbacks": 0,
             "avg_openai_time": 0.0,
             "avg_local_time": 0.0,
+            "cache_hits": 0,
+            "cache_misses": 0,
+            "cache_bypasses": 0,
+            "pattern_responses": 0,
+            "low_confidence_routes": 0,
+            "openai_retries": 0,
+            "rate_limited_reroutes": 0,
+            "budget_rejections": 0,
+            "local_shed": 0,
+            "local_saturated_reroutes": 0,
+            "shed_responses": 0,
+            "history_items_dropped": 0,
+            "local_context_reuses": 0,
+            "hedge_eligible": 0,
+            "hedged_requests": 0,
+            "hedge_wins_openai": 0,
+            "hedge_wins_local": 0,
         }
+        # Recent per-model latency and error statistics
+        self.model_stats = ModelStats(window=self.config["latency_window"])
 
     # ------------------------------------------------------------------
     # Public helpers
     # ------------------------------------------------------------------
     def set_force_model(self, model_name: str | None) -> None:
-        if model_name not in {"openai", "local", None}:
-            raise ValueError("Model must be 'openai', 'local', or None")
-        self.force_model = model_name
+        """Force every request onto one model (admin override); None restores routing."""
+        self.force_model = self._check_model(model_name)
         logger.info("Force model set to %s", model_name)
 
+    @classmethod
+    def _check_model(cls, model_name: str | None) -> str | None:
+        if model_name is not None and model_name not in cls.MODELS:
+            raise ValueError("Model must be 'openai', 'local', or None")
+        return model_name
+
+    def _effective_force_model(self, force_model: str | None) -> str | None:
+        return self._check_model(force_model) or self.force_model
+
     def get_metrics(self) -> dict[str, Any]:
-        return self.metrics.copy()
+        metrics: dict[str, Any] = self.metrics.copy()
+        eligible = self.metrics["hedge_eligible"]
+        metrics["hedge_rate"] = self.metrics["hedged_requests"] / eligible if eligible else 0.0
+        metrics["models"] = self.model_stats.snapshot()
+        metrics["system_prompt_cache"] = dict(prompt_cache_stats)
+        return metrics
 
     # ------------------------------------------------------------------
     # Core routing
@@ -62,19 +187,26 @@ class ModelRouter:
         query: str,
         car_data: Optional[dict] = None,
         conversation_history: Optional[List[str]] = None,
+        force_model: Optional[str] = None,
     ) -> dict[str, Any]:
+        """
+        Answer a query with the best available model.
+
+        Args:
+            force_model: Use this model ("openai" or "local") for this request only
+        """
+        force_model = self._effective_force_model(force_model)
         start_time = time.time()
 
-        # 1) classify
-        classification = self.query_classifier.classify(query, car_data)
-        logger.info(
-            "Query classified as %s (confidence %.2f)",
-            classification["query_types"],
-            classification["confidence"],
+        # 1) classify, then 2) canned reply or shared response cache
+        classification, use_cache, early_result = self._prepare_route(
+            query, car_data, conversation_history, force_model, start_time
         )
+        if early_result:
+            return early_result
 
-        # 2) choose model
-        model_choice = self._choose_model()
+        # 3) choose model
+        model_choice = self._choose_model(classification, force_model)
         logger.info("Routing to model: %s", model_choice)
 
         try:
@@ -84,9 +216,130 @@ class ModelRouter:
                 response = self._try_openai_model(query, car_data, conversation_history)
         except Exception as exc:  # noqa: BLE001
             logger.error("Primary model (%s) failed: %s", model_choice, exc)
-            response = self._fallback(model_choice, query, car_data, conversation_history)
+            response = self._fallback(model_choice, query, car_data, conversation_history, exc)
+
+        return self._finish_route(query, car_data, classification, use_cache, response, start_time)
+
+    async def aroute_query(
+        self,
+        query: str,
+        car_data: Optional[dict] = None,
+        conversation_history: Optional[List[str]] = None,
+        force_model: Optional[str] = None,
+    ) -> dict[str, Any]:
+        """Async route_query: model calls never block the event loop and can be cancelled."""
+        force_model = self._effective_force_model(force_model)
+        start_time = time.time()
+
+        classification, use_cache, early_result = self._prepare_route(
+            query, car_data, conversation_history, force_model, start_time
+        )
+        if early_result:
+            return early_result
+
+        model_choice = self._choose_model(classification, force_model)
+        logger.info("Routing to model: %s", model_choice)
+
+        hedge_with = self._hedge_secondary(model_choice, classification) if self._can_hedge(force_model) else None
+        try:
+            if hedge_with:
+                response = await self._ahedged_call(model_choice, hedge_with, query, car_data, conversation_history)
+            elif model_choice == "local" and self.local_llm_client:
+                response = await self._atry_local_model(query, car_data, conversation_history)
+            else:
+                response = await self._atry_openai_model(query, car_data, conversation_history)
+        except Exception as exc:  # noqa: BLE001
+            logger.error("Primary model (%s) failed: %s", model_choice, exc)
+            response = await self._afallback(model_choice, query, car_data, conversation_history, exc)
 
+        return self._finish_route(query, car_data, classification, use_cache, response, start_time)
+
+    def _prepare_route(
+        self,
+        query: str,
+        car_data: Optional[dict],
+        conversation_history: Optional[List[str]],
+        force_model: Optional[str],
+        start_time: float,
+    ) -> tuple[dict[str, Any], bool, Optional[dict[str, Any]]]:
+        """
+        Classify the query and try the paths that need no model call.
+
+        Returns:
+            (classification, use_cache, early_result) where early_result is a
+            finished route result from a canned reply or the response cache
+        """
+        with registry.time("chat_classification_seconds"), span("classification"):
+            classification = self.query_classifier.classify(query, car_data)
+        logger.info(
+            "Query classified as %s (confidence %.2f, category %s)",
+            classification["query_types"],
+            classification["confidence"],
+            classification["routing_category"],
+        )
+
+        if not force_model and self._routing_entry(classification).get("pattern"):
+            pattern_text = get_response_for_pattern(query)
+            if pattern_text:
+                self.metrics["pattern_responses"] += 1
+                response = {
+                    "response": pattern_text,
+                    "model": "pattern_match",
+                    "analysis": self._analyze(pattern_text, car_data),
+                }
+                return classification, False, self._finish_route(
+                    query, car_data, classification, False, response, start_time
+                )
+
+        use_cache = self._use_response_cache(query, conversation_history, force_model)
+        if not use_cache:
+            return classification, False, None
+
+        car_id = car_data.get("id") if car_data else None
+        with span("cache_lookup"):
+            cached = self.response_cache.get(
+                query, car_id, classification["query_types"], threshold=self.config["response_cache_threshold"]
+            )
+        if cached:
+            self.metrics["cache_hits"] += 1
+            logger.info("Serving cached response (similarity %.2f)", cached["similarity"])
+            return classification, True, self._cached_result(cached, classification, start_time)
+        self.metrics["cache_misses"] += 1
+        return classification, True, None
+
+    def _cached_result(
+        self, cached: dict[str, Any], classification: dict[str, Any], start_time: float
+    ) -> dict[str, Any]:
         elapsed = time.time() - start_time
+        self._observe_request(classification, "cache", elapsed)
+        return {
+            "response": cached["response"],
+            "model_used": cached["model"],
+            "confidence": classification["confidence"],
+            "query_types": classification["query_types"],
+            "response_time": elapsed,
+            "analysis": cached.get("analysis", {}),
+            "cache_hit": True,
+            "cache_similarity": cached["similarity"],
+        }
+
+    def _finish_route(
+        self,
+        query: str,
+        car_data: Optional[dict],
+        classification: dict[str, Any],
+        use_cache: bool,
+        response: dict[str, Any],
+        start_time: float,
+    ) -> dict[str, Any]:
+        if use_cache and response["model"] not in ("error", "shed") and not response.get("partial"):
+            car_id = car_data.get("id") if car_data else None
+            self.response_cache.set(
+                query, car_id, classification["query_types"], response, ttl=self.config["response_cache_ttl"]
+            )
+
+        elapsed = time.time() - start_time
+        self._observe_request(classification, response["model"], elapsed)
         return {
             "response": response["response"],
             "model_used": response["model"],
@@ -94,19 +347,180 @@ class ModelRouter:
             "query_types": classification["query_types"],
             "response_time": elapsed,
             "analysis": response.get("analysis", {}),
+            "cache_hit": False,
         }
 
     # ------------------------------------------------------------------
     # Internal helpers
     # ------------------------------------------------------------------
-    def _choose_model(self) -> str:
-        if self.force_model:
-            return self.force_model
-        if self.openai_client:
+    def _choose_model(
+        self, classification: Optional[dict[str, Any]] = None, force_model: Optional[str] = None
+    ) -> str:
+        if force_model:
+            return force_model
+
+        available = [m for m in self.config["model_preference"] if self._is_available(m)]
+        if not available:
             return "openai"
-        if self.local_llm_client:
-            return "local"
-        return "openai"
+
+        if self._low_confidence(classification):
+            self.metrics["low_confidence_routes"] += 1
+        candidates = [m for m in self._allowed_models(classification) if self._is_available(m)] or available
+
+        # Proactively keep requests that would blow the OpenAI budget on the local model
+        if "openai" in candidates and len(available) > 1 and not self.rate_limiter.has_capacity(
+            self.config["openai_max_tokens"]
+        ):
+            self.metrics["rate_limited_reroutes"] += 1
+            logger.info("OpenAI budget exhausted; routing to local model")
+            candidates = [m for m in candidates if m != "openai"] or ["local"]
+
+        # Don't queue behind a saturated local model when OpenAI can take the request
+        if "local" in candidates and len(candidates) > 1 and self._local_saturated():
+            self.metrics["local_saturated_reroutes"] += 1
+            logger.info("Local model saturated; routing elsewhere")
+            candidates = [m for m in candidates if m != "local"]
+
+        if len(candidates) == 1 or not self.config["adaptive_routing"]:
+            return candidates[0]
+
+        # Keep estimates for the less-used model fresh
+        if random.random() < self.config["exploration_rate"]:
+            choice = random.choice(candidates)
+            logger.info("Exploring model %s", choice)
+            return choice
+
+        return self._pick_by_slo(candidates)
+
+    def _routing_entry(self, classification: Optional[dict[str, Any]]) -> dict[str, Any]:
+        category = classification.get("routing_category") if classification else None
+        if classification and classification["query_types"] == ["general"]:
+            # The classifier files unmatched queries under "conversational", but
+            # they are questions it did not recognise, not small talk
+            category = "general"
+        return self.config["routing_table"].get(category, {})
+
+    def _low_confidence(self, classification: Optional[dict[str, Any]]) -> bool:
+        if not classification or classification["confidence"] >= self.config["min_confidence"]:
+            return False
+        exempt = self.config["low_confidence_exempt_types"]
+        return not all(query_type in exempt for query_type in classification["query_types"])
+
+    def _allowed_models(self, classification: Optional[dict[str, Any]]) -> List[str]:
+        """Models the routing policy allows for this classification, preferred first."""
+        if self._low_confidence(classification):
+            return self.config["low_confidence_models"]
+        return self._routing_entry(classification).get("models") or self.config["model_preference"]
+
+    def _pick_by_slo(self, candidates: List[str]) -> str:
+        """First model in preference order expected to meet the SLO, else the fastest expected."""
+        slo = self.config["latency_slo"]
+        scored = []
+        for model in candidates:
+            error_rate_ok = self.model_stats.error_rate(model) <= self.config["max_error_rate"]
+            if self.model_stats.sample_count(model) < self.config["min_samples"]:
+                # Not enough data to rule it out, unless it already fails too often
+                if error_rate_ok:
+                    return model
+                scored.append((self.model_stats.expected_latency(model) or float("inf"), model))
+                continue
+            meets_slo = error_rate_ok and self.model_stats.percentile(model, 95) <= slo
+            if meets_slo:
+                return model
+            scored.append((self.model_stats.expected_latency(model) or float("inf"), model))
+        return min(scored)[1]
+
+    def _is_available(self, model: str) -> bool:
+        if model == "local":
+            return self.local_llm_client is not None
+        return self.openai_client is not None or self.async_openai_client is not None
+
+    def _local_saturated(self) -> bool:
+        is_saturated = getattr(self.local_llm_client, "is_saturated", None)
+        return bool(is_saturated and is_saturated())
+
+    def _can_hedge(self, force_model: Optional[str] = None) -> bool:
+        return bool(
+            self.config["hedging_enabled"]
+            and not force_model
+            and self.local_llm_client
+            and (self.openai_client or self.async_openai_client)
+        )
+
+    def _hedge_secondary(self, primary: str, classification: dict[str, Any]) -> Optional[str]:
+        """The model to race against `primary`, if the routing policy allows one."""
+        secondary = "local" if primary == "openai" else "openai"
+        if secondary in self._allowed_models(classification) and self._is_available(secondary):
+            return secondary
+        return None
+
+    def _hedge_delay(self, model: str) -> float:
+        """How long to give `model` before hedging: its recent latency percentile."""
+        if self.model_stats.sample_count(model) < self.config["hedge_min_samples"]:
+            return self.config["hedge_default_delay"]
+        # Failures count as samples: a model that only fails has no latencies,
+        # so percentile() is 0.0 and the other model is raced immediately
+        return self.model_stats.percentile(model, self.config["hedge_percentile"])
+
+    async def _ahedged_call(
+        self,
+        primary: str,
+        secondary: str,
+        query: str,
+        car_data: Optional[dict],
+        conversation_history: Optional[List[str]],
+    ) -> dict[str, Any]:
+        """Run the primary model, racing the secondary if the primary is slow; cancel the loser."""
+        calls = {"openai": self._atry_openai_model, "local": self._atry_local_model}
+
+        self.metrics["hedge_eligible"] += 1
+        primary_task = asyncio.ensure_future(calls[primary](query, car_data, conversation_history))
+        tasks = {primary_task: primary}
+        started = {primary_task: time.time()}
+        pending = {primary_task}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=self._hedge_delay(primary))
+            if done:
+                # Primary answered (or failed) in time; failures go to the normal fallback
+                return primary_task.result()
+
+            self.metrics["hedged_requests"] += 1
+            logger.info("Primary model (%s) is slow; hedging with %s", primary, secondary)
+            secondary_task = asyncio.ensure_future(calls[secondary](query, car_data, conversation_history))
+            tasks[secondary_task] = secondary
+            started[secondary_task] = time.time()
+            pending.add(secondary_task)
+
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self.metrics[f"hedge_wins_{tasks[task]}"] += 1
+                        return task.result()
+                    logger.warning("Hedged %s request failed: %s", tasks[task], task.exception())
+
+            # Both models already had their chance; don't run another fallback round
+            self.metrics["fallbacks"] += 1
+            return self._error_response()
+        finally:
+            for task in pending:
+                task.cancel()
+                # The loser's slow tail is what hedging reacts to; without it
+                # the percentiles (and so the hedge delay) drift optimistic
+                self.model_stats.record_censored(tasks[task], time.time() - started[task])
+
+    def _use_response_cache(
+        self, query: str, conversation_history: Optional[List[str]] = None, force_model: Optional[str] = None
+    ) -> bool:
+        """Shared answers only for standalone, non-personal turns when no model is forced."""
+        if not self.config["response_cache_enabled"] or force_model:
+            return False
+        # An answer that depends on this user's earlier turns must not be
+        # served to anyone else, nor answered from someone else's turn
+        if conversation_history or not self.response_cache.is_cacheable(query):
+            self.metrics["cache_bypasses"] += 1
+            return False
+        return True
 
     def _fallback(
         self,
@@ -114,20 +528,70 @@ class ModelRouter:
         query: str,
         car_data: Optional[dict],
         conversation_history: Optional[List[str]],
+        exc: Optional[Exception] = None,
+        reason: Optional[str] = None,
     ) -> dict[str, Any]:
-        self.metrics["fallbacks"] += 1
+        self._count_fallback(failed_model, exc, reason)
         if failed_model == "openai" and self.local_llm_client:
             logger.info("Falling back to local model")
-            return self._try_local_model(query, car_data, conversation_history)
+            try:
+                return self._try_local_model(query, car_data, conversation_history)
+            except LocalLLMOverloaded:
+                return self._shed_response(query)
         if failed_model == "local" and self.openai_client:
             logger.info("Falling back to OpenAI model")
             return self._try_openai_model(query, car_data, conversation_history)
+        if isinstance(exc, LocalLLMOverloaded):
+            return self._shed_response(query)
+        return self._error_response()
+
+    async def _afallback(
+        self,
+        failed_model: str,
+        query: str,
+        car_data: Optional[dict],
+        conversation_history: Optional[List[str]],
+        exc: Optional[Exception] = None,
+        reason: Optional[str] = None,
+    ) -> dict[str, Any]:
+        self._count_fallback(failed_model, exc, reason)
+        if failed_model == "openai" and self.local_llm_client:
+            logger.info("Falling back to local model")
+            try:
+                return await self._atry_local_model(query, car_data, conversation_history)
+            except LocalLLMOverloaded:
+                return self._shed_response(query)
+        if failed_model == "local" and self._is_available("openai"):
+            logger.info("Falling back to OpenAI model")
+            return await self._atry_openai_model(query, car_data, conversation_history)
+        if isinstance(exc, LocalLLMOverloaded):
+            return self._shed_response(query)
+        return self._error_response()
+
+    def _count_fallback(self, failed_model: str, exc: Optional[Exception], reason: Optional[str]) -> None:
+        self.metrics["fallbacks"] += 1
+        registry.inc(
+            "chat_fallbacks_total",
+            {"model": failed_model, "reason": reason or (type(exc).__name__ if exc else "unknown")},
+        )
+
+    @staticmethod
+    def _error_response() -> dict[str, Any]:
         return {
             "response": "Sorry, I'm having trouble right now. Please try again soon!",
             "model": "error",
             "analysis": {"sentiment": {"neutral": 1}},
         }
 
+    def _shed_response(self, query: str) -> dict[str, Any]:
+        """Canned reply when the local model shed the request and nothing else can take it."""
+        self.metrics["shed_responses"] += 1
+        return {
+            "response": get_response_for_pattern(query) or get_busy_response(),
+            "model": "shed",
+            "analysis": {"sentiment": {"neutral": 1}},
+        }
+
     # ------------------------------------------------------------------
     # Model wrappers
     # ------------------------------------------------------------------
@@ -143,26 +607,83 @@ class ModelRouter:
         self.metrics["local_requests"] += 1
         start = time.time()
 
-        system_prompt = create_automotive_system_message(car_data)
-        user_prompt = (
-            f"About the {car_data.get('year')} {car_data.get('manufacturer')} {car_data.get('model')}: {query}\nAnswer:"
-            if car_data
-            else f"Human: {query}\nAssistant:"
-        )
+        request = self._local_request(query, car_data, conversation_history)
+        with span("llm_local"):
+            result = self.local_llm_client.generate_response(**request)
+        return self._local_result(result, start, car_data)
 
-        result = self.local_llm_client.generate_response(
-            prompt=user_prompt,
-            system_prompt=system_prompt,
-            temperature=0.7,
-            max_tokens=400,
-        )
+    async def _atry_local_model(
+        self,
+        query: str,
+        car_data: Optional[dict],
+        conversation_history: Optional[List[str]],
+    ) -> dict[str, Any]:
+        if not self.local_llm_client:
+            raise RuntimeError("Local LLM client not configured")
+
+        self.metrics["local_requests"] += 1
+        start = time.time()
+
+        request = self._local_request(query, car_data, conversation_history)
+        with span("llm_local"):
+            if hasattr(self.local_llm_client, "agenerate_response"):
+                result = await self.local_llm_client.agenerate_response(**request)
+            else:
+                result = await asyncio.to_thread(self.local_llm_client.generate_response, **request)
+        return self._local_result(result, start, car_data)
+
+    def _local_request(
+        self, query: str, car_data: Optional[dict], conversation_history: Optional[List[str]] = None
+    ) -> dict[str, Any]:
+        context = self._llm_context(car_data, conversation_history)
+        if context:
+            # Ollama already holds the system prompt and earlier turns
+            self.metrics["local_context_reuses"] += 1
+            return {
+                "prompt": self._local_question(query, car_data),
+                "context": context,
+                "temperature": 0.7,
+                "max_tokens": 400,
+            }
+
+        system_prompt, user_prompt = self._build_local_prompts(query, car_data, conversation_history)
+        return {
+            "prompt": user_prompt,
+            "system_prompt": system_prompt,
+            "temperature": 0.7,
+            "max_tokens": 400,
+        }
+
+    def _llm_context(self, car_data: Optional[dict], conversation_history: Optional[List[str]]) -> Optional[List[int]]:
+        conversation_id = current_conversation.get()
+        if not self.context_store or not conversation_id or not conversation_history:
+            return None
+        car_id = car_data.get("id") if car_data else None
+        return self.context_store.get_llm_context(conversation_id, car_id, conversation_history[-1])
+
+    def _store_llm_context(self, car_data: Optional[dict], context: Optional[List[int]], response_text: str) -> None:
+        conversation_id = current_conversation.get()
+        if not self.context_store or not conversation_id:
+            return
+        car_id = car_data.get("id") if car_data else None
+        self.context_store.set_llm_context(conversation_id, car_id, context, response_text)
+
+    def _local_result(self, result: dict[str, Any], start: float, car_data: Optional[dict]) -> dict[str, Any]:
+        if result.get("overloaded"):
+            # Shed before reaching Ollama; not a model failure
+            self.metrics["local_shed"] += 1
+            raise LocalLLMOverloaded("Local LLM overloaded")
         if result.get("error"):
+            self._record_error("local", "LocalLLMError")
             raise RuntimeError(f"Local LLM error: {result['text']}")
 
         response_text = re.sub(r"^(\s*Assistant:?\s*)", "", result.get("text", "")).strip()
 
-        self._update_avg("avg_local_time", "local_requests", time.time() - start)
-        analysis = self.response_analyzer.analyze(response_text, car_data)
+        if result.get("tokens"):
+            registry.inc("chat_tokens_total", {"model": "local"}, result["tokens"])
+        self._store_llm_context(car_data, result.get("context"), response_text)
+        self._record_latency("local", time.time() - start)
+        analysis = self._analyze(response_text, car_data)
         return {"response": response_text, "model": "local", "analysis": analysis}
 
     def _try_openai_model(
@@ -174,54 +695,385 @@ class ModelRouter:
         if not self.openai_client:
             raise RuntimeError("OpenAI client not configured")
 
+        request = self._openai_request(query, car_data, conversation_history)
+        estimated = estimate_tokens(request["messages"], request["max_tokens"])
+        if not self._acquire_openai_budget(estimated):
+            self.metrics["rate_limited_reroutes"] += 1
+            logger.warning("OpenAI budget exhausted; falling back to local model")
+            return self._fallback("openai", query, car_data, conversation_history, reason="rate_limited")
+
         self.metrics["openai_requests"] += 1
         start = time.time()
 
-        # Build system message and style guide
-        system_message = create_automotive_system_message(car_data)
-        style_guide = (
-            "\n\n### Style Guide ###\n"
-            "- Talk like an excited best‑buddy mechanic 😎🛠️.\n"
-            "- Max **3 punchy sentences** (~90 tokens).\n"
-            "- Fun slang, exclamations, rhetorical questions!\n"
-            "- Sprinkle 2–4 fitting emojis.\n"
-            "- End with a cheeky invite like 'Hop in?'."
-        )
-        system_message += style_guide
+        try:
+            resp = None
+            for attempt in range(self.config["max_retries"] + 1):
+                try:
+                    with span("llm_openai"):
+                        resp = self.openai_client.chat.completions.create(**request)
+                    break
+                except Exception as exc:  # noqa: BLE001
+                    delay = self._retry_delay(exc, attempt)
+                    if delay is None:
+                        raise
+                    time.sleep(delay)
+                    # A retry is another request against the budget
+                    if not self._acquire_openai_budget(estimated):
+                        logger.warning("OpenAI budget exhausted; not retrying")
+                        raise
+            response_text = resp.choices[0].message.content.strip()
+        except Exception as exc:  # noqa: BLE001
+            self._record_error("openai", type(exc).__name__)
+            if self._is_quota_error(exc):
+                logger.warning("OpenAI quota hit; falling back to local model")
+                return self._fallback("openai", query, car_data, conversation_history, reason="quota")
+            raise
 
-        messages: list[dict[str, str]] = [{"role": "system", "content": system_message}]
-        if conversation_history:
-            recent = conversation_history[-10:] if len(conversation_history) > 10 else conversation_history
-            for i in range(0, len(recent), 2):
-                messages.append({"role": "user", "content": recent[i]})
-                if i + 1 < len(recent):
-                    messages.append({"role": "assistant", "content": recent[i + 1]})
-        messages.append({"role": "user", "content": query})
+        self._charge_openai_usage(estimated, getattr(getattr(resp, "usage", None), "total_tokens", None))
+        return self._openai_result(response_text, start, car_data)
+
+    async def _atry_openai_model(
+        self,
+        query: str,
+        car_data: Optional[dict],
+        conversation_history: Optional[List[str]],
+    ) -> dict[str, Any]:
+        if not self.openai_client and not self.async_openai_client:
+            raise RuntimeError("OpenAI client not configured")
+
+        request = self._openai_request(query, car_data, conversation_history)
+        estimated = estimate_tokens(request["messages"], request["max_tokens"])
+        if not self._acquire_openai_budget(estimated):
+            self.metrics["rate_limited_reroutes"] += 1
+            logger.warning("OpenAI budget exhausted; falling back to local model")
+            return await self._afallback("openai", query, car_data, conversation_history, reason="rate_limited")
+
+        self.metrics["openai_requests"] += 1
+        start = time.time()
 
         try:
-            resp = self.openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=messages,
-                temperature=0.95,
-                max_tokens=250,
-                timeout=self.config["openai_timeout"],
-                top_p=0.9,
-                presence_penalty=0.3,
-            )
+            resp = None
+            for attempt in range(self.config["max_retries"] + 1):
+                try:
+                    with span("llm_openai"):
+                        if self.async_openai_client:
+                            resp = await self.async_openai_client.chat.completions.create(**request)
+                        else:
+                            resp = await asyncio.to_thread(self.openai_client.chat.completions.create, **request)
+                    break
+                except Exception as exc:  # noqa: BLE001
+                    delay = self._retry_delay(exc, attempt)
+                    if delay is None:
+                        raise
+                    await asyncio.sleep(delay)
+                    # A retry is another request against the budget
+                    if not self._acquire_openai_budget(estimated):
+                        logger.warning("OpenAI budget exhausted; not retrying")
+                        raise
             response_text = resp.choices[0].message.content.strip()
         except Exception as exc:  # noqa: BLE001
-            if "429" in str(exc) or "quota" in str(exc).lower():
+            self._record_error("openai", type(exc).__name__)
+            if self._is_quota_error(exc):
                 logger.warning("OpenAI quota hit; falling back to local model")
-                return self._fallback("openai", query, car_data, conversation_history)
+                return await self._afallback("openai", query, car_data, conversation_history, reason="quota")
             raise
 
-        self._update_avg("avg_openai_time", "openai_requests", time.time() - start)
-        analysis = self.response_analyzer.analyze(response_text, car_data)
+        self._charge_openai_usage(estimated, getattr(getattr(resp, "usage", None), "total_tokens", None))
+        return self._openai_result(response_text, start, car_data)
+
+    def _acquire_openai_budget(self, estimated: int) -> bool:
+        """Take OpenAI budget for one request; rejections are counted apart from model errors."""
+        if self.rate_limiter.try_acquire(estimated):
+            return True
+        self.metrics["budget_rejections"] += 1
+        return False
+
+    def _charge_openai_usage(self, estimated: int, total_tokens: Optional[int]) -> None:
+        self.rate_limiter.record_usage(estimated, total_tokens)
+        if total_tokens:
+            registry.inc("chat_tokens_total", {"model": "openai"}, total_tokens)
+
+    def _retry_delay(self, exc: Exception, attempt: int) -> Optional[float]:
+        """Seconds to wait before retrying an OpenAI call, or None to give up now."""
+        retry_after = retry_after_of(exc)
+        if retry_after is not None and status_code_of(exc) == 429:
+            # Everyone else should back off too, not just this request
+            self.rate_limiter.pause(retry_after)
+
+        if attempt >= self.config["max_retries"] or not is_retryable(exc):
+            return None
+        if retry_after is not None and retry_after > self.config["retry_max_delay"]:
+            # Faster to answer from the local model than to wait this out
+            return None
+
+        delay = backoff_delay(attempt, self.config["retry_base_delay"], self.config["retry_max_delay"], retry_after)
+        self.metrics["openai_retries"] += 1
+        logger.warning("OpenAI call failed (%s); retry %d in %.2fs", exc, attempt + 1, delay)
+        return delay
+
+    def _openai_request(
+        self,
+        query: str,
+        car_data: Optional[dict],
+        conversation_history: Optional[List[str]],
+    ) -> dict[str, Any]:
+        return {
+            "model": "gpt-3.5-turbo",
+            "messages": self._build_openai_messages(query, car_data, conversation_history),
+            "temperature": 0.95,
+            "max_tokens": self.config["openai_max_tokens"],
+            "timeout": self.config["openai_timeout"],
+            "top_p": 0.9,
+            "presence_penalty": 0.3,
+        }
+
+    def _openai_result(self, response_text: str, start: float, car_data: Optional[dict]) -> dict[str, Any]:
+        self._record_latency("openai", time.time() - start)
+        analysis = self._analyze(response_text, car_data)
         return {"response": response_text, "model": "openai", "analysis": analysis}
 
+    @staticmethod
+    def _is_quota_error(exc: Exception) -> bool:
+        return "429" in str(exc) or "quota" in str(exc).lower()
+
+    # ------------------------------------------------------------------
+    # Streaming
+    # ------------------------------------------------------------------
+    def stream_query(
+        self,
+        query: str,
+        car_data: Optional[dict] = None,
+        conversation_history: Optional[List[str]] = None,
+        force_model: Optional[str] = None,
+    ) -> Iterator[dict[str, Any]]:
+        """Yield {"type": "token"} events as text arrives, then one {"type": "done"} event."""
+        force_model = self._effective_force_model(force_model)
+        start_time = time.time()
+        classification, use_cache, early_result = self._prepare_route(
+            query, car_data, conversation_history, force_model, start_time
+        )
+        if early_result:
+            yield {"type": "token", "text": early_result["response"]}
+            yield {"type": "done", **early_result, "time_to_first_token": early_result["response_time"]}
+            return
+
+        model_choice = self._choose_model(classification, force_model)
+        order = [model_choice, "local" if model_choice == "openai" else "openai"]
+        parts: list[str] = []
+        first_token_time: float | None = None
+        model_used = "error"
+        interrupted = False
+        shed = False
+
+        for model in order:
+            if not self._is_available(model):
+                continue
+            if model != model_choice:
+                logger.info("Falling back to %s model for streaming", model)
+            try:
+                for text in self._stream_model(model, query, car_data, conversation_history):
+                    if first_token_time is None:
+                        first_token_time = time.time() - start_time
+                    parts.append(text)
+                    yield {"type": "token", "text": text}
+                model_used = model
+                break
+            except Exception as exc:  # noqa: BLE001
+                # Our own budget saying no, or the local model shedding, is not a model failure
+                if not isinstance(exc, (OpenAIBudgetExhausted, LocalLLMOverloaded)):
+                    self._record_error(model, type(exc).__name__)
+                logger.error("Streaming from %s failed: %s", model, exc)
+                if parts:
+                    # Tokens already reached the client; don't splice in a second model.
+                    # The answer is truncated, so it must not be cached
+                    model_used = model
+                    interrupted = True
+                    break
+                shed = shed or isinstance(exc, LocalLLMOverloaded)
+                self._count_fallback(model, exc, "rate_limited" if isinstance(exc, OpenAIBudgetExhausted) else None)
+
+        response_text = re.sub(r"^(\s*Assistant:?\s*)", "", "".join(parts)).strip()
+        if not response_text:
+            # Same replies as route_query when every model failed or shed the request
+            fallback = self._shed_response(query) if shed else self._error_response()
+            response_text, model_used = fallback["response"], fallback["model"]
+            yield {"type": "token", "text": response_text}
+
+        analysis = self._analyze(response_text, car_data)
+        result = self._finish_route(
+            query,
+            car_data,
+            classification,
+            use_cache,
+            {"response": response_text, "model": model_used, "analysis": analysis, "partial": interrupted},
+            start_time,
+        )
+        yield {
+            "type": "done",
+            **result,
+            "partial": interrupted,
+            "time_to_first_token": first_token_time if first_token_time is not None else result["response_time"],
+        }
+
+    def _stream_model(
+        self,
+        model: str,
+        query: str,
+        car_data: Optional[dict],
+        conversation_history: Optional[List[str]],
+    ) -> Iterator[str]:
+        start = time.time()
+        if model == "local":
+            self.metrics["local_requests"] += 1
+            system_prompt, user_prompt = self._build_local_prompts(query, car_data, conversation_history)
+            yield from self.local_llm_client.generate_stream(
+                prompt=user_prompt,
+                system_prompt=system_prompt,
+                temperature=0.7,
+                max_tokens=400,
+            )
+            self._record_latency("local", time.time() - start)
+            return
+
+        request = self._openai_request(query, car_data, conversation_history)
+        estimated = estimate_tokens(request["messages"], request["max_tokens"])
+        if not self._acquire_openai_budget(estimated):
+            self.metrics["rate_limited_reroutes"] += 1
+            raise OpenAIBudgetExhausted("OpenAI budget exhausted")
+
+        self.metrics["openai_requests"] += 1
+        # The estimate stays charged if the stream is cut off before the usage chunk
+        request.update(stream=True, stream_options={"include_usage": True})
+        if self.openai_client:
+            stream = self.openai_client.chat.completions.create(**request)
+        else:
+            stream = self._iter_async_stream(request)
+        total_tokens = None
+        for chunk in stream:
+            if getattr(chunk, "usage", None) is not None:
+                total_tokens = chunk.usage.total_tokens
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+        self._charge_openai_usage(estimated, total_tokens)
+        self._record_latency("openai", time.time() - start)
+
+    def _iter_async_stream(self, request: dict[str, Any]) -> Iterator[Any]:
+        """
+        Iterate an async_openai_client stream from synchronous code.
+
+        stream_query is a plain generator run in a worker thread, so with only
+        the async client configured it drives the stream on a private loop.
+        """
+        loop = asyncio.new_event_loop()
+        stream = None
+        try:
+            stream = loop.run_until_complete(self.async_openai_client.chat.completions.create(**request))
+            chunks = stream.__aiter__()
+            while True:
+                try:
+                    yield loop.run_until_complete(chunks.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            close = getattr(stream, "close", None)
+            if close is not None and asyncio.iscoroutinefunction(close):
+                loop.run_until_complete(close())
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.close()
+
+    # ------------------------------------------------------------------
+    # Prompt builders
+    # ------------------------------------------------------------------
+    def _build_local_prompts(
+        self,
+        query: str,
+        car_data: Optional[dict],
+        conversation_history: Optional[List[str]] = None,
+    ) -> tuple[str, str]:
+        question = self._local_question(query, car_data)
+        instructions, car_context = self._system_parts(car_data)
+        prompt = self._fit_prompt(
+            question, instructions, car_context, conversation_history, self.config["local_prompt_budget"]
+        )
+        turns = [
+            f"{'Human' if turn['role'] == 'user' else 'Assistant'}: {turn['content']}"
+            for turn in prompt["history"]
+        ]
+        return prompt["system"], "\n".join(turns + [prompt["query"]])
+
+    @staticmethod
+    def _local_question(query: str, car_data: Optional[dict]) -> str:
+        return (
+            f"About the {car_data.get('year')} {car_data.get('manufacturer')} {car_data.get('model')}: {query}\nAnswer:"
+            if car_data
+            else f"Human: {query}\nAssistant:"
+        )
+
+    def _build_openai_messages(
+        self,
+        query: str,
+        car_data: Optional[dict],
+        conversation_history: Optional[List[str]],
+    ) -> list[dict[str, str]]:
+        # Static instructions + style guide first, car context after: a stable prefix
+        instructions, car_context = self._system_parts(car_data)
+        prompt = self._fit_prompt(
+            query,
+            self._with_style_guide(instructions),
+            car_context,
+            conversation_history,
+            self.config["openai_prompt_budget"],
+        )
+
+        messages: list[dict[str, str]] = [{"role": "system", "content": prompt["system"]}]
+        messages.extend(prompt["history"])
+        messages.append({"role": "user", "content": prompt["query"]})
+        return messages
+
+    @staticmethod
+    @functools.lru_cache(maxsize=8)
+    def _with_style_guide(instructions: str) -> str:
+        return instructions + OPENAI_STYLE_GUIDE
+
+    @staticmethod
+    def _system_parts(car_data: Optional[dict]) -> tuple[str, str]:
+        """Generic instructions and the car-specific context (memoized per car)."""
+        return get_system_prompt_parts(car_data)
+
+    def _fit_prompt(
+        self,
+        query: str,
+        instructions: str,
+        car_context: str,
+        conversation_history: Optional[List[str]],
+        budget: int,
+    ) -> dict[str, Any]:
+        prompt = build_prompt(query, instructions, car_context, conversation_history, budget)
+        self.metrics["history_items_dropped"] += prompt["dropped_history"]
+        return prompt
+
     # ------------------------------------------------------------------
     # Utility
     # ------------------------------------------------------------------
+    def _record_latency(self, model: str, seconds: float) -> None:
+        self.model_stats.record_success(model, seconds)
+        registry.observe("chat_model_latency_seconds", seconds, {"model": model})
+        self._update_avg(f"avg_{model}_time", f"{model}_requests", seconds)
+
+    def _record_error(self, model: str, error_class: str) -> None:
+        self.model_stats.record_error(model)
+        registry.inc("chat_model_errors_total", {"model": model, "error": error_class})
+
+    def _analyze(self, response_text: str, car_data: Optional[dict]) -> dict[str, Any]:
+        with registry.time("chat_analysis_seconds"), span("analysis"):
+            return self.response_analyzer.analyze(response_text, car_data)
+
+    @staticmethod
+    def _observe_request(classification: dict[str, Any], model: str, elapsed: float) -> None:
+        for query_type in classification["query_types"]:
+            registry.inc("chat_requests_total", {"query_type": query_type, "model": model})
+            registry.observe("chat_request_seconds", elapsed, {"query_type": query_type})
+
     def _update_avg(self, avg_key: str, count_key: str, new_time: float) -> None:
         count = self.metrics[count_key]
         prev_avg = self.metrics[avg_key]
@@ -0,0 +1,109 @@
+# model_stats.py
+"""
+Module for tracking per-model latency and reliability.
+Used by the model router to pick the model most likely to meet the latency SLO.
+"""
+
+import threading
+from collections import deque
+from typing import Any, Dict, Iterable, Optional
+
+
+class ModelStats:
+    """
+    Sliding-window latency and error statistics for each model.
+
+    Attributes:
+        window: Number of recent requests kept per model
+        alpha: Smoothing factor for the EWMA latency (higher reacts faster)
+    """
+
+    def __init__(self, models: Iterable[str] = ("openai", "local"), window: int = 200, alpha: float = 0.2):
+        self.window = window
+        self.alpha = alpha
+        self.lock = threading.Lock()
+        self.latencies: Dict[str, deque] = {}
+        self.outcomes: Dict[str, deque] = {}
+        self.ewma: Dict[str, Optional[float]] = {}
+        for model in models:
+            self._ensure(model)
+
+    def _ensure(self, model: str) -> None:
+        if model not in self.latencies:
+            self.latencies[model] = deque(maxlen=self.window)
+            self.outcomes[model] = deque(maxlen=self.window)
+            self.ewma[model] = None
+
+    def record_success(self, model: str, latency: float) -> None:
+        """Record a successful request and its latency in seconds."""
+        with self.lock:
+            self._ensure(model)
+            self.latencies[model].append(latency)
+            self.outcomes[model].append(True)
+            previous = self.ewma[model]
+            self.ewma[model] = latency if previous is None else self.alpha * latency + (1 - self.alpha) * previous
+
+    def record_censored(self, model: str, latency: float) -> None:
+        """
+        Record a request abandoned after `latency` seconds (e.g. a cancelled hedge loser).
+
+        Its real latency was at least this long, so it goes into the latency
+        window as a lower bound; it is neither a success nor an error.
+        """
+        with self.lock:
+            self._ensure(model)
+            self.latencies[model].append(latency)
+            previous = self.ewma[model]
+            self.ewma[model] = latency if previous is None else self.alpha * latency + (1 - self.alpha) * previous
+
+    def record_error(self, model: str) -> None:
+        """Record a failed request."""
+        with self.lock:
+            self._ensure(model)
+            self.outcomes[model].append(False)
+
+    def sample_count(self, model: str) -> int:
+        """Requests recorded over the window, failures included."""
+        return len(self.outcomes.get(model, ()))
+
+    def latency_sample_count(self, model: str) -> int:
+        """Successful requests with a recorded latency over the window."""
+        return len(self.latencies.get(model, ()))
+
+    def percentile(self, model: str, pct: float) -> float:
+        """Latency percentile over the window (0.0 with no samples)."""
+        with self.lock:
+            samples = sorted(self.latencies.get(model, ()))
+        if not samples:
+            return 0.0
+        index = min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def error_rate(self, model: str) -> float:
+        """Fraction of failed requests over the window."""
+        with self.lock:
+            outcomes = list(self.outcomes.get(model, ()))
+        if not outcomes:
+            return 0.0
+        return outcomes.count(False) / len(outcomes)
+
+    def expected_latency(self, model: str) -> Optional[float]:
+        """EWMA latency inflated by the error rate (a failure costs a retry elsewhere)."""
+        latency = self.ewma.get(model)
+        if latency is None:
+            return None
+        return latency / max(1.0 - self.error_rate(model), 0.05)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Per-model summary for metrics endpoints."""
+        return {
+            model: {
+                "ewma_latency": self.ewma[model],
+                "p50_latency": self.percentile(model, 50),
+                "p95_latency": self.percentile(model, 95),
+                "error_rate": self.error_rate(model),
+                "samples": self.sample_count(model),
+                "latency_samples": self.latency_sample_count(model),
+            }
+            for model in list(self.latencies)
+        }
@@ -0,0 +1,127 @@
+# prompt_builder.py
+"""
+Module for assembling model prompts within a token budget.
+The user's question is always kept; the car context, the assistant
+instructions and then the conversation history (newest first) fill
+whatever budget remains, so prompt size, latency and cost stay bounded.
+"""
+
+from typing import Any, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Rough per-message framing cost (role markers, separators)
+MESSAGE_OVERHEAD = 4
+
+_encoding = None
+_encoding_loaded = False
+
+
+def _get_encoding():
+    """tiktoken's cl100k_base encoding if available, else None (character heuristic)."""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:  # ImportError, or no cached encoding file offline
+            logger.info(f"tiktoken unavailable, estimating tokens from length: {e}")
+            _encoding = None
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """Token count of `text` (tiktoken if installed, otherwise ~4 characters per token)."""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return (len(text) + 3) // 4
+
+
+def truncate_tokens(text: str, max_tokens: int, keep_tail: bool = False) -> str:
+    """
+    Cut `text` down to at most `max_tokens` tokens.
+
+    Args:
+        keep_tail: Keep the first and last halves instead of only the beginning
+    """
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    encoding = _get_encoding()
+    if encoding is not None:
+        ids = encoding.encode(text)
+        if keep_tail:
+            half = max_tokens // 2
+            return encoding.decode(ids[:half]) + " ... " + encoding.decode(ids[len(ids) - (max_tokens - half):])
+        return encoding.decode(ids[:max_tokens])
+
+    max_chars = max_tokens * 4
+    if keep_tail:
+        half = max_chars // 2
+        return text[:half] + " ... " + text[len(text) - (max_chars - half):]
+    return text[:max_chars]
+
+
+def build_prompt(
+    query: str,
+    instructions: str = "",
+    car_context: str = "",
+    history: Optional[List[str]] = None,
+    budget: int = 512,
+) -> Dict[str, Any]:
+    """
+    Fit the prompt parts into `budget` tokens by priority.
+
+    Priority: query, car context, instructions, then history from newest to
+    oldest. History is flat alternating user/assistant turns (even index =
+    user) and is dropped oldest-first; the kept turns are contiguous and
+    start with a user turn.
+
+    Returns:
+        Dict with "system" (instructions + car context), "history" as
+        [{"role", "content"}] messages, "query", "tokens" used and
+        "dropped_history" count
+    """
+    history = history or []
+
+    # Leave room for the message framing and the " ... " joint of a cut query
+    query = truncate_tokens(query, budget - MESSAGE_OVERHEAD - 2, keep_tail=True)
+    remaining = budget - count_tokens(query) - MESSAGE_OVERHEAD
+
+    # The system message's framing is reserved along with the car context
+    car_context = truncate_tokens(car_context, remaining - MESSAGE_OVERHEAD)
+    remaining -= count_tokens(car_context)
+
+    instructions = truncate_tokens(instructions, remaining - MESSAGE_OVERHEAD)
+    remaining -= count_tokens(instructions) + (MESSAGE_OVERHEAD if instructions or car_context else 0)
+
+    kept: List[Dict[str, str]] = []
+    for index in range(len(history) - 1, -1, -1):
+        cost = count_tokens(history[index]) + MESSAGE_OVERHEAD
+        if cost > remaining:
+            break
+        remaining -= cost
+        kept.append({"role": "user" if index % 2 == 0 else "assistant", "content": history[index]})
+    if kept and kept[-1]["role"] == "assistant":
+        # Don't open the history with an answer whose question was dropped
+        remaining += count_tokens(kept.pop()["content"]) + MESSAGE_OVERHEAD
+    kept.reverse()
+
+    dropped = len(history) - len(kept)
+    if dropped:
+        logger.debug(f"Prompt budget {budget}: dropped {dropped} oldest history items")
+
+    return {
+        "system": instructions + car_context,
+        "history": kept,
+        "query": query,
+        "tokens": budget - remaining,
+        "dropped_history": dropped,
+    }
@@ -0,0 +1,155 @@
+# rate_limiter.py
+"""
+Module for client-side rate limiting and retry timing for OpenAI calls.
+Keeps us under the account's requests-per-minute and tokens-per-minute
+limits so that traffic goes to the local model before OpenAI starts
+answering with 429s.
+"""
+
+import random
+import threading
+import time
+from typing import Any, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class OpenAIBudgetExhausted(RuntimeError):
+    """Raised when a request would exceed the client-side OpenAI budget."""
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at `rate_per_minute / 60` per second.
+
+    Attributes:
+        capacity: Maximum burst size
+        tokens: Currently available tokens (may go negative after adjust())
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def has(self, amount: float) -> bool:
+        with self.lock:
+            self._refill()
+            return self.tokens >= amount
+
+    def try_take(self, amount: float) -> bool:
+        with self.lock:
+            self._refill()
+            if self.tokens < amount:
+                return False
+            self.tokens -= amount
+            return True
+
+    def adjust(self, delta: float) -> None:
+        """Charge (positive) or refund (negative) tokens after the real cost is known."""
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - delta)
+
+
+class OpenAIRateLimiter:
+    """
+    Request and token budgets for the OpenAI API, plus Retry-After pauses.
+
+    Attributes:
+        requests: Bucket sized to requests per minute (RPM)
+        tokens: Bucket sized to tokens per minute (TPM)
+    """
+
+    def __init__(self, rpm: int = 3500, tpm: int = 90000):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.paused_until = 0.0
+
+    def pause(self, seconds: float) -> None:
+        """Stop admitting requests for `seconds` (e.g. from a Retry-After header)."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        logger.warning(f"OpenAI budget paused for {seconds:.1f}s")
+
+    def has_capacity(self, estimated_tokens: int) -> bool:
+        """Whether a request of this size would be admitted right now, without taking budget."""
+        if time.monotonic() < self.paused_until:
+            return False
+        return self.requests.has(1) and self.tokens.has(estimated_tokens)
+
+    def try_acquire(self, estimated_tokens: int) -> bool:
+        """Take budget for one request; False if it would exceed RPM/TPM or we are paused."""
+        if time.monotonic() < self.paused_until:
+            return False
+        if not self.requests.try_take(1):
+            return False
+        if not self.tokens.try_take(estimated_tokens):
+            self.requests.adjust(-1)
+            return False
+        return True
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: Optional[int]) -> None:
+        """Correct the token budget once the response reports real usage."""
+        if actual_tokens is not None:
+            self.tokens.adjust(actual_tokens - estimated_tokens)
+
+
+def estimate_tokens(messages: Any, max_tokens: int) -> int:
+    """Rough request cost: ~4 characters per prompt token plus the completion allowance."""
+    chars = sum(len(m.get("content", "")) for m in messages) if isinstance(messages, list) else len(str(messages))
+    return chars // 4 + max_tokens
+
+
+def backoff_delay(attempt: int, base: float, cap: float, retry_after: Optional[float] = None) -> float:
+    """Exponential backoff with full jitter; a server Retry-After takes precedence."""
+    if retry_after is not None:
+        return retry_after
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def status_code_of(exc: Exception) -> Optional[int]:
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status
+
+
+def retry_after_of(exc: Exception) -> Optional[float]:
+    """Seconds from a Retry-After / retry-after-ms header on an API error, if any."""
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        return None
+    return None
+
+
+def is_quota_exhausted(exc: Exception) -> bool:
+    """Billing quota errors also come back as 429 but will not clear by retrying."""
+    text = str(exc).lower()
+    return "insufficient_quota" in text or "quota" in text
+
+
+def is_retryable(exc: Exception) -> bool:
+    if is_quota_exhausted(exc):
+        return False
+    status = status_code_of(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+    name = type(exc).__name__.lower()
+    return "timeout" in name or "connection" in name or "429" in str(exc)
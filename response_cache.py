@@ -0,0 +1,198 @@
+# response_cache.py
+"""
+Module for caching chat responses across users.
+Near-duplicate questions about the same car are matched with a character
+trigram index so that rephrasings ("what's the mpg?" / "whats the MPG")
+reuse one model answer instead of a new LLM round trip. Tokens with digits
+(years, trims, engine codes) must match exactly and in order, since a
+one-character change there ("2018" / "2019", "v6" / "v8") is a different
+question.
+"""
+
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Turns that refer to the user themselves or to earlier messages depend on
+# who is asking, so their answers are never shared
+PERSONAL_PATTERN = re.compile(
+    r"\b(i|i'm|im|i've|ive|my|me|mine|we|our|us|you said|earlier|before|previous|last time|again|that one|those)\b"
+)
+
+
+class ResponseCache:
+    """
+    Similarity-matched response cache keyed on (normalized query, car_id, query_types).
+
+    Attributes:
+        threshold: Minimum trigram Jaccard similarity for a near-duplicate hit
+        ttl_seconds: How long a cached response stays valid
+        max_entries: Maximum number of cached responses (LRU eviction)
+    """
+
+    def __init__(self, threshold: float = 0.85, ttl_seconds: int = 3600, max_entries: int = 5000):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+
+        # entry_id -> entry, in LRU order
+        self.entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        # (bucket, normalized query) -> entry_id for exact hits
+        self.exact: Dict[Tuple[Any, str], int] = {}
+        # bucket -> trigram -> entry_ids for near-duplicate lookups
+        self.index: Dict[Any, Dict[str, set]] = {}
+        self._next_id = 0
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        """Lowercase, drop punctuation and collapse whitespace."""
+        return " ".join(re.sub(r"[^\w\s]", "", query.lower()).split())
+
+    @staticmethod
+    def trigrams(normalized: str) -> set:
+        """Character trigrams of a normalized query, padded at the edges."""
+        padded = f"  {normalized} "
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    @staticmethod
+    def anchors(normalized: str) -> Tuple[str, ...]:
+        """Tokens containing digits, in order; near-duplicates must share them exactly."""
+        return tuple(token for token in normalized.split() if any(c.isdigit() for c in token))
+
+    @staticmethod
+    def is_cacheable(query: str) -> bool:
+        """Whether a query's answer can be shared across users."""
+        return not PERSONAL_PATTERN.search(query.lower())
+
+    @staticmethod
+    def _bucket(car_id: Any, query_types: Iterable[str]) -> Tuple[Any, Tuple[str, ...]]:
+        return car_id, tuple(sorted(query_types))
+
+    def get(
+        self,
+        query: str,
+        car_id: Any,
+        query_types: List[str],
+        threshold: Optional[float] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached response for this query.
+
+        Args:
+            threshold: Optional override of the similarity threshold
+
+        Returns:
+            The cached payload plus a "similarity" score, or None on a miss
+        """
+        bucket = self._bucket(car_id, query_types)
+        normalized = self.normalize(query)
+        now = time.time()
+
+        with self.lock:
+            entry_id = self.exact.get((bucket, normalized))
+            similarity = 1.0
+
+            if entry_id is None:
+                entry_id, similarity = self._best_match(
+                    bucket,
+                    self.trigrams(normalized),
+                    self.anchors(normalized),
+                    self.threshold if threshold is None else threshold,
+                )
+                if entry_id is None:
+                    return None
+
+            entry = self.entries[entry_id]
+            if now > entry["expiry"]:
+                self._remove(entry_id)
+                return None
+
+            self.entries.move_to_end(entry_id)
+            return {**entry["payload"], "similarity": similarity}
+
+    def set(
+        self,
+        query: str,
+        car_id: Any,
+        query_types: List[str],
+        payload: Dict[str, Any],
+        ttl: Optional[int] = None,
+    ) -> None:
+        """Cache a response payload for this query, with an optional TTL override."""
+        bucket = self._bucket(car_id, query_types)
+        normalized = self.normalize(query)
+        grams = self.trigrams(normalized)
+
+        with self.lock:
+            existing = self.exact.get((bucket, normalized))
+            if existing is not None:
+                self._remove(existing)
+
+            entry_id = self._next_id
+            self._next_id += 1
+            self.entries[entry_id] = {
+                "bucket": bucket,
+                "normalized": normalized,
+                "grams": grams,
+                "anchors": self.anchors(normalized),
+                "payload": payload,
+                "expiry": time.time() + (self.ttl_seconds if ttl is None else ttl),
+            }
+            self.exact[(bucket, normalized)] = entry_id
+            postings = self.index.setdefault(bucket, {})
+            for gram in grams:
+                postings.setdefault(gram, set()).add(entry_id)
+
+            while len(self.entries) > self.max_entries:
+                self._remove(next(iter(self.entries)))
+
+    def clear(self) -> None:
+        """Drop all cached responses."""
+        with self.lock:
+            self.entries.clear()
+            self.exact.clear()
+            self.index.clear()
+
+    def _best_match(
+        self, bucket: Any, grams: set, anchors: Tuple[str, ...], threshold: float
+    ) -> Tuple[Optional[int], float]:
+        """Find the most similar cached query in the bucket with the same anchors (caller holds the lock)."""
+        postings = self.index.get(bucket)
+        if not postings or not grams:
+            return None, 0.0
+
+        overlaps: Counter = Counter()
+        for gram in grams:
+            overlaps.update(postings.get(gram, ()))
+
+        best_id, best_score = None, 0.0
+        for entry_id, overlap in overlaps.items():
+            entry = self.entries[entry_id]
+            if entry["anchors"] != anchors:
+                continue
+            other = entry["grams"]
+            score = overlap / (len(grams) + len(other) - overlap)
+            if score > best_score:
+                best_id, best_score = entry_id, score
+
+        if best_score < threshold:
+            return None, best_score
+        return best_id, best_score
+
+    def _remove(self, entry_id: int) -> None:
+        """Remove an entry and its index postings (caller holds the lock)."""
+        entry = self.entries.pop(entry_id)
+        self.exact.pop((entry["bucket"], entry["normalized"]), None)
+        postings = self.index.get(entry["bucket"], {})
+        for gram in entry["grams"]:
+            ids = postings.get(gram)
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del postings[gram]
@@ -0,0 +1,306 @@
+# review_jobs.py
+"""
+Module for generating AI reviews as background jobs.
+A review takes one long OpenAI call plus a database write, so the API
+enqueues a job and returns its id; a small worker pool does the work and
+clients poll the job. Job state is written to a JSON file so queued and
+interrupted jobs resume after a restart.
+
+Jobs live in the process that accepted them, so the API must run as a
+single worker (uvicorn --workers 1): another worker would answer 404 for
+them. The state file is locked by the process that started first; any
+other process keeps its jobs in memory only rather than overwriting it.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import logging
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, so the state file owner is not enforced
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+FINISHED_STATES = (SUCCEEDED, FAILED)
+
+
+class ReviewQueueFull(RuntimeError):
+    """Raised when max_pending jobs are already queued or running."""
+
+
+class ReviewQueueClosed(RuntimeError):
+    """Raised by submit() after shutdown(), until start() is called again."""
+
+
+class ReviewJobQueue:
+    """
+    Bounded worker pool for review generation with per-car deduplication.
+
+    Attributes:
+        generate: Called with a car id in a worker thread; returns the saved review
+            or raises to fail the job
+        max_workers: Jobs generated at the same time
+        max_pending: Queued plus running jobs accepted before submit() refuses
+        state_path: JSON file the job table is persisted to (None keeps it in memory);
+            only the process holding its lock file reads or writes it
+        retention: Seconds finished jobs stay pollable
+        max_attempts: Runs a job gets, counting runs cut short by a restart
+    """
+
+    def __init__(
+        self,
+        generate: Callable[[int], Dict[str, Any]],
+        max_workers: int = 2,
+        max_pending: int = 32,
+        state_path: Optional[str] = None,
+        retention: float = 86400.0,
+        max_attempts: int = 2
+    ):
+        self.generate = generate
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.state_path = state_path
+        self.retention = retention
+        self.max_attempts = max_attempts
+
+        self.lock = threading.Lock()
+        self._persist_lock = threading.Lock()
+        self._state_lock_file = None
+        self._owns_state = False
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        # car_id -> id of its queued or running job
+        self.active: Dict[int, str] = {}
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self._closed = False
+        self.metrics = {
+            "submitted": 0,
+            "deduplicated": 0,
+            "rejected": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "resumed": 0,
+        }
+
+    def start(self) -> None:
+        """Start the workers and resume unfinished jobs from the state file."""
+        if self.executor is not None:
+            return
+        self._closed = False
+        self._claim_state_file()
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="review-job")
+        for job_id in self._load():
+            self.executor.submit(self._run, job_id)
+
+    def shutdown(self, wait: bool = False) -> None:
+        """Stop the workers; unfinished jobs stay in the state file for the next start()."""
+        self._closed = True
+        if self.executor is not None:
+            self.executor.shutdown(wait=wait, cancel_futures=True)
+            self.executor = None
+        self._release_state_file()
+
+    # ------------------------------------------------------------------
+    # Jobs
+    # ------------------------------------------------------------------
+    def submit(self, car_id: int) -> Tuple[Dict[str, Any], bool]:
+        """
+        Enqueue review generation for a car.
+
+        Returns:
+            (job, created): created is False when the car already had a job in flight,
+            whose state is returned instead
+
+        Raises:
+            ReviewQueueFull: max_pending jobs are already queued or running
+            ReviewQueueClosed: the queue has been shut down
+        """
+        if self._closed:
+            raise ReviewQueueClosed("Review job queue is shut down")
+        if self.executor is None:
+            self.start()
+        executor = self.executor
+        with self.lock:
+            existing = self.active.get(car_id)
+            if existing is not None:
+                self.metrics["deduplicated"] += 1
+                return dict(self.jobs[existing]), False
+            if len(self.active) >= self.max_pending:
+                self.metrics["rejected"] += 1
+                raise ReviewQueueFull(f"{len(self.active)} review jobs already pending")
+
+            job = {
+                "job_id": uuid.uuid4().hex,
+                "car_id": car_id,
+                "status": QUEUED,
+                "created_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "attempts": 0,
+                "result": None,
+                "error": None,
+            }
+            self.jobs[job["job_id"]] = job
+            self.active[car_id] = job["job_id"]
+            self.metrics["submitted"] += 1
+            self._prune()
+            snapshot = dict(job)
+
+        self._persist()
+        try:
+            executor.submit(self._run, job["job_id"])
+        except RuntimeError:
+            # shutdown() ran after the check above; the job stays queued for the next start()
+            raise ReviewQueueClosed("Review job queue is shut down")
+        logger.info(f"Queued review job {job['job_id']} for car {car_id}")
+        return snapshot, True
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """A copy of the job's state, or None if it is unknown or expired."""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def _run(self, job_id: str) -> None:
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job["status"] in FINISHED_STATES:
+                return
+            job["status"] = RUNNING
+            job["started_at"] = time.time()
+            job["attempts"] += 1
+            car_id = job["car_id"]
+        self._persist()
+
+        try:
+            result = self.generate(car_id)
+            status, error = SUCCEEDED, None
+        except Exception as e:
+            logger.error(f"Review job {job_id} for car {car_id} failed: {e}", exc_info=True)
+            result, status, error = None, FAILED, str(e) or type(e).__name__
+
+        self._finish(job_id, status, result, error)
+
+    def _finish(self, job_id: str, status: str, result: Optional[Dict[str, Any]], error: Optional[str]) -> None:
+        with self.lock:
+            job = self.jobs[job_id]
+            job.update(status=status, result=result, error=error, finished_at=time.time())
+            if self.active.get(job["car_id"]) == job_id:
+                del self.active[job["car_id"]]
+            self.metrics[status] += 1
+        self._persist()
+        logger.info(f"Review job {job_id} for car {job['car_id']} {status}")
+
+    def _prune(self) -> None:
+        """Drop finished jobs older than the retention period (caller holds the lock)."""
+        cutoff = time.time() - self.retention
+        expired = [
+            job_id for job_id, job in self.jobs.items()
+            if job["status"] in FINISHED_STATES and job["finished_at"] < cutoff
+        ]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+    def _claim_state_file(self) -> None:
+        """Lock state_path so only one process resumes and persists its jobs."""
+        if not self.state_path:
+            return
+        if fcntl is None:
+            self._owns_state = True
+            return
+        try:
+            lock_file = open(f"{self.state_path}.lock", "a")
+        except OSError as e:
+            logger.warning(f"Could not open the lock for {self.state_path}; review jobs stay in memory: {e}")
+            return
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            logger.warning(
+                f"{self.state_path} is owned by another process; review jobs in this one stay in memory. "
+                "Run the API with a single worker."
+            )
+            return
+        self._state_lock_file = lock_file
+        self._owns_state = True
+
+    def _release_state_file(self) -> None:
+        if self._state_lock_file is not None:
+            # Closing the file drops the lock
+            self._state_lock_file.close()
+            self._state_lock_file = None
+        self._owns_state = False
+
+    def _persist(self) -> None:
+        """Atomically write the job table to state_path."""
+        if not self._owns_state:
+            return
+        # One writer at a time, so an older table never replaces a newer one
+        with self._persist_lock:
+            with self.lock:
+                data = json.dumps({"jobs": list(self.jobs.values())}, default=str)
+            tmp_path = f"{self.state_path}.tmp"
+            try:
+                with open(tmp_path, "w") as f:
+                    f.write(data)
+                os.replace(tmp_path, self.state_path)
+            except OSError as e:
+                logger.warning(f"Could not persist review jobs to {self.state_path}: {e}")
+
+    def _load(self) -> List[str]:
+        """Load persisted jobs; return the ids of the unfinished ones to resume."""
+        if not self._owns_state or not os.path.exists(self.state_path):
+            return []
+        try:
+            with open(self.state_path) as f:
+                jobs = json.load(f).get("jobs", [])
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable review job state {self.state_path}: {e}")
+            return []
+
+        resume = []
+        with self.lock:
+            for job in jobs:
+                self.jobs[job["job_id"]] = job
+                if job["status"] in FINISHED_STATES:
+                    continue
+                if job["attempts"] >= self.max_attempts:
+                    # It was running when the process died on its last attempt
+                    job.update(status=FAILED, error="Interrupted by restart", finished_at=time.time())
+                    self.metrics["failed"] += 1
+                    continue
+                job["status"] = QUEUED
+                self.active[job["car_id"]] = job["job_id"]
+                resume.append(job["job_id"])
+            self.metrics["resumed"] += len(resume)
+            self._prune()
+        if resume:
+            logger.info(f"Resuming {len(resume)} review jobs from {self.state_path}")
+        self._persist()
+        return resume
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                **self.metrics,
+                "pending": len(self.active),
+                "running": sum(1 for job in self.jobs.values() if job["status"] == RUNNING),
+                "tracked_jobs": len(self.jobs),
+                "max_workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "persistent": self._owns_state,
+            }
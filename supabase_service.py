@@ -6,6 +6,8 @@ import random
 from typing import List, Dict, Optional
 from dotenv import load_dotenv
 
+from .cache_service import cache
+
 # Load environment variables
 load_dotenv()
 
@@ -137,6 +139,7 @@ def is_using_fallback():
     """Check if we're using the fallback data source."""
     return supabase is None
 
+@cache.memoize("cars", ttl=300)
 def get_cars(limit: int = 50, query: Optional[str] = None, manufacturer: Optional[str] = None) -> List[Dict]:
     """
     Get cars from Supabase or fallback to sample data.
@@ -198,6 +201,7 @@ def get_cars(limit: int = 50, query: Optional[str] = None, manufacturer: Optiona
         logger.warning("Falling back to sample car data")
         return get_cars(limit, query, manufacturer)  # Recursively call using fallback
 
+@cache.memoize("car", ttl=600)
 def get_car_by_id(car_id: int) -> Optional[Dict]:
     """
     Get a car by ID from Supabase or fallback data.
@@ -229,6 +233,7 @@ def get_car_by_id(car_id: int) -> Optional[Dict]:
         logger.error(f"Error fetching car from Supabase: {str(e)}")
         return get_car_by_id(car_id)  # Recursively call using fallback
 
+@cache.memoize("manufacturers", ttl=3600)
 def get_manufacturers() -> List[str]:
     """
     Get a list of all unique manufacturers from Supabase or fallback data.
@@ -265,6 +270,7 @@ def get_manufacturers() -> List[str]:
         logger.error(f"Error fetching manufacturers from Supabase: {str(e)}")
         return get_manufacturers()  # Recursively call using fallback
 
+@cache.memoize("reviews", ttl=300)
 def get_reviews_for_car(car_id: int) -> List[Dict]:
     """
     Get reviews for a specific car from Supabase or fallback data.
@@ -339,6 +345,7 @@ def add_review(car_id: int, review_data: Dict) -> Optional[Dict]:
         
         if response.data and len(response.data) > 0:
             logger.info(f"Successfully added review for car ID {car_id}")
+            get_reviews_for_car.invalidate(car_id)
             
             # Add pros and cons back to the response data for the UI
             result = response.data[0]
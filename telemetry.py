@@ -0,0 +1,204 @@
+# telemetry.py
+"""
+Module for latency histograms and counters exported in Prometheus text format.
+Running averages hide tail latency; fixed-bucket histograms let the
+monitoring side compute p95/p99 with histogram_quantile().
+Also holds the opt-in per-request stage timings (span()).
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Seconds; covers cache hits through slow local generations
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0)
+# Seconds; for in-process stages that normally take well under 10ms
+FAST_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram.
+
+    Attributes:
+        buckets: Upper bounds (inclusive) of the finite buckets
+        counts: Observations per bucket, plus a final +Inf bucket
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """(le, cumulative count) pairs including +Inf."""
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            result.append(("+Inf" if bound == float("inf") else _format_value(bound), total))
+        return result
+
+
+class MetricsRegistry:
+    """Thread-safe store of labelled counters and histograms."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters: Dict[str, Dict[LabelKey, float]] = {}
+        self.histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self.help: Dict[str, str] = {}
+        self.buckets: Dict[str, Sequence[float]] = {}
+
+    def describe(self, name: str, help_text: str, buckets: Optional[Sequence[float]] = None) -> None:
+        """Register HELP text and, for histograms, non-default buckets."""
+        self.help[name] = help_text
+        if buckets is not None:
+            self.buckets[name] = buckets
+
+    def inc(self, name: str, labels: Optional[Dict[str, str]] = None, amount: float = 1) -> None:
+        key = _label_key(labels)
+        with self.lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, labels: Optional[Dict[str, str]] = None) -> None:
+        key = _label_key(labels)
+        with self.lock:
+            series = self.histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(self.buckets.get(name, DEFAULT_BUCKETS))
+            histogram.observe(value)
+
+    @contextmanager
+    def time(self, name: str, labels: Optional[Dict[str, str]] = None) -> Iterator[None]:
+        """Observe the duration of the with-block in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, labels)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (0.0.4)."""
+        lines: List[str] = []
+        with self.lock:
+            for name in sorted(self.counters):
+                self._header(lines, name, "counter")
+                for key, value in sorted(self.counters[name].items()):
+                    lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+
+            for name in sorted(self.histograms):
+                self._header(lines, name, "histogram")
+                for key, histogram in sorted(self.histograms[name].items()):
+                    for le, count in histogram.cumulative():
+                        lines.append(f"{name}_bucket{_format_labels(key + (('le', le),))} {count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {_format_value(histogram.sum)}")
+                    lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def _header(self, lines: List[str], name: str, kind: str) -> None:
+        if name in self.help:
+            lines.append(f"# HELP {name} {self.help[name]}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    def reset(self) -> None:
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+
+class StageTimings:
+    """
+    Durations of the stages of one request, in the order they first ran.
+
+    Attributes:
+        stages: Stage name -> accumulated seconds (repeated stages add up)
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+
+    def add(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def as_dict(self) -> Dict[str, float]:
+        """Stage durations in milliseconds."""
+        return {name: round(seconds * 1000, 2) for name, seconds in self.stages.items()}
+
+    def server_timing(self) -> str:
+        """Value for a Server-Timing response header."""
+        return ", ".join(f"{name};dur={ms}" for name, ms in self.as_dict().items())
+
+
+_current_timings: ContextVar[Optional[StageTimings]] = ContextVar("stage_timings", default=None)
+
+
+def start_timings() -> StageTimings:
+    """
+    Start collecting stage timings for the current request.
+
+    Each request handler runs in its own task context, and asyncio tasks and
+    to_thread calls started from it inherit the collector.
+    """
+    timings = StageTimings()
+    _current_timings.set(timings)
+    return timings
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time the with-block as stage `name`; a no-op unless start_timings() was called."""
+    timings = _current_timings.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - start)
+
+
+def _label_key(labels: Optional[Dict[str, str]]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in (labels or {}).items()))
+
+
+def _format_labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in key) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+# Shared registry for the chat service
+registry = MetricsRegistry()
+registry.describe("chat_model_latency_seconds", "Successful model call latency by model.")
+registry.describe("chat_classification_seconds", "QueryClassifier.classify duration.", FAST_BUCKETS)
+registry.describe("chat_analysis_seconds", "ResponseAnalyzer.analyze duration.", FAST_BUCKETS)
+registry.describe("chat_car_fetch_seconds", "Car data fetch duration for a chat request.")
+registry.describe("chat_request_seconds", "End-to-end routed request latency by query type.")
+registry.describe("chat_requests_total", "Routed chat requests by query type and model.")
+registry.describe("chat_tokens_total", "Tokens used by model.")
+registry.describe("chat_fallbacks_total", "Fallbacks to another model by failed model and reason.")
+registry.describe("chat_model_errors_total", "Model call errors by model and error class.")
+registry.describe("local_llm_latency_seconds", "Ollama generate latency by endpoint.")
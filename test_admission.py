@@ -0,0 +1,72 @@
+# test_admission.py
+"""Unit tests for AdmissionController's concurrency limit and bounded wait queue."""
+
+import asyncio
+import threading
+import time
+
+from app.admission import AdmissionController
+
+
+def test_queue_full_is_rejected_immediately():
+    controller = AdmissionController(max_concurrency=1, max_queue=0, queue_timeout=5.0)
+    assert controller.acquire()
+
+    start = time.monotonic()
+    assert not controller.acquire()
+    assert time.monotonic() - start < 0.5
+    assert controller.get_stats()["rejected_queue_full"] == 1
+    assert controller.is_saturated()
+
+
+def test_queued_request_is_shed_after_its_budget():
+    controller = AdmissionController(max_concurrency=1, max_queue=4, queue_timeout=0.05)
+    assert controller.acquire()
+
+    start = time.monotonic()
+    assert not controller.acquire()
+    assert time.monotonic() - start >= 0.05
+    stats = controller.get_stats()
+    assert stats["rejected_timeout"] == 1 and stats["queue_depth"] == 0
+
+
+def test_queued_request_gets_the_released_slot():
+    controller = AdmissionController(max_concurrency=1, max_queue=4, queue_timeout=2.0)
+    assert controller.acquire()
+    threading.Timer(0.05, controller.release).start()
+
+    assert controller.acquire()
+    stats = controller.get_stats()
+    assert stats["admitted_after_wait"] == 1 and stats["active"] == 1 and stats["max_queue_wait"] > 0
+
+
+def test_cancelled_aacquire_gives_back_the_slot_it_later_obtains():
+    controller = AdmissionController(max_concurrency=1, max_queue=4, queue_timeout=2.0)
+    assert controller.acquire()
+
+    async def main():
+        waiter = asyncio.ensure_future(controller.aacquire())
+        await asyncio.sleep(0.05)
+        waiter.cancel()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            pass
+        # The abandoned worker thread still wins the slot once it is free...
+        controller.release()
+        deadline = time.monotonic() + 2.0
+        while controller.get_stats()["admitted_after_wait"] == 0 and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)
+
+    asyncio.run(main())
+    # ...and hands it straight back
+    assert controller.get_stats()["admitted_after_wait"] == 1
+    assert controller.get_stats()["active"] == 0
+
+
+def test_aacquire_takes_a_free_slot_without_a_thread():
+    controller = AdmissionController(max_concurrency=2)
+
+    assert asyncio.run(controller.aacquire())
+    assert controller.get_stats()["active"] == 1
@@ -0,0 +1,67 @@
+# test_automotive_system_message.py
+"""Unit tests for the memoized system prompt parts."""
+
+import pytest
+
+from app import automotive_system_message as asm
+
+CAR = {"id": 1, "year": 2021, "manufacturer": "Honda", "model": "Accord", "mpg": 33}
+
+
+@pytest.fixture(autouse=True)
+def empty_prompt_cache():
+    asm.invalidate_system_prompt()
+    yield
+    asm.invalidate_system_prompt()
+
+
+def test_instructions_prefix_is_shared_by_every_car():
+    instructions, context = asm.get_system_prompt_parts(CAR)
+    other_instructions, other_context = asm.get_system_prompt_parts({**CAR, "id": 2, "model": "Civic"})
+
+    assert instructions == other_instructions == asm.create_automotive_system_message()
+    assert "Accord" in context and "Civic" in other_context
+
+
+def test_repeat_lookups_hit_the_cache():
+    hits = asm.prompt_cache_stats["hits"]
+    first = asm.get_system_prompt_parts(CAR)
+    assert asm.get_system_prompt_parts(dict(CAR)) is first
+    assert asm.prompt_cache_stats["hits"] == hits + 1
+
+
+def test_changed_car_data_gets_a_fresh_prompt():
+    asm.get_system_prompt_parts(CAR)
+    _, context = asm.get_system_prompt_parts({**CAR, "mpg": 35})
+
+    assert "35 MPG" in context
+
+
+def test_invalidate_drops_every_version_of_a_car():
+    asm.get_system_prompt_parts(CAR)
+    asm.get_system_prompt_parts({**CAR, "mpg": 35})
+    asm.get_system_prompt_parts({**CAR, "id": 2})
+
+    asm.invalidate_system_prompt(1)
+    assert [key[0] for key in asm._prompt_cache] == [2]
+
+
+def test_full_cache_evicts_least_recently_used(monkeypatch):
+    monkeypatch.setattr(asm, "MAX_CACHED_PROMPTS", 2)
+    evictions = asm.prompt_cache_stats["evictions"]
+    asm.get_system_prompt_parts({**CAR, "id": 1})
+    asm.get_system_prompt_parts({**CAR, "id": 2})
+    asm.get_system_prompt_parts({**CAR, "id": 1})
+    asm.get_system_prompt_parts({**CAR, "id": 3})
+
+    assert [key[0] for key in asm._prompt_cache] == [1, 3]
+    assert asm.prompt_cache_stats["evictions"] == evictions + 1
+
+
+def test_car_data_without_an_id_is_not_cached():
+    uncached = asm.prompt_cache_stats["uncached"]
+    _, context = asm.get_system_prompt_parts({"year": 2020, "manufacturer": "Ford", "model": "F-150"})
+
+    assert "F-150" in context
+    assert not asm._prompt_cache
+    assert asm.prompt_cache_stats["uncached"] == uncached + 1
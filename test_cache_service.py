@@ -0,0 +1,302 @@
+# test_cache_service.py
+"""Unit tests for CacheService expiry, snapshots and ShardedCacheService."""
+
+import asyncio
+import heapq
+import inspect
+import os
+import threading
+import time
+
+import pytest
+
+from app.cache_service import (
+    CacheService,
+    ShardedCacheService,
+    HEAP_COMPACT_MIN,
+    create_cache,
+    read_snapshot,
+    write_snapshot,
+)
+
+
+def make_cache(**kwargs):
+    return CacheService(start_cleanup=False, **kwargs)
+
+
+def test_expire_batch_removes_due_items_only():
+    cache = make_cache()
+    cache.set("old", 1, ttl=-1)
+    cache.set("new", 2, ttl=60)
+
+    assert cache._run_cleanup_pass() == 1
+    assert cache.get("new") == 2
+    assert "old" not in cache.cache
+    assert cache.get_stats()["expirations"] == 1
+
+
+def test_expire_batch_skips_stale_heap_entries():
+    cache = make_cache()
+    cache.set("k", 1, ttl=-1)
+    cache.set("k", 2, ttl=60)  # overwrite: the first heap entry is now stale
+
+    cache._run_cleanup_pass()
+    assert cache.get("k") == 2
+
+
+def test_cleanup_pass_works_in_batches():
+    cache = make_cache(cleanup_batch_size=10)
+    for i in range(35):
+        cache.set(f"k{i}", i, ttl=-1)
+
+    assert cache._expire_batch(time.time(), 10) == 10
+    assert cache._run_cleanup_pass() == 25
+    assert not cache.cache
+
+
+def test_overwrites_do_not_grow_heap_without_bound():
+    cache = make_cache()
+    for i in range(10000):
+        cache.set(f"hot{i % 5}", i, ttl=60)
+    # set() never rebuilds the heap inline; the cleanup pass does
+    assert len(cache._expiry_heap) == 10000
+
+    cache._run_cleanup_pass()
+    assert len(cache._expiry_heap) == 5
+    assert cache.get_stats()["heap_compactions"] == 1
+    assert cache.get("hot4") == 9999
+
+
+def test_evictions_and_deletes_leave_heap_bounded():
+    cache = make_cache(max_entries=10)
+    for i in range(5000):
+        cache.set(f"k{i}", i, ttl=60)
+        if i % 3 == 0:
+            cache.delete(f"k{i}")
+    cache._run_cleanup_pass()
+
+    assert len(cache._expiry_heap) <= max(2 * len(cache.cache), HEAP_COMPACT_MIN)
+    # Every live key still expires through the rebuilt heap
+    assert {key for _, key in cache._expiry_heap} >= set(cache.cache)
+
+
+def test_sets_during_compaction_keep_their_heap_entries(monkeypatch):
+    cache = make_cache(cleanup_batch_size=16)
+    for i in range(1000):
+        cache.set(f"hot{i % 5}", i, ttl=60)
+    heapify = heapq.heapify
+
+    def set_while_heapifying(heap):
+        # The heapify runs without the lock, so writers can get in
+        cache.set("late", 1, ttl=-1)
+        heapify(heap)
+
+    monkeypatch.setattr(heapq, "heapify", set_while_heapifying)
+    assert cache._compact_expiry_heap()
+    monkeypatch.undo()
+
+    assert len(cache._expiry_heap) == 6
+    assert cache._run_cleanup_pass() == 1
+    assert "late" not in cache.cache
+
+
+def test_snapshot_items_walks_the_heap_in_chunks():
+    cache = make_cache(cleanup_batch_size=7)
+    for i in range(50):
+        cache.set(f"k{i}", i, ttl=60)
+        cache.set(f"k{i}", i, ttl=60)  # stale duplicates are skipped
+    cache.set("gone", 0, ttl=-1)
+
+    items = cache.snapshot_items()
+    assert sorted(key for key, _, _ in items) == sorted(f"k{i}" for i in range(50))
+
+
+def test_lru_eviction_keeps_recently_read_items():
+    cache = make_cache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get_stats()["evictions"] == 1
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / "cache.snap")
+    cache = make_cache()
+    cache.set("car:1", {"id": 1, "model": "Accord"}, ttl=60)
+    cache.set("gone", "x", ttl=-1)
+    assert cache.save_snapshot(path) == 1
+
+    restored = make_cache()
+    assert restored.load_snapshot(path) == 1
+    assert restored.get("car:1") == {"id": 1, "model": "Accord"}
+    assert restored.get("gone") is None
+
+
+def test_concurrent_snapshot_writers_never_install_a_corrupt_file(tmp_path):
+    path = str(tmp_path / "cache.snap")
+    errors = []
+
+    def write(worker):
+        try:
+            write_snapshot(path, [(f"w{worker}:k{i}", time.time() + 60, "x" * 500) for i in range(200)])
+        except Exception as e:  # noqa: BLE001
+            errors.append(e)
+
+    writers = [threading.Thread(target=write, args=(w,)) for w in range(8)]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+
+    assert errors == []
+    keys = [key for key, _, _ in read_snapshot(path)]
+    assert len(keys) == 200 and len({key.split(":")[0] for key in keys}) == 1
+    assert os.listdir(tmp_path) == ["cache.snap"]
+
+
+def test_sharded_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / "sharded.snap")
+    cache = ShardedCacheService(num_shards=4)
+    for i in range(20):
+        cache.set(f"k{i}", i, ttl=60)
+    assert cache.save_snapshot(path) == 20
+
+    restored = ShardedCacheService(num_shards=4, snapshot_path=path)
+    assert [restored.get(f"k{i}") for i in range(20)] == list(range(20))
+    assert restored.get_stats()["entries"] == 20
+
+
+def test_memoize_key_is_the_same_for_every_call_form():
+    cache = make_cache()
+
+    @cache.memoize("cars")
+    def get_cars(limit=20, offset=0, manufacturer=None):
+        return []
+
+    key = get_cars.cache_key(20, 0, None)
+    assert get_cars.cache_key() == key
+    assert get_cars.cache_key(20) == key
+    assert get_cars.cache_key(limit=20) == key
+    assert get_cars.cache_key(offset=0, limit=20, manufacturer=None) == key
+    assert get_cars.cache_key(manufacturer="Honda") != key
+
+
+def test_memoize_key_matches_signature_binding():
+    cache = make_cache()
+
+    def search(query, limit=10, *, exact=False, tags=None):
+        return None
+
+    signature = inspect.signature(search)
+
+    def bound_values(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        return tuple(bound.arguments.values())
+
+    memoized = cache.memoize("search")(search)
+    reference = cache.memoize("search", key=bound_values)(search)
+    calls = [(("mpg",), {}), (("mpg", 5), {}), (("mpg",), {"exact": True}),
+             ((), {"query": "mpg", "tags": ["a"]}), (("mpg",), {"limit": 3, "tags": {"b": 1}})]
+    for args, kwargs in calls:
+        assert memoized.cache_key(*args, **kwargs) == reference.cache_key(*args, **kwargs)
+
+
+@pytest.mark.parametrize("args, kwargs", [((), {}), ((1, 2, 3), {}), ((1,), {"car_id": 1}), ((1,), {"bogus": 2})])
+def test_memoize_bad_calls_raise_type_error(args, kwargs):
+    cache = make_cache()
+
+    @cache.memoize("car")
+    def get_car(car_id, fresh=False):
+        return {"id": car_id}
+
+    with pytest.raises(TypeError):
+        get_car(*args, **kwargs)
+
+
+def test_memoize_var_args_fall_back_to_binding():
+    cache = make_cache()
+
+    @cache.memoize("many")
+    def many(*ids, **filters):
+        return list(ids)
+
+    assert many.cache_key(1, 2, make="Honda") == many.cache_key(1, 2, make="Honda")
+    assert many.cache_key(1, 2) != many.cache_key(2, 1)
+
+
+def test_memoize_caches_results_but_not_none():
+    cache = make_cache()
+    calls = []
+
+    @cache.memoize("car", ttl=60)
+    def get_car(car_id):
+        calls.append(car_id)
+        return {"id": car_id} if car_id > 0 else None
+
+    assert get_car(1) == {"id": 1}
+    assert get_car(car_id=1) == {"id": 1}
+    assert get_car(0) is None
+    assert get_car(0) is None
+    assert calls == [1, 0, 0]
+
+    get_car.invalidate(1)
+    get_car(1)
+    assert calls == [1, 0, 0, 1]
+
+
+def test_memoize_acall_is_single_flight():
+    cache = make_cache()
+    calls = []
+
+    @cache.memoize("car")
+    def get_car(car_id):
+        calls.append(car_id)
+        time.sleep(0.05)
+        return {"id": car_id}
+
+    async def main():
+        return await asyncio.gather(*(get_car.acall(7) for _ in range(5)))
+
+    assert asyncio.run(main()) == [{"id": 7}] * 5
+    assert calls == [7]
+
+
+def test_sharding_is_opt_in():
+    assert type(create_cache()) is CacheService
+    sharded = create_cache(num_shards=4)
+    assert isinstance(sharded, ShardedCacheService) and len(sharded.shards) == 4
+
+
+def test_mutating_a_memoized_result_does_not_change_the_cache():
+    cache = make_cache()
+
+    @cache.memoize("cars")
+    def get_cars():
+        return [{"id": 1, "model": "Accord", "features": ["CarPlay"]}]
+
+    cars = get_cars()
+    cars[0]["analysis"] = {"sentiment": "positive"}
+    cars[0]["features"].append("Sunroof")
+    cars.append({"id": 2})
+
+    assert get_cars() == [{"id": 1, "model": "Accord", "features": ["CarPlay"]}]
+
+
+def test_mutating_an_acall_result_does_not_change_the_cache():
+    cache = make_cache()
+
+    @cache.memoize("car")
+    def get_car(car_id):
+        return {"id": car_id, "year": 2021}
+
+    async def main():
+        first = await get_car.acall(1)
+        first["year"] = 1999
+        return await get_car.acall(1)
+
+    assert asyncio.run(main()) == {"id": 1, "year": 2021}
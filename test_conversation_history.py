@@ -0,0 +1,50 @@
+# test_conversation_history.py
+"""Unit tests for the bounded per-user conversation store."""
+
+from app.conversation_history import ConversationHistory
+
+
+def test_history_keeps_the_last_20_exchanges():
+    store = ConversationHistory()
+    for i in range(25):
+        store.add_exchange("u1", f"q{i}", f"a{i}")
+
+    history = store.get_history("u1")
+    assert len(history) == 20 and history[0]["user"] == "q5"
+    assert [e["user"] for e in store.get_history("u1", limit=2)] == ["q23", "q24"]
+
+
+def test_llm_context_is_only_reused_for_the_same_car_and_reply():
+    store = ConversationHistory()
+    store.set_llm_context("u1", 1, [1, 2, 3], "last reply")
+
+    assert store.get_llm_context("u1", 1, "last reply") == [1, 2, 3]
+    assert store.get_llm_context("u1", 2, "last reply") is None
+    assert "u1" not in store.llm_contexts
+
+
+def test_oversized_contexts_are_not_kept():
+    store = ConversationHistory(max_context_tokens=3)
+    store.set_llm_context("u1", 1, [1, 2, 3, 4], "reply")
+    assert store.get_llm_context("u1", 1, "reply") is None
+
+
+def test_llm_contexts_are_capped_least_recently_used_first():
+    store = ConversationHistory(max_llm_contexts=2)
+    store.set_llm_context("u1", 1, [1], "r1")
+    store.set_llm_context("u2", 1, [2], "r2")
+    store.get_llm_context("u1", 1, "r1")
+    store.set_llm_context("u3", 1, [3], "r3")
+
+    assert list(store.llm_contexts) == ["u1", "u3"]
+
+
+def test_evicted_users_lose_their_context_too():
+    store = ConversationHistory(max_users=2)
+    store.add_exchange("u1", "q", "a")
+    store.set_llm_context("u1", 1, [1], "a")
+    store.add_exchange("u2", "q", "a")
+    store.add_exchange("u3", "q", "a")
+
+    assert list(store.history) == ["u2", "u3"]
+    assert "u1" not in store.llm_contexts
@@ -0,0 +1,113 @@
+# test_llm_pool.py
+"""Unit tests for LocalLLMPool endpoint accounting, using fake Ollama clients."""
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("requests")
+
+from app import llm_pool
+from app.admission import LocalLLMOverloaded
+from app.llm_pool import LocalLLMPool
+
+
+class FakeClient:
+    """LocalLLMClient double for one endpoint."""
+
+    def __init__(self, url, result=None, error=None, delay=0.0):
+        self.base_url = url
+        self.result = result or {"text": "ok", "error": False}
+        self.error = error
+        self.delay = delay
+
+    def is_saturated(self):
+        return False
+
+    def generate_response(self, *args, **kwargs):
+        if self.error:
+            raise self.error
+        return self.result
+
+    async def agenerate_response(self, *args, **kwargs):
+        await asyncio.sleep(self.delay)
+        return self.generate_response()
+
+    def generate_stream(self, *args, **kwargs):
+        yield "one"
+        if self.error:
+            raise self.error
+        yield "two"
+
+    def get_metrics(self):
+        return {}
+
+
+@pytest.fixture
+def make_pool(monkeypatch):
+    def make(*clients, failure_threshold=2):
+        by_url = {client.base_url: client for client in clients}
+        monkeypatch.setattr(llm_pool, "LocalLLMClient", lambda base_url, **kwargs: by_url[base_url])
+        return LocalLLMPool(list(by_url), start_health_checks=False, failure_threshold=failure_threshold)
+    return make
+
+
+def endpoint_state(pool):
+    return pool.get_metrics()["endpoints"]["http://a"]
+
+
+def test_errors_count_as_failures_and_take_the_endpoint_out(make_pool):
+    pool = make_pool(FakeClient("http://a", error=ConnectionError("refused")))
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            pool.generate_response("hi")
+
+    state = endpoint_state(pool)
+    assert state["failures"] == 2 and not state["healthy"] and state["outstanding"] == 0
+
+
+def test_error_results_count_but_shedding_does_not(make_pool):
+    pool = make_pool(FakeClient("http://a", result={"text": "", "error": True}))
+    pool.generate_response("hi")
+    assert endpoint_state(pool)["failures"] == 1
+
+    shed = make_pool(FakeClient("http://a", result={"text": "", "error": True, "overloaded": True}))
+    assert shed.generate_response("hi")["overloaded"]
+    assert endpoint_state(shed)["failures"] == 0
+
+
+def test_cancelled_request_releases_the_endpoint_without_a_failure(make_pool):
+    pool = make_pool(FakeClient("http://a", delay=1.0), failure_threshold=1)
+
+    async def main():
+        task = asyncio.ensure_future(pool.agenerate_response("hi"))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    state = endpoint_state(pool)
+    assert state == {**state, "outstanding": 0, "failures": 0, "cancelled": 1, "healthy": True}
+
+
+def test_abandoned_stream_releases_the_endpoint_without_a_failure(make_pool):
+    pool = make_pool(FakeClient("http://a"), failure_threshold=1)
+    stream = pool.generate_stream("hi")
+    assert next(stream) == "one"
+    stream.close()  # client disconnected
+
+    state = endpoint_state(pool)
+    assert state == {**state, "outstanding": 0, "failures": 0, "cancelled": 1, "healthy": True}
+
+
+def test_stream_errors_count_but_shedding_does_not(make_pool):
+    pool = make_pool(FakeClient("http://a", error=ConnectionError("reset")))
+    with pytest.raises(ConnectionError):
+        list(pool.generate_stream("hi"))
+    assert endpoint_state(pool)["failures"] == 1
+
+    shed = make_pool(FakeClient("http://a", error=LocalLLMOverloaded("busy")))
+    with pytest.raises(LocalLLMOverloaded):
+        list(shed.generate_stream("hi"))
+    assert endpoint_state(shed)["failures"] == 0
@@ -0,0 +1,97 @@
+# test_local_llm_client.py
+"""Unit tests for LocalLLMClient warmup and the keep-alive thread, with a fake HTTP session."""
+
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("requests")
+
+from app.local_llm_client import LocalLLMClient
+
+
+class FakeSession:
+    """Records POSTs to Ollama and answers like a loaded model."""
+
+    def __init__(self, load_duration=0.0, status_code=200):
+        self.posts = []
+        self.load_duration = load_duration
+        self.status_code = status_code
+
+    def post(self, url, json=None, timeout=None):
+        self.posts.append(json)
+        return SimpleNamespace(status_code=self.status_code, json=lambda: {"load_duration": self.load_duration * 1e9})
+
+
+@pytest.fixture
+def make_client(monkeypatch):
+    monkeypatch.setattr(LocalLLMClient, "_validate_model", lambda self: True)
+    clients = []
+
+    def make(session=None, **kwargs):
+        client = LocalLLMClient(**kwargs)
+        client.session = session or FakeSession()
+        clients.append(client)
+        return client
+
+    yield make
+    for client in clients:
+        client.stop_keepalive()
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_warmup_loads_the_model_without_generating(make_client):
+    client = make_client(FakeSession(load_duration=3.0), keep_alive="-1")
+
+    assert client.warmup()
+    assert client.session.posts == [{"model": client.model_name, "prompt": "", "stream": False, "keep_alive": "-1"}]
+    assert client.metrics["warmups"] == 1
+    assert client.metrics["cold_loads"] == 1 and client.metrics["last_cold_load_duration"] == 3.0
+
+
+def test_failed_warmup_is_counted(make_client):
+    client = make_client(FakeSession(status_code=500))
+
+    assert not client.warmup()
+    assert client.metrics["warmup_errors"] == 1
+
+
+def test_keepalive_warms_at_start_and_pings_when_idle(make_client):
+    client = make_client(keepalive_interval=0.1)
+    client.start_keepalive()
+    thread = client._keepalive_thread
+
+    assert wait_until(lambda: client.metrics["warmups"] >= 1)
+    client.start_keepalive()
+    assert client._keepalive_thread is thread  # one thread per client
+    # Nothing else reaches Ollama, so the idle model is pinged again
+    assert wait_until(lambda: client.metrics["warmups"] >= 2)
+
+
+def test_recent_traffic_suppresses_pings(make_client):
+    client = make_client(keepalive_interval=0.2)
+    client.start_keepalive()
+    assert wait_until(lambda: client.metrics["warmups"] == 1)
+
+    for _ in range(10):
+        client._last_used = time.monotonic()
+        time.sleep(0.03)
+    assert client.metrics["warmups"] == 1
+
+
+def test_stop_keepalive_ends_the_thread(make_client):
+    client = make_client(keepalive_interval=0.1)
+    client.start_keepalive()
+    client.stop_keepalive()
+
+    client._keepalive_thread.join(1.0)
+    assert not client._keepalive_thread.is_alive()
+    client.start_keepalive()  # and it can be started again
+    assert client._keepalive_thread.is_alive()
@@ -0,0 +1,405 @@
+# test_model_router.py
+"""Unit tests for ModelRouter routing, caching and fallbacks, using in-memory model doubles."""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.admission import LocalLLMOverloaded
+from app.model_router import ModelRouter
+from app.rate_limiter import OpenAIRateLimiter
+from app.telemetry import registry
+
+CAR = {"id": 1, "year": 2021, "manufacturer": "Honda", "model": "Accord"}
+
+
+class FakeOpenAI:
+    """Just enough of openai.OpenAI for ModelRouter: chat.completions.create."""
+
+    def __init__(self, text="The Accord makes 192 hp.", fail=None, stream_fail_after=None, delay=0.0):
+        self.text = text
+        self.fail = fail
+        self.stream_fail_after = stream_fail_after
+        self.delay = delay
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, stream=False, stream_options=None, **request):
+        self.calls.append(request)
+        time.sleep(self.delay)
+        if self.fail is not None:
+            raise self.fail
+        if stream:
+            return self._stream((stream_options or {}).get("include_usage"))
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=self.text))],
+            usage=SimpleNamespace(total_tokens=42),
+        )
+
+    def _stream(self, include_usage):
+        for i, word in enumerate(self.text.split(" ")):
+            if self.stream_fail_after is not None and i >= self.stream_fail_after:
+                raise ConnectionError("stream dropped")
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word + " "))], usage=None)
+        if include_usage:
+            yield SimpleNamespace(choices=[], usage=SimpleNamespace(total_tokens=42))
+
+
+class FakeLocal:
+    """LocalLLMClient double: generate_response / agenerate_response / generate_stream."""
+
+    def __init__(self, text="Local answer.", delay=0.0, error=False, overloaded=False):
+        self.text = text
+        self.delay = delay
+        self.error = error
+        self.overloaded = overloaded
+        self.calls = 0
+
+    def generate_response(self, prompt, **kwargs):
+        self.calls += 1
+        return {"text": self.text, "model": "tinyllama", "error": self.error, "latency": self.delay}
+
+    async def agenerate_response(self, prompt, **kwargs):
+        await asyncio.sleep(self.delay)
+        return self.generate_response(prompt, **kwargs)
+
+    def generate_stream(self, prompt, **kwargs):
+        self.calls += 1
+        if self.overloaded:
+            raise LocalLLMOverloaded("Local LLM overloaded")
+        if self.error:
+            raise RuntimeError("local model down")
+        yield self.text
+
+
+class FakeAsyncOpenAI:
+    """openai.AsyncOpenAI double that wraps a FakeOpenAI."""
+
+    def __init__(self, sync=None):
+        self.sync = sync or FakeOpenAI()
+        self.calls = self.sync.calls
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **request):
+        result = self.sync.create(**request)
+        if not request.get("stream"):
+            return result
+
+        async def chunks():
+            for chunk in result:
+                yield chunk
+
+        return chunks()
+
+
+def make_router(openai=None, local=None):
+    router = ModelRouter(openai_client=openai or FakeOpenAI(), local_llm_client=local)
+    router.config["adaptive_routing"] = False
+    return router
+
+
+def test_standalone_answers_are_shared():
+    openai = FakeOpenAI()
+    router = make_router(openai)
+
+    first = router.route_query("How much horsepower does it have?", CAR)
+    second = router.route_query("How much horsepower does it have?", CAR)
+
+    assert first["cache_hit"] is False
+    assert second["cache_hit"] is True
+    assert len(openai.calls) == 1
+
+
+def test_answers_with_history_are_not_shared():
+    openai = FakeOpenAI()
+    router = make_router(openai)
+    history = ["Tell me about the Civic Type R", "It's a hot hatch with 315 hp."]
+
+    with_history = router.route_query("How much horsepower does it have?", CAR, history)
+    standalone = router.route_query("How much horsepower does it have?", CAR)
+    again_with_history = router.route_query("How much horsepower does it have?", CAR, history)
+
+    assert with_history["cache_hit"] is False
+    assert standalone["cache_hit"] is False
+    assert again_with_history["cache_hit"] is False
+    assert len(openai.calls) == 3
+
+
+def test_interrupted_stream_is_not_cached():
+    openai = FakeOpenAI(text="The engine is a 1.5L turbo four making 192 hp.", stream_fail_after=3)
+    router = make_router(openai)
+
+    events = list(router.stream_query("How much horsepower does it have?", CAR))
+    done = events[-1]
+    assert done["type"] == "done"
+    assert done["partial"] is True
+    assert done["response"] == "The engine is"
+
+    openai.stream_fail_after = None
+    result = router.route_query("How much horsepower does it have?", CAR)
+    assert result["cache_hit"] is False
+    assert result["response"] == openai.text
+
+
+def test_complete_stream_is_cached():
+    openai = FakeOpenAI()
+    router = make_router(openai)
+
+    events = list(router.stream_query("How much horsepower does it have?", CAR))
+    assert events[-1]["partial"] is False
+    assert "".join(e["text"] for e in events if e["type"] == "token").strip() == openai.text
+
+    assert router.route_query("How much horsepower does it have?", CAR)["cache_hit"] is True
+
+
+def test_force_model_applies_to_one_request_only():
+    local = FakeLocal(delay=0.05)
+    router = make_router(FakeOpenAI(), local)
+
+    async def main():
+        forced = asyncio.ensure_future(
+            router.aroute_query("How much horsepower does it have?", CAR, force_model="local")
+        )
+        await asyncio.sleep(0.01)
+        # Another user's request while the forced one is still in flight
+        other = await router.aroute_query("Is it fast on the highway?", CAR)
+        return await forced, other
+
+    forced, other = asyncio.run(main())
+    assert forced["model_used"] == "local"
+    assert other["model_used"] == "openai"
+    assert router.force_model is None
+    assert router.route_query("What safety features does it have?", CAR)["model_used"] == "openai"
+
+
+def test_admin_force_model_still_applies_to_everyone():
+    router = make_router(FakeOpenAI(), FakeLocal())
+    router.set_force_model("local")
+    assert router.route_query("How much horsepower does it have?", CAR)["model_used"] == "local"
+
+    router.set_force_model(None)
+    assert router.route_query("How much horsepower does it have?", CAR)["model_used"] == "openai"
+
+
+def test_unknown_force_model_is_rejected():
+    router = make_router()
+    with pytest.raises(ValueError):
+        router.route_query("How much horsepower does it have?", CAR, force_model="gpt-9")
+    with pytest.raises(ValueError):
+        router.set_force_model("gpt-9")
+
+
+def test_always_failing_model_is_not_explored_forever():
+    router = make_router(FakeOpenAI(), FakeLocal())
+    router.config["min_samples"] = 10
+    for _ in range(10):
+        router.model_stats.record_error("local")
+    router.model_stats.record_success("openai", 20.0)  # slow, but it answers
+
+    assert router._pick_by_slo(["local", "openai"]) == "openai"
+
+
+def test_failing_model_is_skipped_before_min_samples():
+    router = make_router(FakeOpenAI(), FakeLocal())
+    for _ in range(3):
+        router.model_stats.record_error("local")
+
+    assert router._pick_by_slo(["local", "openai"]) == "openai"
+
+
+def test_slo_pick_prefers_the_first_model_meeting_the_slo():
+    router = make_router(FakeOpenAI(), FakeLocal())
+    router.config["min_samples"] = 5
+    for _ in range(5):
+        router.model_stats.record_success("openai", 12.0)
+        router.model_stats.record_success("local", 2.0)
+
+    assert router._pick_by_slo(["openai", "local"]) == "local"
+    assert router._pick_by_slo(["local", "openai"]) == "local"
+
+
+def test_failing_primary_is_hedged_immediately():
+    router = make_router(FakeOpenAI(), FakeLocal())
+    router.config["hedge_min_samples"] = 5
+    assert router._hedge_delay("local") == router.config["hedge_default_delay"]
+
+    for _ in range(5):
+        router.model_stats.record_error("local")
+    assert router._hedge_delay("local") == 0.0
+
+
+def test_small_talk_is_not_sent_to_the_low_confidence_model():
+    router = make_router(FakeOpenAI(), FakeLocal())
+    classification = router.query_classifier.classify("ok cool", CAR)
+    assert classification["confidence"] < 0.5
+
+    assert router._choose_model(classification) == "local"
+    assert router.metrics["low_confidence_routes"] == 0
+
+
+def test_single_match_automotive_query_uses_its_routing_entry():
+    router = make_router(FakeOpenAI(), FakeLocal())
+    classification = router.query_classifier.classify("How much horsepower does it have?", CAR)
+
+    assert router._choose_model(classification) == router._allowed_models(classification)[0]
+    assert router.metrics["low_confidence_routes"] == 0
+
+
+def test_vague_query_still_goes_to_the_low_confidence_model():
+    router = make_router(FakeOpenAI(), FakeLocal())
+    classification = router.query_classifier.classify("what else?", CAR)
+    assert "general" in classification["query_types"]
+
+    assert router._choose_model(classification) == "openai"
+    assert router.metrics["low_confidence_routes"] == 1
+
+
+@pytest.mark.parametrize("query", [
+    "Should I buy this or wait for next year?",
+    "Explain how the hybrid system works in detail please",
+    "What are the trims?",
+])
+def test_unmatched_questions_are_not_sent_to_the_local_model_first(query):
+    router = make_router(FakeOpenAI(), FakeLocal())
+    classification = router.query_classifier.classify(query, CAR)
+    assert classification["query_types"] == ["general"]
+
+    assert router._choose_model(classification) == "openai"
+
+
+def test_hedging_stays_within_the_routing_entry():
+    openai = FakeOpenAI(delay=0.1)
+    local = FakeLocal()
+    router = make_router(openai, local)
+    router.config["hedge_default_delay"] = 0.01
+    classification = router.query_classifier.classify("How much does it cost?", CAR)
+    assert router._routing_entry(classification)["models"] == ["openai"]
+
+    result = asyncio.run(router.aroute_query("How much does it cost?", CAR))
+    assert result["model_used"] == "openai"
+    assert local.calls == 0
+    assert router._hedge_secondary("openai", classification) is None
+
+
+def record_usage_calls(router):
+    calls = []
+    router.rate_limiter.record_usage = lambda estimated, actual: calls.append((estimated, actual))
+    return calls
+
+
+def test_stream_charges_actual_usage():
+    router = make_router(FakeOpenAI())
+    usage = record_usage_calls(router)
+
+    list(router.stream_query("How much horsepower does it have?", CAR))
+    assert len(usage) == 1 and usage[0][1] == 42
+
+
+def test_stream_budget_rejection_is_not_a_model_error():
+    router = make_router(FakeOpenAI())
+    router.rate_limiter.pause(60)
+
+    events = list(router.stream_query("How much horsepower does it have?", CAR))
+    assert events[-1]["model_used"] == "error"
+    assert router.metrics["budget_rejections"] == 1
+    assert router.model_stats.sample_count("openai") == 0
+
+
+def test_every_retry_takes_budget():
+    openai = FakeOpenAI(fail=ConnectionError("connection reset"))
+    router = make_router(openai, FakeLocal())
+    router.rate_limiter = OpenAIRateLimiter(rpm=2, tpm=100000)
+    router.config.update(max_retries=3, retry_base_delay=0.001, retry_max_delay=0.001)
+
+    with pytest.raises(ConnectionError):
+        router._try_openai_model("How much horsepower does it have?", CAR, None)
+    assert len(openai.calls) == 2
+    assert router.metrics["budget_rejections"] == 1
+
+
+def test_slow_primary_is_hedged_and_the_loser_is_cancelled():
+    local = FakeLocal(delay=0.5)
+    router = make_router(FakeOpenAI(), local)
+    router.config["hedge_default_delay"] = 0.02
+
+    result = asyncio.run(router._ahedged_call("local", "openai", "How much horsepower does it have?", CAR, None))
+    assert result["model"] == "openai"
+    assert router.metrics["hedged_requests"] == 1
+    assert router.metrics["hedge_wins_openai"] == 1
+    assert local.calls == 0  # cancelled before it answered
+    # The loser's elapsed time is kept as a lower bound on its latency
+    assert 0.02 <= router.model_stats.percentile("local", 95) < 0.5
+    assert router.model_stats.sample_count("local") == 0
+
+
+def test_fast_primary_is_not_hedged():
+    openai = FakeOpenAI()
+    router = make_router(openai, FakeLocal())
+    router.config["hedge_default_delay"] = 0.5
+
+    result = asyncio.run(router._ahedged_call("local", "openai", "How much horsepower does it have?", CAR, None))
+    assert result["model"] == "local"
+    assert router.metrics["hedged_requests"] == 0
+    assert openai.calls == []
+
+
+def test_async_only_openai_is_used_for_async_fallback():
+    openai = FakeAsyncOpenAI()
+    router = ModelRouter(None, FakeLocal(error=True), async_openai_client=openai)
+    router.config["adaptive_routing"] = False
+
+    result = asyncio.run(router.aroute_query("How much horsepower does it have?", CAR, force_model="local"))
+    assert result["model_used"] == "openai"
+    assert len(openai.calls) == 1
+
+
+def test_async_only_openai_is_used_for_stream_fallback():
+    openai = FakeAsyncOpenAI()
+    router = ModelRouter(None, FakeLocal(error=True), async_openai_client=openai)
+    router.config["adaptive_routing"] = False
+    usage = record_usage_calls(router)
+
+    events = list(router.stream_query("How much horsepower does it have?", CAR, force_model="local"))
+    assert events[-1]["model_used"] == "openai"
+    assert "".join(e["text"] for e in events if e["type"] == "token").strip() == openai.sync.text
+    assert usage[0][1] == 42
+
+
+def test_stream_shed_by_local_with_no_openai_gets_the_shed_reply():
+    registry.reset()
+    router = ModelRouter(None, FakeLocal(overloaded=True))
+    router.config["adaptive_routing"] = False
+
+    events = list(router.stream_query("How much horsepower does it have?", CAR))
+    done = events[-1]
+    assert done["model_used"] == "shed"
+    assert done["response"] == events[0]["text"]
+    assert router.metrics["shed_responses"] == 1
+    assert router.model_stats.sample_count("local") == 0
+    assert 'chat_fallbacks_total{model="local",reason="LocalLLMOverloaded"} 1' in registry.render()
+
+
+def test_stream_fallback_is_counted_with_its_reason():
+    registry.reset()
+    router = make_router(FakeOpenAI(), FakeLocal())
+    router.rate_limiter.pause(60)
+
+    events = list(router.stream_query("How much horsepower does it have?", CAR, force_model="openai"))
+    assert events[-1]["model_used"] == "local"
+    assert router.metrics["fallbacks"] == 1
+    assert 'chat_fallbacks_total{model="openai",reason="rate_limited"} 1' in registry.render()
+
+
+def test_saturated_local_model_is_routed_around():
+    local = FakeLocal()
+    local.is_saturated = lambda: True
+    router = make_router(FakeOpenAI(), local)
+    classification = router.query_classifier.classify("ok cool", CAR)
+
+    assert router._choose_model(classification) == "openai"
+    assert router.metrics["local_saturated_reroutes"] == 1
+
+    local.is_saturated = lambda: False
+    assert router._choose_model(classification) == "local"
@@ -0,0 +1,68 @@
+# test_model_stats.py
+"""Unit tests for ModelStats latency and error tracking."""
+
+from app.model_stats import ModelStats
+
+
+def test_failures_count_as_samples():
+    stats = ModelStats()
+    for _ in range(5):
+        stats.record_error("local")
+
+    assert stats.sample_count("local") == 5
+    assert stats.latency_sample_count("local") == 0
+    assert stats.error_rate("local") == 1.0
+    assert stats.expected_latency("local") is None
+
+
+def test_percentiles_over_the_window():
+    stats = ModelStats(window=10)
+    for latency in range(1, 21):
+        stats.record_success("openai", float(latency))
+
+    # Only the last 10 (11..20) are kept
+    assert stats.latency_sample_count("openai") == 10
+    assert stats.percentile("openai", 50) in (15.0, 16.0)
+    assert stats.percentile("openai", 95) == 20.0
+    assert stats.percentile("unknown", 95) == 0.0
+
+
+def test_error_rate_uses_the_outcome_window():
+    stats = ModelStats(window=4)
+    stats.record_error("openai")
+    for _ in range(4):
+        stats.record_success("openai", 1.0)
+
+    assert stats.error_rate("openai") == 0.0
+    stats.record_error("openai")
+    assert stats.error_rate("openai") == 0.25
+
+
+def test_expected_latency_is_inflated_by_errors():
+    stats = ModelStats(alpha=1.0)
+    stats.record_success("local", 2.0)
+    assert stats.expected_latency("local") == 2.0
+
+    stats.record_error("local")
+    assert stats.expected_latency("local") == 4.0
+
+
+def test_snapshot_reports_both_counts():
+    stats = ModelStats()
+    stats.record_success("openai", 1.0)
+    stats.record_error("openai")
+
+    snapshot = stats.snapshot()["openai"]
+    assert snapshot["samples"] == 2
+    assert snapshot["latency_samples"] == 1
+    assert snapshot["error_rate"] == 0.5
+
+
+def test_censored_samples_count_as_latency_but_not_outcomes():
+    stats = ModelStats()
+    stats.record_success("local", 1.0)
+    stats.record_censored("local", 9.0)
+
+    assert stats.percentile("local", 95) == 9.0
+    assert stats.sample_count("local") == 1
+    assert stats.error_rate("local") == 0.0
@@ -0,0 +1,53 @@
+# test_prompt_builder.py
+"""Unit tests for token-budgeted prompt assembly."""
+
+from app.prompt_builder import MESSAGE_OVERHEAD, build_prompt, count_tokens, truncate_tokens
+
+
+def history_of(turns):
+    return [f"{'question' if i % 2 == 0 else 'answer'} {i} " + "word " * 20 for i in range(turns)]
+
+
+def test_small_prompt_is_kept_whole():
+    history = history_of(4)
+    prompt = build_prompt("What's the MPG?", "Be helpful.", " Car: Accord.", history, budget=1000)
+
+    assert prompt["query"] == "What's the MPG?"
+    assert prompt["system"] == "Be helpful. Car: Accord."
+    assert [m["content"] for m in prompt["history"]] == history
+    assert prompt["dropped_history"] == 0
+
+
+def test_prompt_never_exceeds_the_budget():
+    for budget in (40, 120, 300):
+        prompt = build_prompt("How fast is it? " * 10, "Be helpful. " * 30, " Car data. " * 30, history_of(10), budget)
+        assert prompt["tokens"] <= budget
+
+
+def test_oldest_history_is_dropped_first_and_starts_with_a_user_turn():
+    history = history_of(10)
+    prompt = build_prompt("What's the MPG?", "", "", history, budget=120)
+
+    kept = prompt["history"]
+    assert 0 < len(kept) < len(history)
+    assert kept[0]["role"] == "user"
+    assert [m["content"] for m in kept] == history[len(history) - len(kept):]
+    assert prompt["dropped_history"] == len(history) - len(kept)
+
+
+def test_query_is_kept_before_anything_else():
+    query = "Tell me everything about it " * 40
+    prompt = build_prompt(query, "Be helpful.", " Car: Accord.", history_of(2), budget=60)
+
+    assert prompt["query"].startswith("Tell me everything")
+    assert prompt["system"] == "" and prompt["history"] == []
+    assert count_tokens(prompt["query"]) <= 60 - MESSAGE_OVERHEAD
+
+
+def test_truncate_keeps_head_and_tail():
+    text = "start " + "middle " * 200 + "end"
+    cut = truncate_tokens(text, 20, keep_tail=True)
+
+    assert cut.startswith("start") and cut.endswith("end") and " ... " in cut
+    assert truncate_tokens(text, 0) == ""
+    assert truncate_tokens("short", 20) == "short"
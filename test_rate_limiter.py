@@ -0,0 +1,85 @@
+# test_rate_limiter.py
+"""Unit tests for the OpenAI client-side budget and retry helpers."""
+
+from types import SimpleNamespace
+
+import pytest
+
+from app.rate_limiter import (
+    OpenAIRateLimiter,
+    TokenBucket,
+    backoff_delay,
+    estimate_tokens,
+    is_retryable,
+    retry_after_of,
+)
+
+
+def api_error(message="", status=None, headers=None):
+    exc = Exception(message)
+    exc.response = SimpleNamespace(status_code=status, headers=headers or {})
+    return exc
+
+
+def test_bucket_takes_until_empty_and_adjusts():
+    bucket = TokenBucket(rate_per_minute=0.001, capacity=3)
+    assert bucket.try_take(2)
+    assert not bucket.try_take(2)
+    bucket.adjust(-1)
+    assert bucket.try_take(2)
+    bucket.adjust(5)
+    assert bucket.tokens < 0
+
+
+def test_acquire_takes_one_request_and_the_estimate():
+    limiter = OpenAIRateLimiter(rpm=2, tpm=1000)
+    assert limiter.try_acquire(600)
+    assert limiter.requests.tokens == pytest.approx(1, abs=0.01)
+    assert limiter.tokens.tokens == pytest.approx(400, abs=1)
+
+
+def test_token_rejection_refunds_the_request():
+    limiter = OpenAIRateLimiter(rpm=2, tpm=1000)
+    assert not limiter.try_acquire(5000)
+    assert limiter.requests.tokens == pytest.approx(2, abs=0.01)
+
+
+def test_record_usage_corrects_the_estimate():
+    limiter = OpenAIRateLimiter(rpm=10, tpm=1000)
+    limiter.try_acquire(500)
+    limiter.record_usage(500, 100)
+    assert limiter.tokens.tokens == pytest.approx(900, abs=1)
+
+    limiter.record_usage(500, None)  # unknown usage keeps the estimate charged
+    assert limiter.tokens.tokens == pytest.approx(900, abs=1)
+
+
+def test_pause_blocks_admission():
+    limiter = OpenAIRateLimiter()
+    limiter.pause(60)
+    assert not limiter.has_capacity(1)
+    assert not limiter.try_acquire(1)
+
+
+def test_estimate_tokens_counts_prompt_and_completion():
+    messages = [{"role": "system", "content": "x" * 40}, {"role": "user", "content": "y" * 40}]
+    assert estimate_tokens(messages, 100) == 120
+
+
+def test_backoff_prefers_retry_after():
+    assert backoff_delay(5, 0.5, 8.0, retry_after=3.0) == 3.0
+    assert 0 <= backoff_delay(3, 0.5, 2.0) <= 2.0
+
+
+def test_retry_after_headers():
+    assert retry_after_of(api_error(headers={"retry-after-ms": "1500"})) == 1.5
+    assert retry_after_of(api_error(headers={"retry-after": "2"})) == 2.0
+    assert retry_after_of(api_error(headers={"retry-after": "soon"})) is None
+    assert retry_after_of(Exception()) is None
+
+
+def test_retryable_errors():
+    assert is_retryable(api_error(status=503))
+    assert not is_retryable(api_error(status=400))
+    assert not is_retryable(api_error("insufficient_quota", status=429))
+    assert is_retryable(TimeoutError())
@@ -0,0 +1,81 @@
+# test_response_cache.py
+"""Unit tests for the similarity-matched ResponseCache."""
+
+import time
+
+import pytest
+
+from app.response_cache import ResponseCache
+
+PAYLOAD = {"response": "About 33 MPG combined.", "model": "openai"}
+
+
+def test_exact_and_near_duplicate_hits():
+    cache = ResponseCache(threshold=0.6)
+    cache.set("What's the MPG?", 1, ["fuel_economy"], PAYLOAD)
+
+    exact = cache.get("whats the mpg", 1, ["fuel_economy"])
+    assert exact["response"] == PAYLOAD["response"]
+    assert exact["similarity"] == 1.0
+
+    near = cache.get("what is the mpg?", 1, ["fuel_economy"])
+    assert near is not None and 0.6 <= near["similarity"] < 1.0
+
+
+def test_other_cars_and_query_types_do_not_match():
+    cache = ResponseCache()
+    cache.set("What's the MPG?", 1, ["fuel_economy"], PAYLOAD)
+
+    assert cache.get("What's the MPG?", 2, ["fuel_economy"]) is None
+    assert cache.get("What's the MPG?", 1, ["performance"]) is None
+    assert cache.get("How safe is it?", 1, ["fuel_economy"]) is None
+
+
+def test_entries_expire():
+    cache = ResponseCache()
+    cache.set("What's the MPG?", 1, ["fuel_economy"], PAYLOAD, ttl=-1)
+
+    assert cache.get("What's the MPG?", 1, ["fuel_economy"]) is None
+    assert not cache.entries
+
+
+def test_lru_eviction_cleans_the_index():
+    cache = ResponseCache(max_entries=2)
+    cache.set("What's the MPG?", 1, ["fuel_economy"], PAYLOAD)
+    cache.set("How fast is it?", 1, ["performance"], PAYLOAD)
+    cache.get("What's the MPG?", 1, ["fuel_economy"])
+    cache.set("Is it safe?", 1, ["safety"], PAYLOAD)
+
+    assert cache.get("How fast is it?", 1, ["performance"]) is None
+    assert cache.get("What's the MPG?", 1, ["fuel_economy"]) is not None
+    assert len(cache.exact) == 2
+    indexed = {entry_id for postings in cache.index.values() for ids in postings.values() for entry_id in ids}
+    assert indexed == set(cache.entries)
+
+
+def test_overwrite_replaces_the_entry():
+    cache = ResponseCache()
+    cache.set("What's the MPG?", 1, ["fuel_economy"], PAYLOAD)
+    cache.set("whats the mpg", 1, ["fuel_economy"], {**PAYLOAD, "response": "Updated"})
+
+    assert len(cache.entries) == 1
+    assert cache.get("What's the MPG?", 1, ["fuel_economy"])["response"] == "Updated"
+
+
+def test_personal_turns_are_not_cacheable():
+    assert ResponseCache.is_cacheable("Is it reliable?")
+    assert not ResponseCache.is_cacheable("Is it good for my commute?")
+    assert not ResponseCache.is_cacheable("What about the one you said earlier?")
+
+
+@pytest.mark.parametrize("cached, asked", [
+    ("compare to the 2018 civic", "compare to the 2019 civic"),
+    ("is the v6 faster than the v8", "is the v8 faster than the v6"),
+])
+def test_queries_differing_in_years_or_codes_do_not_match(cached, asked):
+    cache = ResponseCache()
+    cache.set(cached, 1, ["comparison"], PAYLOAD)
+
+    # Close enough on trigrams alone, but a different question
+    assert cache.get(asked, 1, ["comparison"], threshold=0.0) is None
+    assert cache.get(cached.replace("the", "teh", 1), 1, ["comparison"], threshold=0.5) is not None
@@ -0,0 +1,144 @@
+# test_review_jobs.py
+"""Unit tests for ReviewJobQueue deduplication, limits, persistence and state file ownership."""
+
+import json
+import threading
+import time
+
+import pytest
+
+from app.review_jobs import FAILED, QUEUED, RUNNING, SUCCEEDED, ReviewJobQueue, ReviewQueueClosed, ReviewQueueFull
+
+
+def wait_for(queue, job_id, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.get(job_id)
+        if job["status"] in (SUCCEEDED, FAILED):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def blocked_generate():
+    release = threading.Event()
+
+    def generate(car_id):
+        release.wait(2.0)
+        return {"car_id": car_id}
+
+    return generate, release
+
+
+def test_job_runs_and_reports_its_result():
+    queue = ReviewJobQueue(lambda car_id: {"car_id": car_id, "rating": 4})
+    job, created = queue.submit(7)
+    assert created and job["status"] == QUEUED
+
+    done = wait_for(queue, job["job_id"])
+    assert done["status"] == SUCCEEDED and done["result"] == {"car_id": 7, "rating": 4}
+    queue.shutdown(wait=True)
+
+
+def test_failed_generation_fails_the_job():
+    def generate(car_id):
+        raise RuntimeError("OpenAI is down")
+
+    queue = ReviewJobQueue(generate)
+    job, _ = queue.submit(1)
+    done = wait_for(queue, job["job_id"])
+    assert done["status"] == FAILED and done["error"] == "OpenAI is down"
+    queue.shutdown(wait=True)
+
+
+def test_same_car_is_deduplicated_while_in_flight():
+    generate, release = blocked_generate()
+    queue = ReviewJobQueue(generate)
+    first, _ = queue.submit(1)
+    second, created = queue.submit(1)
+
+    assert not created and second["job_id"] == first["job_id"]
+    assert queue.get_metrics()["deduplicated"] == 1
+    release.set()
+    queue.shutdown(wait=True)
+
+
+def test_submit_refuses_beyond_max_pending():
+    generate, release = blocked_generate()
+    queue = ReviewJobQueue(generate, max_workers=1, max_pending=2)
+    queue.submit(1)
+    queue.submit(2)
+
+    with pytest.raises(ReviewQueueFull):
+        queue.submit(3)
+    release.set()
+    queue.shutdown(wait=True)
+
+
+def test_submit_after_shutdown_is_refused():
+    queue = ReviewJobQueue(lambda car_id: {"car_id": car_id})
+    queue.start()
+    queue.shutdown(wait=True)
+
+    with pytest.raises(ReviewQueueClosed):
+        queue.submit(1)
+    assert queue.executor is None and queue.get_metrics()["submitted"] == 0
+
+    queue.start()
+    job, _ = queue.submit(1)
+    assert wait_for(queue, job["job_id"])["status"] == SUCCEEDED
+    queue.shutdown(wait=True)
+
+
+def persisted(path, *jobs):
+    path.write_text(json.dumps({"jobs": list(jobs)}))
+
+
+def stored_job(job_id, car_id, status, attempts):
+    return {
+        "job_id": job_id, "car_id": car_id, "status": status, "created_at": time.time(),
+        "started_at": None, "finished_at": None, "attempts": attempts, "result": None, "error": None,
+    }
+
+
+def test_unfinished_jobs_resume_after_restart(tmp_path):
+    path = tmp_path / "jobs.json"
+    persisted(path, stored_job("a", 1, QUEUED, 0), stored_job("b", 2, RUNNING, 1), stored_job("c", 3, RUNNING, 2))
+
+    queue = ReviewJobQueue(lambda car_id: {"car_id": car_id}, state_path=str(path))
+    queue.start()
+    assert wait_for(queue, "a")["status"] == SUCCEEDED
+    assert wait_for(queue, "b")["status"] == SUCCEEDED
+    # It was on its last attempt when the process died
+    assert queue.get("c")["error"] == "Interrupted by restart"
+    assert queue.get_metrics()["resumed"] == 2
+    queue.shutdown(wait=True)
+
+    saved = {job["job_id"]: job["status"] for job in json.loads(path.read_text())["jobs"]}
+    assert saved == {"a": SUCCEEDED, "b": SUCCEEDED, "c": FAILED}
+
+
+def test_only_one_process_owns_the_state_file(tmp_path):
+    pytest.importorskip("fcntl")
+    path = tmp_path / "jobs.json"
+    persisted(path, stored_job("a", 1, QUEUED, 0))
+    generate, release = blocked_generate()
+
+    owner = ReviewJobQueue(generate, state_path=str(path))
+    owner.start()
+    other = ReviewJobQueue(generate, state_path=str(path))
+    other.start()
+
+    assert owner.get_metrics()["persistent"] and not other.get_metrics()["persistent"]
+    assert other.get("a") is None  # the owner resumes it, not every worker
+    other.submit(9)
+    assert [job["job_id"] for job in json.loads(path.read_text())["jobs"]] == ["a"]
+
+    release.set()
+    owner.shutdown(wait=True)
+    other.shutdown(wait=True)
+    # Once the owner stops, the next process can take over
+    successor = ReviewJobQueue(generate, state_path=str(path))
+    successor.start()
+    assert successor.get_metrics()["persistent"]
+    successor.shutdown(wait=True)
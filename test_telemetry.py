@@ -0,0 +1,100 @@
+# test_telemetry.py
+"""Unit tests for the Prometheus registry and per-request stage timings."""
+
+import asyncio
+import contextvars
+import time
+
+from app.telemetry import Histogram, MetricsRegistry, StageTimings, span, start_timings
+
+
+def test_histogram_buckets_are_cumulative_and_inclusive():
+    histogram = Histogram((0.1, 1.0, 2.5))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value)
+
+    assert histogram.cumulative() == [("0.1", 2), ("1", 3), ("2.5", 3), ("+Inf", 4)]
+    assert histogram.count == 4 and histogram.sum == 3.65
+
+
+def test_render_uses_the_prometheus_text_format():
+    registry = MetricsRegistry()
+    registry.describe("req_seconds", "Request latency.", (0.5, 1.0))
+    registry.observe("req_seconds", 0.2, {"model": "local"})
+    registry.observe("req_seconds", 0.75, {"model": "local"})
+    registry.inc("req_total", {"model": "openai", "type": 'say "hi"'}, 2)
+
+    lines = registry.render().splitlines()
+    assert lines == [
+        "# TYPE req_total counter",
+        'req_total{model="openai",type="say \\"hi\\""} 2',
+        "# HELP req_seconds Request latency.",
+        "# TYPE req_seconds histogram",
+        'req_seconds_bucket{model="local",le="0.5"} 1',
+        'req_seconds_bucket{model="local",le="1"} 2',
+        'req_seconds_bucket{model="local",le="+Inf"} 2',
+        'req_seconds_sum{model="local"} 0.95',
+        'req_seconds_count{model="local"} 2',
+    ]
+
+
+def test_time_observes_the_block_even_when_it_raises():
+    registry = MetricsRegistry()
+    try:
+        with registry.time("stage_seconds"):
+            raise ValueError("boom")
+    except ValueError:
+        pass
+
+    assert "stage_seconds_count 1" in registry.render()
+
+
+def test_span_is_a_no_op_without_start_timings():
+    def run():
+        with span("llm"):
+            return "ran"
+
+    assert contextvars.Context().run(run) == "ran"
+
+
+def test_spans_accumulate_in_first_run_order():
+    def run():
+        timings = start_timings()
+        with span("classification"):
+            time.sleep(0.01)
+        with span("llm"):
+            pass
+        with span("classification"):
+            time.sleep(0.01)
+        return timings
+
+    timings = contextvars.Context().run(run)
+    stages = timings.as_dict()
+    assert list(stages) == ["classification", "llm"]
+    assert stages["classification"] >= 20
+
+
+def test_tasks_and_threads_inherit_the_collector():
+    async def main():
+        timings = start_timings()
+
+        def in_thread():
+            with span("thread"):
+                pass
+
+        async def in_task():
+            with span("task"):
+                pass
+
+        await asyncio.gather(asyncio.to_thread(in_thread), asyncio.ensure_future(in_task()))
+        return timings
+
+    assert set(asyncio.run(main()).as_dict()) == {"thread", "task"}
+
+
+def test_server_timing_header_value():
+    timings = StageTimings()
+    timings.add("classification", 0.0012)
+    timings.add("llm", 1.5)
+
+    assert timings.server_timing() == "classification;dur=1.2, llm;dur=1500.0"